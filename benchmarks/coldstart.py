@@ -0,0 +1,55 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Cold start of the worker processes: a PoolScanner with a single worker running an analyser which loads
+a large index on first use (~1 s, standing in for the scancode index and the spaCy pipeline). The worker
+exits after every file, so that it is replaced. Prints the time to the first result and the time from the
+exit of a worker to the first result of its replacement. The start method is taken from the environment:
+
+    TS_DEEPSCAN_START_METHOD=fork python benchmarks/coldstart.py [--respawns 3]
+"""
+
+import time
+import argparse
+import typing as t
+
+from common import tree_path, make_tree, HeavyAnalyser
+
+from ts_deepscan.scanner import pool
+from ts_deepscan.scanner.PoolScanner import PoolScanner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--respawns', type=int, default=3)
+    parser.add_argument('--path', help='tree to scan, it is generated if it does not exist')
+    args = parser.parse_args()
+
+    # Every other file makes the worker exit
+    num_files = 2 * args.respawns + 1
+    root = make_tree(tree_path(args.path, f'coldstart-{num_files}'), num_files, 1, lambda i: f'{i}\n'.encode())
+
+    scanner = PoolScanner(1, 60, [HeavyAnalyser(exit_after=1)])
+    # Identical files are analysed as well
+    scanner.deduplicate = False
+
+    completed: t.List[t.Tuple[float, bool]] = []
+    started = time.perf_counter()
+    scanner.onFileScanCompleted = lambda relpath, result, errors: completed.append((time.perf_counter(),
+                                                                                   bool(result)))
+    try:
+        scanner.run([root])
+    finally:
+        scanner.close()
+
+    first = completed[0][0] - started
+    respawns = [s - completed[i - 1][0] for i, (s, ok) in enumerate(completed) if i and ok and not completed[i - 1][1]]
+
+    print(f'{getattr(pool, "DEFAULT_START_METHOD", "fork")}: first {first:.3f} s, '
+          f'respawns {" ".join(f"{s:.3f}" for s in respawns)} s')
+
+
+if __name__ == '__main__':
+    main()
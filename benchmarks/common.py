@@ -0,0 +1,234 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Helpers shared by the benchmarks: generated trees, counting of file system calls and analysers with
+predictable costs. The benchmarks use the public scanner API only, so that they can be run against an
+older checkout (e.g. using PYTHONPATH=<checkout>/src) to compare the numbers.
+"""
+
+import os
+import time
+import random
+import tempfile
+import collections
+import typing as t
+
+from pathlib import Path
+from contextlib import contextmanager
+
+from ts_deepscan.analyser import FileAnalyser, TextFileAnalyser, AnalysisResult
+
+
+def tree_path(path: t.Optional[str], name: str) -> Path:
+    """
+    Returns the path of a generated tree, it is kept in the temp directory between runs unless given.
+    """
+    return Path(path) if path else Path(tempfile.gettempdir()) / f'ts-deepscan-bench-{name}'
+
+
+def make_tree(root: Path,
+              num_files: int,
+              num_dirs: int,
+              content: t.Callable[[int], bytes],
+              suffixes: t.Sequence[str] = ('.txt',),
+              seed: int = 1) -> Path:
+    """
+    Creates a tree of num_files files spread over num_dirs nested directories, unless it exists already.
+    """
+    if root.exists():
+        return root
+
+    rnd = random.Random(seed)
+
+    dirs = [root]
+    for i in range(1, num_dirs):
+        dirs.append(rnd.choice(dirs) / f'd{i}')
+
+    for d in dirs:
+        d.mkdir(parents=True, exist_ok=True)
+
+    for i in range(num_files):
+        (dirs[i % len(dirs)] / f'f{i}{suffixes[i % len(suffixes)]}').write_bytes(content(i))
+
+    return root
+
+
+class _CountedEntry(object):
+    """
+    Directory entry counting the calls of its stat method.
+    """
+
+    def __init__(self, entry: os.DirEntry, counts: t.Counter[str]):
+        self._entry = entry
+        self._counts = counts
+
+    def __getattr__(self, name: str):
+        return getattr(self._entry, name)
+
+    def __fspath__(self) -> str:
+        return self._entry.path
+
+    def stat(self, *args, **kwargs):
+        self._counts['DirEntry.stat'] += 1
+        return self._entry.stat(*args, **kwargs)
+
+
+class _CountedScandir(object):
+    def __init__(self, it, counts: t.Counter[str]):
+        self._it = it
+        self._counts = counts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._it.close()
+
+    def __iter__(self):
+        return (_CountedEntry(e, self._counts) for e in self._it)
+
+    def close(self):
+        self._it.close()
+
+
+@contextmanager
+def count_calls(names: t.Iterable[str] = ('stat', 'lstat', 'listdir', 'scandir')) -> t.Iterator[t.Counter[str]]:
+    """
+    Counts the calls of the os functions while in the block, incl. the stat calls of the entries
+    returned by os.scandir.
+    """
+    counts: t.Counter[str] = collections.Counter()
+    originals = {name: getattr(os, name) for name in names}
+
+    def wrap(name: str, func: t.Callable) -> t.Callable:
+        def counted(*args, **kwargs):
+            counts[name] += 1
+            result = func(*args, **kwargs)
+            return _CountedScandir(result, counts) if name == 'scandir' else result
+
+        return counted
+
+    for name, func in originals.items():
+        setattr(os, name, wrap(name, func))
+
+    try:
+        yield counts
+    finally:
+        for name, func in originals.items():
+            setattr(os, name, func)
+
+
+@contextmanager
+def timed() -> t.Iterator[t.List[float]]:
+    """
+    Measures the wall time of the block, the seconds are appended to the yielded list.
+    """
+    elapsed: t.List[float] = []
+    started = time.perf_counter()
+
+    try:
+        yield elapsed
+    finally:
+        elapsed.append(time.perf_counter() - started)
+
+
+def percentile(values: t.Sequence[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+
+class LinesAnalyser(TextFileAnalyser):
+    """
+    Counts the lines of text files.
+    """
+
+    @property
+    def category(self) -> str:
+        return 'lines'
+
+    def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
+        with path.open('rb') as fp:
+            return AnalysisResult(self.category, fp.read().count(b'\n'))
+
+
+class SizeAnalyser(FileAnalyser):
+    """
+    Reports the size of every file.
+    """
+
+    @property
+    def category(self) -> str:
+        return 'size'
+
+    def _match(self, path: Path) -> bool:
+        return True
+
+    def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
+        return AnalysisResult(self.category, path.stat().st_size)
+
+
+class SleepAnalyser(FileAnalyser):
+    """
+    Takes a fixed time per file plus a time per byte, standing in for an expensive analysis.
+    """
+
+    def __init__(self, seconds: float = 0.002, per_byte: float = 2e-6, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.seconds = seconds
+        self.per_byte = per_byte
+
+    @property
+    def category(self) -> str:
+        return 'sleep'
+
+    def _match(self, path: Path) -> bool:
+        return True
+
+    def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
+        size = path.stat().st_size
+        time.sleep(self.seconds + size * self.per_byte)
+        return AnalysisResult(self.category, size)
+
+
+# Loaded state of the HeavyAnalyser and the number of files it analysed, set once per process
+_heavy_index: t.Optional[t.Dict[int, str]] = None
+_heavy_files = 0
+
+
+class HeavyAnalyser(FileAnalyser):
+    """
+    Loads a large index on first use, standing in for the scancode index and the spaCy pipeline.
+    If exit_after is given, the worker process exits on the next file after as many files, so that it is replaced.
+    """
+
+    def __init__(self, entries: int = 1_500_000, exit_after: int = 0, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.entries = entries
+        self.exit_after = exit_after
+
+    @property
+    def category(self) -> str:
+        return 'heavy'
+
+    def _load(self) -> t.Dict[int, str]:
+        global _heavy_index
+        if _heavy_index is None:
+            _heavy_index = {i: str(i) * 3 for i in range(self.entries)}
+        return _heavy_index
+
+    def warm_up(self):
+        self._load()
+
+    def _match(self, path: Path) -> bool:
+        return True
+
+    def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
+        global _heavy_files
+
+        if self.exit_after and _heavy_files >= self.exit_after:
+            os._exit(1)
+
+        _heavy_files += 1
+        return AnalysisResult(self.category, len(self._load()))
@@ -0,0 +1,86 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Scheduling of files by their predicted costs: a PoolScanner on many small files and a single large file
+discovered last, once in the order of discovery (FIFO) and once ordered by the cost model. Prints the
+wall time, the median and the max completion time of the files and the completion time of the large file.
+
+    python benchmarks/costs.py [--files 800] [--jobs 4] [--durations FILE] [--path DIR]
+
+With --durations the cost model records the durations into the file and predicts from the recorded ones
+in the following runs, otherwise it predicts from the file sizes only.
+"""
+
+import time
+import argparse
+import typing as t
+
+from pathlib import Path
+
+from common import tree_path, make_tree, percentile, SleepAnalyser
+
+from ts_deepscan.scanner.PoolScanner import PoolScanner
+from ts_deepscan.scanner.costs import CostModel
+
+
+class FifoModel(CostModel):
+    """
+    Predicts the same cost for every file, so that the files are dispatched in the order of discovery.
+    """
+
+    def predict(self, path: Path, size: int, categories: t.Iterable[str]) -> float:
+        return 1.0
+
+    def record(self, path: Path, size: int, durations: t.Dict[str, float]):
+        pass
+
+
+def make_costs_tree(root: Path, num_files: int) -> Path:
+    if root.exists():
+        return root
+
+    make_tree(root / 'src', num_files, num_files // 100 + 1, lambda i: b'x' * (500 + (i * 37) % 3000), ('.c',))
+
+    # Discovered after the small files
+    (root / 'zz').mkdir()
+    (root / 'zz' / 'generated.c').write_bytes(b'x' * 900_000)
+
+    return root
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=800)
+    parser.add_argument('--jobs', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=2)
+    parser.add_argument('--durations', help='file the durations are recorded into')
+    parser.add_argument('--path', help='tree to scan, it is generated if it does not exist')
+    args = parser.parse_args()
+
+    root = make_costs_tree(tree_path(args.path, f'costs-{args.files}'), args.files)
+
+    for name in ('fifo', 'costs'):
+        for run in range(args.runs):
+            costs = FifoModel() if name == 'fifo' else CostModel(Path(args.durations) if args.durations else None)
+            scanner = PoolScanner(args.jobs, 60, [SleepAnalyser()], costs=costs)
+            # Identical files are analysed as well
+            scanner.deduplicate = False
+
+            completed: t.List[t.Tuple[float, str]] = []
+            started = time.perf_counter()
+            scanner.onFileScanCompleted = lambda relpath, *_: completed.append((time.perf_counter() - started,
+                                                                               relpath))
+            scanner.run([root])
+
+            elapsed = time.perf_counter() - started
+            latencies = [s for s, _ in completed]
+            large = next((s for s, relpath in completed if relpath.endswith('generated.c')), 0.0)
+
+            print(f'{name} run {run}: {len(completed)} files, {elapsed:.2f} s, p50 {percentile(latencies, 0.5):.2f} s, '
+                  f'p100 {percentile(latencies, 1.0):.2f} s, large file {large:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+License matching on the compact dataset (dataset.bin) compared to the JSON data it is built from: the size
+and the open time of the file, the pickled size of the Dataset, the time of the best match search per text
+with the former search over the JSON data and with CompactDataset.best_match, and the memory (PSS) of
+forked workers running the search (Linux only).
+
+    python benchmarks/dataset.py [--texts 90] [--workers 4] [--path DIR]
+
+The dataset is built in the dataset folder (see TS_DEEPSCAN_DATASET_DIR) unless it exists. The searched
+texts are made up from the tokens of the licenses, so that spaCy is not needed to run the search.
+"""
+
+import gc
+import os
+import pickle
+import random
+import argparse
+import typing as t
+import multiprocessing as mp
+
+from pathlib import Path
+
+from common import timed
+
+from ts_deepscan.config import get_datasetdir
+from ts_deepscan.analyser.Dataset import Dataset, CompactDataset
+
+
+def best_match(orths: t.Set[int], data: t.Dict[str, t.Any]) -> t.Tuple[t.Optional[str], float]:
+    """
+    Search over the JSON data as made before the compact dataset, a set of orths is built per license.
+    """
+    lic, score = None, 0.0
+
+    for key, val in data.items():
+        other = set(val['orths'])
+        s = float(2 * len(orths.intersection(other))) / (len(orths) + len(other))
+
+        if s > score:
+            score, lic = s, key
+
+    return lic, score
+
+
+def make_texts(data: t.Dict[str, t.Any], num_texts: int, seed: int = 1) -> t.List[t.Set[int]]:
+    """
+    Returns orths of texts similar to licenses: the beginning of a license, and a sample of its tokens.
+    """
+    rnd = random.Random(seed)
+    texts = []
+
+    for key in rnd.sample(sorted(data), min(num_texts // 2, len(data))):
+        orths = data[key]['orths']
+        texts.append(set(orths[:len(orths) * 3 // 4]) | {1, 2})
+        texts.append(set(rnd.sample(orths, min(30, len(orths)))))
+
+    return texts
+
+
+def _pss() -> int:
+    with open('/proc/self/smaps_rollup') as fp:
+        return next(int(line.split()[1]) for line in fp if line.startswith('Pss:'))
+
+
+def _search(search: t.Callable[[t.Set[int]], t.Any], texts: t.List[t.Set[int]], results: mp.Queue):
+    for _ in range(3):
+        for orths in texts:
+            search(orths)
+
+    gc.collect()
+    results.put(_pss())
+
+
+def workers_pss(search: t.Callable[[t.Set[int]], t.Any], texts: t.List[t.Set[int]], num_workers: int) -> t.List[int]:
+    ctx = mp.get_context('fork')
+    results = ctx.Queue()
+
+    workers = [ctx.Process(target=_search, args=(search, texts, results)) for _ in range(num_workers)]
+    for w in workers:
+        w.start()
+
+    pss = [results.get() for _ in workers]
+
+    for w in workers:
+        w.join()
+
+    return pss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--texts', type=int, default=90)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--path', help='dataset folder, it is built if it does not exist')
+    args = parser.parse_args()
+
+    path = Path(args.path) if args.path else get_datasetdir()
+
+    with timed() as elapsed:
+        dataset = Dataset(path)
+        dataset.load()
+
+    compact_path = path / 'dataset.bin'
+    print(f'dataset loaded in {elapsed[0]:.2f} s, {compact_path.stat().st_size} bytes of dataset.bin, '
+          f'pickled dataset {len(pickle.dumps(dataset))} bytes')
+
+    with timed() as elapsed:
+        for _ in range(100):
+            CompactDataset(compact_path)
+
+    print(f'dataset.bin opened in {elapsed[0] / 100 * 1e3:.2f} ms')
+
+    data = dataset.data
+    texts = make_texts(data, args.texts)
+    compact = dataset.compact
+
+    with timed() as json_elapsed:
+        expected = [best_match(orths, data) for orths in texts]
+
+    with timed() as compact_elapsed:
+        matches = [compact.best_match(orths) for orths in texts]
+
+    same = all(a[0] == b[0] and abs(a[1] - b[1]) < 1e-12 for a, b in zip(expected, matches))
+
+    print(f'{len(texts)} texts: {json_elapsed[0] / len(texts) * 1e3:.2f} ms per text with the JSON data, '
+          f'{compact_elapsed[0] / len(texts) * 1e3:.2f} ms with dataset.bin, same matches: {same}')
+
+    if args.workers > 0 and os.path.exists('/proc/self/smaps_rollup') and 'fork' in mp.get_all_start_methods():
+        pss = workers_pss(lambda orths: best_match(orths, data), texts, args.workers)
+        print(f'PSS of {args.workers} workers with the JSON data: {", ".join(f"{p // 1024} MB" for p in pss)}')
+
+        del data
+        dataset = Dataset(path)
+        dataset.load()
+        gc.collect()
+
+        pss = workers_pss(dataset.compact.best_match, texts, args.workers)
+        print(f'PSS of {args.workers} workers with dataset.bin: {", ".join(f"{p // 1024} MB" for p in pss)}')
+
+
+if __name__ == '__main__':
+    main()
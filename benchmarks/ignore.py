@@ -0,0 +1,93 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Discovery of a tree with many .gitignore files holding random rules incl. negations, and with ignore
+patterns: the wall time and the numbers of discovered files and ignored paths. The files are not analysed.
+With --dump the discovered files and ignored paths are written to a file, to compare them between checkouts.
+
+    python benchmarks/ignore.py [--depth 5] [--path DIR] [--dump FILE]
+"""
+
+import random
+import argparse
+import collections
+
+from pathlib import Path
+
+from common import tree_path, timed
+
+from ts_deepscan.scanner.Scanner import Scanner
+
+
+_rules = ['*.log', 'build/', '/dist', '!keep.log', 'tmp*', '**/gen/*.c', 'a/**/z', '*.o', 'doc/*.md',
+          '!important.o', '\\#x', 'x?y', '[ab]c', 'vendor', '**/node_modules']
+
+_dirs = ['a', 'b', 'build', 'dist', 'gen', 'doc', 'vendor', 'src', 'node_modules', 'ac', 'bc', 'xay',
+         'p0', 'p1', 'p2', 'p3', 'p4', 'p5', 'p6', 'p7']
+
+_files = ['f.log', 'keep.log', 'x.c', 'y.o', 'important.o', 'r.md', 'tmpfile', 'z', '#x', 'x1y', 'ok.txt', '.h']
+
+_ignore_patterns = ['*.md', 'x1*']
+
+
+def make_ignore_tree(root: Path, depth: int, seed: int = 1) -> Path:
+    if root.exists():
+        return root
+
+    rnd = random.Random(seed)
+
+    def make(d: Path, level: int):
+        d.mkdir(parents=True, exist_ok=True)
+
+        if rnd.random() < 0.9:
+            (d / '.gitignore').write_text('\n'.join(rnd.sample(_rules, rnd.randint(1, 5))) + '\n')
+
+        for name in rnd.sample(_files, 5):
+            (d / name).write_text('x')
+
+        if level < depth:
+            for name in rnd.sample(_dirs, 5):
+                make(d / name, level + 1)
+
+    make(root, 0)
+    return root
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--path', help='tree to scan, it is generated if it does not exist')
+    parser.add_argument('--dump', help='file the discovered files and ignored paths are written to')
+    args = parser.parse_args()
+
+    root = make_ignore_tree(tree_path(args.path, f'ignore-{args.depth}'), args.depth)
+    gitignores = sum(1 for _ in root.rglob('.gitignore'))
+
+    for run in range(args.runs):
+        files = []
+        ignored = []
+
+        scanner = Scanner([], ignore_patterns=_ignore_patterns)
+        scanner.onPathIgnored = ignored.append
+        # Identical files are passed through as well
+        scanner.deduplicate = False
+        # Takes the discovered files without analysing them
+        scanner._do_scan = lambda _files: (collections.deque((files.append(f) for f in _files), maxlen=0), {})[1]
+
+        with timed() as elapsed:
+            scanner.run([root])
+
+        print(f'run {run}: {len(files)} files, {len(ignored)} ignored paths, {gitignores} .gitignore files, '
+              f'{elapsed[0]:.3f} s')
+
+        if args.dump and run == 0:
+            # Files are passed as (path, root) tuples by older checkouts
+            relpaths = sorted(str(f[0].relative_to(f[1])) for f in files)
+            Path(args.dump).write_text('\n'.join(relpaths + ['--'] + sorted(ignored)) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Overhead of pool tasks: the size and the (un)pickling time of a task message carrying the default analysers
+(license and comments) compared to one carrying their categories only, and the wall time of a PoolScanner
+on many small files using cheap analysers, so that the task overhead dominates.
+
+    python benchmarks/tasks.py [--files 20000] [--jobs 4] [--path DIR]
+
+The Dataset is built from the bundled licenses.json on first use (see ts_deepscan.create_dataset).
+"""
+
+import pickle
+import argparse
+
+from pathlib import Path
+
+from common import tree_path, make_tree, timed, LinesAnalyser, SizeAnalyser
+
+from ts_deepscan import create_dataset, create_default_analysers
+from ts_deepscan.scanner.PoolScanner import PoolScanner
+
+
+def message_sizes(root: Path, runs: int = 20):
+    from ts_deepscan.scanner import FileScanInput
+
+    analysers = create_default_analysers(create_dataset(), timeout=60, max_file_size=1 << 20,
+                                         include_copyright=False, include_crypto=False)
+    categories = tuple(a.category for a in analysers)
+
+    files = [FileScanInput(p, root, p.stat()) for p in sorted(root.rglob('*.txt'))[:64]]
+
+    for name, msg in (('1 file, analysers', (analysers, files[:1])),
+                      ('1 file, categories', (categories, files[:1])),
+                      (f'{len(files)} files, analysers', (analysers, files)),
+                      (f'{len(files)} files, categories', (categories, files))):
+
+        with timed() as dumps:
+            for _ in range(runs):
+                data = pickle.dumps(msg)
+
+        with timed() as loads:
+            for _ in range(runs):
+                pickle.loads(data)
+
+        print(f'{name}: {len(data)} bytes, dumps {dumps[0] / runs * 1e3:.2f} ms, '
+              f'loads {loads[0] / runs * 1e3:.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=20000)
+    parser.add_argument('--jobs', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--path', help='tree to scan, it is generated if it does not exist')
+    parser.add_argument('--no-dataset', action='store_true', help='skip the message sizes of the default analysers')
+    args = parser.parse_args()
+
+    root = make_tree(tree_path(args.path, f'tasks-{args.files}'), args.files, 100, lambda i: f'{i}\n'.encode() * 20)
+
+    if not args.no_dataset:
+        message_sizes(root)
+
+    for run in range(args.runs):
+        scanner = PoolScanner(args.jobs, 60, [LinesAnalyser(), SizeAnalyser()])
+        # Identical files are analysed as well
+        scanner.deduplicate = False
+
+        with timed() as elapsed:
+            results = scanner.run([root])
+
+        print(f'run {run}: {len(results)} files, {args.jobs} workers, {elapsed[0]:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Discovery of the files of a tree: the wall time and the number of stat/lstat/listdir/scandir calls
+per discovered file. The files are not analysed.
+
+    python benchmarks/walk.py [--files 3000] [--dirs 400] [--path DIR]
+"""
+
+import argparse
+import collections
+
+from common import tree_path, make_tree, count_calls, timed
+
+from ts_deepscan.scanner.Scanner import Scanner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=3000)
+    parser.add_argument('--dirs', type=int, default=400)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--path', help='tree to scan, it is generated if it does not exist')
+    args = parser.parse_args()
+
+    root = make_tree(tree_path(args.path, f'walk-{args.files}-{args.dirs}'),
+                     args.files, args.dirs, lambda i: b'x' * (i % 512))
+
+    for run in range(args.runs):
+        scanner = Scanner([])
+        # Identical files are passed through as well
+        scanner.deduplicate = False
+        # Takes the discovered files without analysing them
+        scanner._do_scan = lambda files: (collections.deque(files, maxlen=0), {})[1]
+
+        with count_calls() as counts, timed() as elapsed:
+            scanner.run([root])
+
+        files = scanner.totalTasks
+        print(f'run {run}: {files} files, {sum(counts.values()) / max(files, 1):.2f} calls per file '
+              f'({", ".join(f"{k} {v}" for k, v in sorted(counts.items()))}), {elapsed[0]:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
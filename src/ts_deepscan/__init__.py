@@ -2,6 +2,7 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import os
 import sys
 import json
 import requests
@@ -18,7 +19,13 @@ from .config import get_datasetdir
 from .scanner import Scan, compute_summary
 from .scanner.Scanner import *
 from .scanner.PoolScanner import PoolScanner
-from .scanner.Scanner import Scanner
+from .scanner.pool.scheduler import parse_jobs
+from .scanner.costs import CostModel, DEFAULT_COSTS_FILE
+from .scanner.journal import Journal
+from .scanner.shards import Shard, merge_scans
+from .scanner.cluster import WorkerNode, parse_address, get_secret
+from .scanner.DistributedScanner import DistributedScanner
+from .scanner.Scanner import Scanner, NOT_SCANNED_BUDGET, NOT_SCANNED_CANCELLED
 
 from .analyser import FileAnalyser
 from .analyser.Dataset import Dataset
@@ -77,7 +84,7 @@ def create_default_analysers(dataset: Dataset,
     return analysers
 
 
-def create_scanner(jobs: int = -1,
+def create_scanner(jobs: t.Union[int, str] = -1,
                    timeout: int = FileAnalyser.DEFAULT_TIMEOUT,
                    max_file_size: int = FileAnalyser.MAX_FILE_SIZE,
                    include_copyright: bool = True,
@@ -90,14 +97,30 @@ def create_scanner(jobs: int = -1,
                    ignore_pattern: tuple = tuple(),
                    default_gitignores: t.Optional[t.List[Path]] = None,
                    dataset: t.Optional[Dataset] = None,
-                   use_cache: bool = True) -> Scanner:
+                   use_cache: bool = True,
+                   deduplicate: bool = True,
+                   git: bool = False,
+                   git_base: t.Optional[str] = None,
+                   git_revision: t.Optional[str] = None,
+                   time_budget: t.Optional[float] = None,
+                   journal: t.Optional[Path] = None,
+                   resume: t.Optional[Path] = None,
+                   listen: t.Optional[str] = None,
+                   local_workers: int = 0,
+                   shard: t.Optional[str] = None) -> Scanner:
+
+    if journal and resume:
+        raise ValueError('A resumed scan continues its journal, it cannot be recorded in another one')
+
+    local_jobs = str(jobs)
+    jobs, lanes = parse_jobs(jobs)
     
     if sys.platform == 'win32' and include_crypto:
-        if jobs > 1:
+        if jobs > 1 or lanes:
             print('Warning: parallel analysis is unavailable on Windows when \'include-crypto\' flag is enabled')
 
         # Do crypto analysis without multitasking due to spawn + native libs issues on Windows
-        jobs = 1
+        jobs, lanes = 1, {}
 
     if not dataset:
         dataset = create_dataset()
@@ -129,6 +152,8 @@ def create_scanner(jobs: int = -1,
         else:
             print('Warning: YARA analyser was not enabled. Please provide a path to YARA rules')
     
+    costs = None
+
     if use_cache:
         from .caching import ResultsCache
         from .analyser.CachingAnalyser import CachingAnalyzer
@@ -139,16 +164,70 @@ def create_scanner(jobs: int = -1,
         postprocessor = CachingPostProcessor(cache=cache, processor=postprocessor)
         analysers = [CachingAnalyzer(analyser, cache=cache, auto_store=False) for analyser in analysers]
 
+        # Durations recorded while scanning are kept next to the cached results
+        costs = CostModel(Path(cache.cache_dir) / DEFAULT_COSTS_FILE)
+
     #return Scanner(analysers=analysers,
     #               ignore_patterns=list(ignore_pattern),
     #               default_gitignores=default_gitignores)
 
+    options = dict(analysers=analysers,
+                   postprocessor=postprocessor,
+                   ignore_patterns=list(ignore_pattern),
+                   default_gitignores=default_gitignores,
+                   deduplicate=deduplicate,
+                   git=git,
+                   git_base=git_base,
+                   git_revision=git_revision,
+                   time_budget=time_budget,
+                   shard=Shard.parse(shard) if shard else None,
+                   journal=Journal(resume, resume=True) if resume else Journal(journal) if journal else None)
+
+    if listen or local_workers > 0:
+        secret = get_secret()
+
+        if listen and not secret:
+            raise ValueError('Worker nodes require a secret to authenticate, please set TS_DEEPSCAN_CLUSTER_SECRET')
+
+        return DistributedScanner(address=parse_address(listen) if listen else ('127.0.0.1', 0),
+                                  secret=secret,
+                                  local_workers=local_workers,
+                                  local_jobs=local_jobs,
+                                  task_timeout=timeout,
+                                  **options)
+
     return PoolScanner(num_jobs=jobs,
                        task_timeout=timeout,
-                       analysers=analysers,
-                       postprocessor=postprocessor,
-                       ignore_patterns=list(ignore_pattern),
-                       default_gitignores=default_gitignores)
+                       lanes=lanes,
+                       costs=costs,
+                       **options)
+
+
+def run_worker(address: str, jobs: t.Union[int, str] = -1, retry: float = 0) -> int:
+    """
+    Runs a worker node of a distributed scan (see DistributedScanner) until the coordinator stops it.
+    The analysers are received from the coordinator, the dataset is loaded on the node.
+    Returns the number of analysed files.
+    """
+    from .analyser.CachingAnalyser import CachingAnalyzer
+
+    if not (secret := get_secret()):
+        raise ValueError('Worker nodes require a secret to authenticate, please set TS_DEEPSCAN_CLUSTER_SECRET')
+
+    jobs, lanes = parse_jobs(jobs)
+    dataset = None
+
+    def create_node_scanner(analysers: t.List[FileAnalyser], task_timeout: int) -> Scanner:
+        nonlocal dataset
+
+        # The dataset path of the coordinator does not need to exist on the node
+        for a in (a.analyser if isinstance(a, CachingAnalyzer) else a for a in analysers):
+            if isinstance(getattr(a, 'dataset', None), Dataset):
+                a.dataset = dataset = dataset or create_dataset()
+
+        return PoolScanner(num_jobs=jobs, task_timeout=task_timeout, lanes=lanes, analysers=analysers)
+
+    return WorkerNode(parse_address(address), secret, jobs, create_node_scanner).serve(retry)
 
 
 def create_dataset() -> Dataset:
@@ -160,12 +239,12 @@ def create_dataset() -> Dataset:
     return dataset
 
 
-def execute_scan(paths: t.List[Path], _scanner: Scanner, title='') -> Scan:
+def execute_scan(paths: t.List[Path], _scanner: Scanner, title='', previous: t.Optional[Scan] = None) -> Scan:
     no_result = []
     progress_bar: t.Optional[tqdm] = None
 
     def onScanCompleted(p, r, errs):
-        if not r:
+        if not r and NOT_SCANNED_BUDGET not in errs and NOT_SCANNED_CANCELLED not in errs:
             no_result.append(p)
 
     def onProgress(finished: int, total: int):
@@ -179,6 +258,9 @@ def execute_scan(paths: t.List[Path], _scanner: Scanner, title='') -> Scan:
                     leave=False)
             #                    bar_format='{desc:<40}{percentage:3.0f}%|{bar:10}{r_bar}')
             else:
+                # Total is the number of files discovered so far and grows while the scan is running
+                if progress_bar.total != total:
+                    progress_bar.total = total
                 progress_bar.update(finished - progress_bar.n)
 
     _scanner.onProgress = onProgress
@@ -192,20 +274,60 @@ def execute_scan(paths: t.List[Path], _scanner: Scanner, title='') -> Scan:
 
     stats = {
         'total': _scanner.totalTasks,
-        'finished': _scanner.finishedTasks
+        'finished': _scanner.finishedTasks,
+        'duplicates': _scanner.duplicateTasks,
+        'dedup_ratio': round(_scanner.dedup_ratio, 4),
+        'unchanged': len(_scanner.unchangedFiles),
+        'timeouts': sorted(_scanner.timedOutFiles),
+        'worker_restarts': _scanner.workerRestarts,
+        'not_scanned_budget': sorted(_scanner.budgetSkippedFiles),
+        'resumed': len(_scanner.resumedFiles)
     }
 
-    result = {relpath:{res.category: res.data for res in res_list} for relpath, res_list in result.items()}
+    if _scanner.shard:
+        stats['shard'] = str(_scanner.shard)
+
+    # Analyses stopped at their deadline without any results are listed in the timeouts only
+    result = {relpath: data for relpath, res_list in result.items()
+              if (data := {res.category: res.data for res in res_list if res.data is not None})}
 
     _scan = Scan(result=result,
                  no_result=no_result,
                  stats=stats,  # prepare_stats(result, no_result, stats)
                  options=_scanner.options)
 
+    if previous:
+        merge_unchanged(_scan, previous, _scanner.unchangedFiles)
+
     compute_summary(_scan)
     return _scan
 
 
+def merge_unchanged(scan: Scan, previous: Scan, unchanged: t.Set[str]):
+    """
+    Takes over the results of files skipped as unchanged from a previous scan of the same paths.
+    Results of archive members are taken over if the archive itself is unchanged.
+    """
+    def is_unchanged(relpath: str) -> bool:
+        if relpath in unchanged:
+            return True
+
+        pos = relpath.find(os.sep)
+        while pos > 0:
+            if relpath[:pos] in unchanged:
+                return True
+            pos = relpath.find(os.sep, pos + 1)
+
+        return False
+
+    for relpath, res in previous.result.items():
+        if relpath not in scan.result and is_unchanged(relpath):
+            scan.result[relpath] = res
+
+    no_result = set(scan.no_result)
+    scan.no_result.extend(p for p in previous.no_result if p not in no_result and is_unchanged(p))
+
+
 def prepare_stats(result, no_result, stats):
     copyrights = {}
     copyrights_info_count = 0
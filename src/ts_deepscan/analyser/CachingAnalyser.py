@@ -10,7 +10,7 @@ import xxhash
 
 from pathlib import Path
 
-from . import FileAnalyser, AnalysisResult
+from . import FileAnalyser, AnalysisResult, FileContent
 from ..caching import ResultsCache, CacheableResult, DEFAULT_CACHE_DIR
 
 
@@ -26,6 +26,11 @@ def _fast_file_hash(path: Path, blocksize: int = 1 << 20) -> str:
     return h.hexdigest()
 
 
+def _fast_content_hash(data: bytes) -> str:
+    """Compute a fast xxhash64 hash of in-memory file contents."""
+    return xxhash.xxh64(data).hexdigest()
+
+
 def _options_fingerprint(opts: t.Optional[t.Mapping[str, t.Any]]) -> t.Optional[str]:
     """Compute a fingerprint for options dict to include in cache key."""
     if not opts:
@@ -59,7 +64,7 @@ class CacheableAnalysisResult(AnalysisResult, CacheableResult):
         category: str,
         data: t.Any,
         cache_key: str,
-        fastpath_key: str,
+        fastpath_key: t.Optional[str],
         file_size: int,
         mtime_ns: int,
     ):
@@ -117,9 +122,30 @@ class CachingAnalyzer(FileAnalyser):
     @property
     def options(self) -> dict:
         return self.analyser.options
+
+    @property
+    def timeout(self) -> int:
+        return self.analyser.timeout
     
     def _match(self, path: Path) -> bool:
         return self.analyser._match(path)
+
+    def warm_up(self):
+        self.analyser.warm_up()
+
+    def may_accept(self, name: str, size: int) -> bool:
+        return self.analyser.may_accept(name, size)
+
+    def accepts_content(self, content: FileContent) -> bool:
+        # Contents with a cached result under their upfront key are accepted without reading them. The key
+        # includes the file name, since the analyser may accept the same contents under one name only.
+        if content.digest:
+            hit, _ = self._cache.get(self._make_digest_key(content.digest, content.name,
+                                                           _options_fingerprint(self.options)))
+            if hit:
+                return True
+
+        return self.analyser.accepts_content(content)
     
     def _make_cache_key(
         self,
@@ -131,6 +157,16 @@ class CachingAnalyzer(FileAnalyser):
         base = f'{self.category}:v{self.version}:{file_hash}:{file_size}'
         return f'{base}:opts:{opt_fp}' if opt_fp else base
     
+    def _make_digest_key(
+        self,
+        digest: str,
+        name: str,
+        opt_fp: t.Optional[str],
+    ) -> str:
+        """Generate the cache key for a content key known upfront (e.g. a git blob id) and a file name."""
+        base = f'{self.category}:v{self.version}:digest:{digest}:{name}'
+        return f'{base}:opts:{opt_fp}' if opt_fp else base
+
     def _make_fastpath_key(
         self,
         path: Path,
@@ -187,6 +223,10 @@ class CachingAnalyzer(FileAnalyser):
         
         # Cache miss → compute
         result = self.analyser.apply(path, root)
+
+        # Partial results of timed out analyses are not cached
+        if result and result.timeout:
+            return result
         
         # Get current stat for cache info (file may have changed during analysis)
         st_now = path.stat()
@@ -214,6 +254,73 @@ class CachingAnalyzer(FileAnalyser):
                 mtime_ns=st_now.st_mtime_ns,
             )
     
+    def apply_content(self, content: FileContent) -> t.Optional[AnalysisResult]:
+        """
+        Apply analysis of file contents with caching support.
+
+        Contents with a content key known upfront (e.g. a git blob id) are looked up by the key, so that
+        they are not read at all on a hit. Contents of files on disk are looked up using the stat-based
+        fast-path first. Otherwise the content hash is used, it is computed once per file and shared
+        by all caching wrappers.
+        """
+        opt_fp = _options_fingerprint(self.options)
+
+        fastpath_key = None
+        st = None
+
+        if content.digest:
+            cache_key = self._make_digest_key(content.digest, content.name, opt_fp)
+        else:
+            if content.source and self.use_fastpath:
+                st = content.stat or content.source.stat()
+                fastpath_key = self._make_fastpath_key(content.source, opt_fp)
+
+                hit, data = self._cache.get_with_fastpath(
+                    cache_key='',
+                    fastpath_key=fastpath_key,
+                    file_size=st.st_size,
+                    mtime_ns=st.st_mtime_ns,
+                )
+                if hit:
+                    return AnalysisResult(self.category, data) if data is not None else None
+
+            if content.hash is None:
+                content.hash = _fast_content_hash(content.data)
+
+            cache_key = self._make_cache_key(content.hash, content.size, opt_fp)
+
+        hit, data = self._cache.get(cache_key)
+        if hit:
+            # Refresh fastpath
+            if fastpath_key and st:
+                self._cache.set_with_fastpath(cache_key, data, fastpath_key, st.st_size, st.st_mtime_ns)
+            return AnalysisResult(self.category, data) if data is not None else None
+
+        result = self.analyser.apply_content(content)
+
+        # Partial results of timed out analyses are not cached
+        if result and result.timeout:
+            return result
+
+        if self.auto_store:
+            data = result.data if result else None
+            if fastpath_key and st:
+                self._cache.set_with_fastpath(cache_key, data, fastpath_key, st.st_size, st.st_mtime_ns)
+            else:
+                self._cache.set(cache_key, data)
+            return result
+        else:
+            if result is None:
+                return None
+            return CacheableAnalysisResult(
+                category=result.category,
+                data=result.data,
+                cache_key=cache_key,
+                fastpath_key=fastpath_key,
+                file_size=st.st_size if st else content.size,
+                mtime_ns=st.st_mtime_ns if st else 0,
+            )
+
     def store(self, cacheable: CacheableAnalysisResult) -> AnalysisResult:
         """
         Store a CacheableAnalysisResult in the cache.
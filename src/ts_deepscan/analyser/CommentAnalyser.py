@@ -2,12 +2,14 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import time
 import typing as t
 from pathlib import Path
 
-from . import SourceCodeAnalyser, AnalysisResult
+from . import SourceCodeAnalyser, AnalysisResult, FileContent
 from .Dataset import Dataset
-from .textutils import analyse_text, analyse_license_text
+from .scancode import deadline_tracking
+from .textutils import analyse_text, analyse_license_text, load_models
 
 from ..commentparser import Comment, extract_comments
 from ..commentparser.language import Lang, classify
@@ -24,6 +26,9 @@ class CommentAnalyser(SourceCodeAnalyser):
     def category(self) -> str:
         return 'comments'
 
+    def warm_up(self):
+        load_models(self.dataset)
+
     @property
     def options(self) -> dict:
         # TODO: add categorization of options: 'include_copyright' -> 'comments.include_copyright'
@@ -34,36 +39,56 @@ class CommentAnalyser(SourceCodeAnalyser):
 
     def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
         with path.open(errors="surrogateescape") as fp:
-            content = fp.read()
-            comments = extract_comments(content, classify(path))
-
-            # Merge comments
-            if comments:
-                merged = []
-                cur, *tail = comments
-
-                for c in tail:
-                    if c.startLine == cur.endLine + 1:
-                        cur = Comment(cur.startLine, c.endLine, cur.text + '\n' + c.text)
+            return self._analyse(fp.read(), classify(path))
+
+    def apply_content(self, content: FileContent) -> t.Optional[AnalysisResult]:
+        return self._analyse(content.text, classify(content.path))
+
+    def _analyse(self, content: str, lang: Lang) -> t.Optional[AnalysisResult]:
+        deadline = self.deadline()
+        comments = extract_comments(content, lang)
+
+        # Merge comments
+        if comments:
+            merged = []
+            cur, *tail = comments
+
+            for c in tail:
+                if c.startLine == cur.endLine + 1:
+                    cur = Comment(cur.startLine, c.endLine, cur.text + '\n' + c.text)
+                else:
+                    merged.append(cur)
+                    cur = c
+
+            merged.append(cur)
+            results = []
+            skipped = False
+
+            with deadline_tracking() as stopped:
+                for res in self.__analyse_comments(merged, deadline):
+                    if res is None:
+                        skipped = True
                     else:
-                        merged.append(cur)
-                        cur = c
+                        results.append(res)
 
-                merged.append(cur)
-                results = []
-                for res in self.__analyse_comments(merged):
-                    results.append(res)
+            # Comments left after the deadline are not analysed, the results are flagged as partial
+            if stopped() or skipped:
+                return AnalysisResult(self.category, results or None, timeout=True)
 
-                if len(results) > 0:
-                    return AnalysisResult(self.category, results)
+            if len(results) > 0:
+                return AnalysisResult(self.category, results)
 
         return None
 
-    def __analyse_comments(self, comments) -> t.Iterable[dict]:
+    def __analyse_comments(self, comments, deadline: float) -> t.Iterable[t.Optional[dict]]:
+        """
+        Yields the results of the comments, and None if the comments left are skipped at the deadline.
+        """
         if len(comments) > 0:
             head, *tail = comments
             res = analyse_license_text(head.text, self.dataset,
-                                       search_copyright=self.include_copyright)
+                                       search_copyright=self.include_copyright,
+                                       deadline=deadline)
             if res:
                 res['line'] = head.startLine
                 res['endLine'] = head.endLine
@@ -72,8 +97,12 @@ class CommentAnalyser(SourceCodeAnalyser):
                 yield res
 
         for c in comments:
+            if time.time() > deadline:
+                yield None
+                break
+
             res = analyse_text(c.text, self.dataset,
-                               timeout=self.timeout,
+                               deadline=deadline,
                                search_copyright=self.include_copyright)
             if res:
                 res['line'] = c.startLine
@@ -3,7 +3,7 @@ import typing as t
 
 from pathlib import Path
 
-from ..analyser import SourceCodeAnalyser, AnalysisResult
+from ..analyser import SourceCodeAnalyser, AnalysisResult, FileContent
 from ..commentparser.language import Lang, classify
 
 
@@ -22,13 +22,19 @@ class CryptoAnalyser(SourceCodeAnalyser):
         }
 
     def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
+        with path.open('rb') as fp:
+            return self._analyse(fp.read())
+
+    def apply_content(self, content: FileContent) -> t.Optional[AnalysisResult]:
+        return self._analyse(content.data)
+
+    def _analyse(self, content: bytes) -> t.Optional[AnalysisResult]:
         result = set()
 
         def _report_result(algorithm, coding):
             result.add((algorithm, coding))
 
-        with path.open('rb') as fp:
-            pyminr.find_crypto_algorithms(fp.read(), _report_result)
+        pyminr.find_crypto_algorithms(content, _report_result)
 
         data = [{'algorithm': res[0], 'coding': res[1]} for res in result]
         return AnalysisResult(self.category, data) if data else None
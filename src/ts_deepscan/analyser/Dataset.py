@@ -1,19 +1,50 @@
 # SPDX-FileCopyrightText: 2020 EACG GmbH
 #
 # SPDX-License-Identifier: Apache-2.0
+import os
 import json
+import mmap
+import bisect
 import shutil
+import struct
+import tempfile
 import typing as t
 
 from pathlib import Path
 
 
+# Licenses which are not searched for by their keys, since the keys are common words or names
+_ignored_aliases = [
+    'Intel', 'MIT', 'Crossword', 'Cube', 'curl', 'DOC', 'EPICS', 'Fair', 'Glide', 'JSON', 'Libpng', 'MakeIndex',
+    'Nokia', 'Noweb', 'NTP', 'OML', 'OpenSSL', 'Plexus', 'PostgreSQL', 'psutils', 'psfrag', 'Ruby', 'Saxpath',
+    'Sendmail', 'Sleepycat', 'TCL', 'Vim', 'W3C', 'X11', 'Xerox', 'Xnet', 'Zed', 'Zlib'
+]
+
+
 class Dataset(object):
+    """
+    License texts prepared for matching. The data is built once and cached as JSON in the dataset folder.
+
+    Matching uses the compact representation of the data (see CompactDataset), which is memory mapped from
+    the dataset folder, so that all worker processes share the same pages. The JSON data is loaded only
+    for building the compact representation.
+    """
+
     def __init__(self, path: Path):
         self.__path = path
         self.__datasetpath = self.__path / 'dataset.json'
+        self.__compactpath = self.__path / 'dataset.bin'
 
         self.__data = None
+        self.__compact: t.Optional[CompactDataset] = None
+        self.__loaded = False
+
+    def __getstate__(self):
+        # Neither the data nor the mapping are passed to other processes, the file is mapped again on demand
+        state = self.__dict__.copy()
+        state['_Dataset__data'] = None
+        state['_Dataset__compact'] = None
+        return state
 
     @property
     def _licenses(self) -> t.Iterable[t.Tuple[str, dict]]:
@@ -24,14 +55,29 @@ class Dataset(object):
 
     @property
     def data(self) -> t.Dict[str, t.Any]:
-        if self.__data is None:
+        if not self.__loaded:
             raise Exception('Dataset is not loaded.')
 
+        if self.__data is None:
+            with open(self.__datasetpath, 'r') as fp:
+                self.__data = json.load(fp)
+
         return self.__data
 
+    @property
+    def compact(self) -> 'CompactDataset':
+        if not self.__loaded:
+            raise Exception('Dataset is not loaded.')
+
+        if self.__compact is None:
+            self.__compact = CompactDataset(self.__compactpath)
+
+        return self.__compact
+
     def load(self, rebuildcache=False):
         path = self.__path
         datasetpath = self.__datasetpath
+        compactpath = self.__compactpath
 
         if path.is_file():
             raise Exception('Cannot build dataset. {} is a file.'.format(path))
@@ -49,9 +95,15 @@ class Dataset(object):
         if rebuildcache:
             self.__data = self._build()
 
-        if not self.__data:
-            with open(datasetpath, 'r') as fp:
-                self.__data = json.load(fp)
+        self.__loaded = True
+
+        if rebuildcache or not compactpath.exists() or \
+                compactpath.stat().st_mtime_ns < datasetpath.stat().st_mtime_ns:
+            CompactDataset.build(self.data, compactpath)
+
+        # Matching works on the compact representation, the JSON data is loaded again only if requested
+        self.__data = None
+        self.__compact = CompactDataset(compactpath)
 
     def _build(self):
         data = self._build_data()
@@ -85,3 +137,207 @@ def _build_entry(text):
         'hash': compute_hash(doc),
         'orths': [tok.orth for tok in similarity_tokens_from_doc(doc)]
     }
+
+
+class CompactDataset(object):
+    """
+    Array based representation of the dataset stored in a single file, which is memory mapped read-only.
+    Processes mapping the file share its pages instead of holding copies of the data as Python objects.
+
+    The file contains:
+     - sorted unique orths (64-bit token ids of spaCy) of all licenses as a flat array with offsets per license,
+     - an inverted index from orths to the licenses containing them, used to count common tokens,
+     - an open addressing hash table over the text hashes of the licenses,
+     - keys, names and aliases of the licenses as JSON.
+    """
+
+    _magic = b'TSDSCMP1'
+
+    # Magic, number of licenses, orths, terms, postings, hash table slots and length of the JSON metadata
+    _header = struct.Struct('<8s6Q')
+    _header_size = 64
+
+    def __init__(self, path: Path):
+        self.path = path
+
+        with open(path, 'rb') as fp:
+            self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        buf = memoryview(self._mm)
+
+        magic, n, n_orths, n_terms, n_postings, n_slots, n_meta = CompactDataset._header.unpack_from(buf)
+        if magic != CompactDataset._magic:
+            raise Exception('{} is not a compact dataset.'.format(path))
+
+        pos = CompactDataset._header_size
+
+        def section(count: int, fmt: str) -> memoryview:
+            nonlocal pos
+            size = count * struct.calcsize(fmt)
+            view = buf[pos:pos + size].cast(fmt)
+            pos += _aligned(size)
+            return view
+
+        self._offsets = section(n + 1, 'Q')
+        self._orths = section(n_orths, 'Q')
+        self._terms = section(n_terms, 'Q')
+        self._term_offsets = section(n_terms + 1, 'Q')
+        self._postings = section(n_postings, 'I')
+        self._digests = section(n * 16, 'B')
+        self._slots = section(n_slots, 'I')
+
+        meta = json.loads(bytes(buf[pos:pos + n_meta]))
+
+        self.keys: t.List[str] = meta['keys']
+        self.names: t.List[str] = meta['names']
+        # Strings the licenses are searched for in texts, incl. their keys and names
+        self.aliases: t.List[t.List[str]] = meta['aliases']
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def orths(self, index: int) -> memoryview:
+        """
+        Returns the sorted unique orths of a license.
+        """
+        return self._orths[self._offsets[index]:self._offsets[index + 1]]
+
+    def find_hash(self, hsh: str) -> t.Optional[str]:
+        """
+        Returns the key of the license having the text hash (see textutils.compute_hash).
+        """
+        digest = bytes.fromhex(hsh)
+        mask = len(self._slots) - 1
+        slot = int.from_bytes(digest[:8], 'little') & mask
+
+        while i := self._slots[slot]:
+            if self._digests[(i - 1) * 16:i * 16] == digest:
+                return self.keys[i - 1]
+            slot = (slot + 1) & mask
+
+        return None
+
+    def best_match(self, orths: t.Set[int]) -> t.Tuple[t.Optional[str], float]:
+        """
+        Returns the license most similar to a set of orths and the similarity score (Dice coefficient).
+        Ties are resolved in favour of the license coming first in the dataset.
+        """
+        common: t.Dict[int, int] = {}
+        terms = self._terms
+
+        for orth in orths:
+            pos = bisect.bisect_left(terms, orth)
+
+            if pos < len(terms) and terms[pos] == orth:
+                for i in self._postings[self._term_offsets[pos]:self._term_offsets[pos + 1]]:
+                    common[i] = common.get(i, 0) + 1
+
+        lic = None
+        index = -1
+        score = 0.0
+
+        for i, c in common.items():
+            similarity = float(2 * c) / (len(orths) + self._offsets[i + 1] - self._offsets[i])
+
+            if similarity > score or (similarity == score and i < index):
+                score = similarity
+                index = i
+                lic = self.keys[i]
+
+        return lic, score
+
+    @staticmethod
+    def build(data: t.Dict[str, t.Any], path: Path):
+        """
+        Writes the compact representation of the dataset data into a file.
+        """
+        keys = list(data.keys())
+        names = []
+        aliases = []
+
+        offsets = [0]
+        orths = []
+        postings: t.Dict[int, t.List[int]] = {}
+
+        for i, key in enumerate(keys):
+            entry = data[key]
+
+            lic_orths = sorted(set(entry['orths']))
+            orths.extend(lic_orths)
+            offsets.append(len(orths))
+
+            for orth in lic_orths:
+                postings.setdefault(orth, []).append(i)
+
+            name = entry.get('name', '')
+            names.append(name)
+
+            lic_aliases = list(entry.get('aliases', []))
+            if key not in lic_aliases and key not in _ignored_aliases:
+                lic_aliases.append(key)
+            if name not in lic_aliases:
+                lic_aliases.append(name)
+            aliases.append(lic_aliases)
+
+        terms = sorted(postings.keys())
+        term_offsets = [0]
+        flat_postings = []
+
+        for term in terms:
+            flat_postings.extend(postings[term])
+            term_offsets.append(len(flat_postings))
+
+        # Power of two slots, the table is at most half full
+        n_slots = 1 << max(len(keys) * 2 - 1, 1).bit_length()
+        slots = [0] * n_slots
+        digests = bytearray()
+
+        for i, key in enumerate(keys):
+            digest = bytes.fromhex(data[key]['hash'])
+            digests += digest
+
+            slot = int.from_bytes(digest[:8], 'little') & (n_slots - 1)
+            while slots[slot]:
+                slot = (slot + 1) & (n_slots - 1)
+            slots[slot] = i + 1
+
+        meta = json.dumps({'keys': keys, 'names': names, 'aliases': aliases}).encode('utf-8')
+
+        sections = [
+            struct.pack(f'<{len(offsets)}Q', *offsets),
+            struct.pack(f'<{len(orths)}Q', *orths),
+            struct.pack(f'<{len(terms)}Q', *terms),
+            struct.pack(f'<{len(term_offsets)}Q', *term_offsets),
+            struct.pack(f'<{len(flat_postings)}I', *flat_postings),
+            bytes(digests),
+            struct.pack(f'<{n_slots}I', *slots)
+        ]
+
+        header = CompactDataset._header.pack(CompactDataset._magic, len(keys), len(orths), len(terms),
+                                             len(flat_postings), n_slots, len(meta))
+
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.dataset')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(header.ljust(CompactDataset._header_size, b'\0'))
+
+                for sec in sections:
+                    fp.write(sec.ljust(_aligned(len(sec)), b'\0'))
+
+                fp.write(meta)
+
+            os.replace(tmp, path)
+
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def _aligned(size: int) -> int:
+    return (size + 7) & ~7
@@ -3,10 +3,14 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import re
+import time
+
+from pathlib import PurePosixPath
 
 from .textutils import *
 
-from . import TextFileAnalyser, AnalysisResult
+from . import TextFileAnalyser, AnalysisResult, FileContent
+from .scancode import deadline_tracking
 from ..analyser.Dataset import Dataset
 from ..commentparser.language import Lang, classify
 
@@ -34,8 +38,14 @@ class LicenseAnalyser(TextFileAnalyser):
     def category(self) -> str:
         return 'license'
 
-    def _match(self, path):
-        return classify(path) == Lang.Unknown and super()._match(path)
+    def warm_up(self):
+        load_models(self.dataset)
+
+    def may_accept(self, name: str, size: int) -> bool:
+        return classify(PurePosixPath(name)) == Lang.Unknown and super().may_accept(name, size)
+
+    def _match_content(self, content: FileContent) -> bool:
+        return content.probe.lang == Lang.Unknown and super()._match_content(content)
 
     @property
     def options(self) -> dict:
@@ -48,16 +58,33 @@ class LicenseAnalyser(TextFileAnalyser):
 
     def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
         with path.open('r', encoding='utf-8', errors="surrogateescape") as fp:
-            result = None
-            content = fp.read()
-            
+            return self._analyse(fp.read(), path.name)
+
+    def apply_content(self, content: FileContent) -> t.Optional[AnalysisResult]:
+        return self._analyse(content.text, content.name)
+
+    def _analyse(self, content: str, filename: str) -> t.Optional[AnalysisResult]:
+        result = None
+        skipped = False
+        deadline = self.deadline()
+
+        with deadline_tracking() as stopped:
             if len(content) < MAX_LICENSE_TEXT_LENGTH:
-                if re.search('|'.join(_common_license_file_names), path.name, re.IGNORECASE):
-                    result = analyse_license_text(content, self.dataset, search_copyright=self.include_copyright)
+                if re.search('|'.join(_common_license_file_names), filename, re.IGNORECASE):
+                    result = analyse_license_text(content, self.dataset,
+                                                  search_copyright=self.include_copyright,
+                                                  deadline=deadline)
 
             if result is None and self.analyse_all_text_files:
-                result = analyse_text(content, self.dataset,
-                                      timeout=self.timeout,
-                                      search_copyright=self.include_copyright)
+                if time.time() <= deadline:
+                    result = analyse_text(content, self.dataset,
+                                          deadline=deadline,
+                                          search_copyright=self.include_copyright)
+                else:
+                    skipped = True
+
+        # Partial results are flagged, the file is reported as timed out even without any results
+        if stopped() or skipped:
+            return AnalysisResult(self.category, result or None, timeout=True)
 
-            return AnalysisResult(self.category, result) if result else None
+        return AnalysisResult(self.category, result) if result else None
@@ -3,7 +3,7 @@ import typing as t
 from pathlib import Path
 from scanoss.winnowing import Winnowing
 
-from ..analyser import SourceCodeAnalyser, AnalysisResult
+from ..analyser import SourceCodeAnalyser, AnalysisResult, FileContent
 from ..commentparser.language import Lang, classify
 
 
@@ -30,3 +30,9 @@ class ScanossAnalyser(SourceCodeAnalyser):
         else:
             return None
 
+    def apply_content(self, content: FileContent) -> t.Optional[AnalysisResult]:
+        # Only text files are accepted, see SourceCodeAnalyser
+        if res := self._winnowing.wfp_for_contents(content.relpath, False, bytes(content.data)):
+            return AnalysisResult(self.category, {'wfp': res})
+        else:
+            return None
@@ -3,12 +3,17 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import yara
+import hashlib
 import typing as t
 
 from io import StringIO, BytesIO
 from pathlib import Path
 
-from . import FileAnalyser, AnalysisResult
+from . import FileAnalyser, AnalysisResult, FileContent
+
+
+# Rules loaded in the process by the digest of the compiled rules, workers inherit the ones of their template
+_loaded_rules: t.Dict[str, yara.Rules] = {}
 
 
 class YaraAnalyser(FileAnalyser):
@@ -44,20 +49,44 @@ class YaraAnalyser(FileAnalyser):
             'includeYara': True
         }
 
-    def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
-        res = []
+    def warm_up(self):
+        self._get_rules()
 
+    def _get_rules(self) -> t.Optional[yara.Rules]:
         if not self._rules and self._rules_buf:
+            with self._rules_buf.getbuffer() as buf:
+                digest = hashlib.sha1(buf).hexdigest()
+
             self._rules_buf.seek(0)
             try:
-                self._rules = yara.load(file=self._rules_buf)
+                if (rules := _loaded_rules.get(digest)) is None:
+                    rules = _loaded_rules[digest] = yara.load(file=self._rules_buf)
+                self._rules = rules
             finally:
                 self._rules_buf.close()
                 self._rules_buf = None
 
-        if self._rules:
+        return self._rules
+
+    def accepts_content(self, content: FileContent) -> bool:
+        return content.probe.exists
+
+    def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
+        return self._match_rules(filepath=str(path))
+
+    def apply_content(self, content: FileContent) -> t.Optional[AnalysisResult]:
+        # Let YARA read large files on its own instead of passing the mapped file
+        if content.mapped:
+            return self._match_rules(filepath=str(content.source))
+
+        return self._match_rules(data=content.data)
+
+    def _match_rules(self, **target) -> t.Optional[AnalysisResult]:
+        res = []
+
+        if rules := self._get_rules():
             try:
-                for m in self._rules.match(str(path), timeout=self.timeout):
+                for m in rules.match(**target, timeout=self.timeout):
                     res.append({
                         f'{m.rule}': m.meta
                     })
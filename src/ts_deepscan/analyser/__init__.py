@@ -2,16 +2,206 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import os
+import sys
+import mmap
+import time
+import codecs
+import shutil
+import weakref
+import tempfile
+import functools
+import contextvars
 import typing as t
 
-from pathlib import Path
+from pathlib import Path, PurePosixPath
+from contextlib import contextmanager
 from abc import ABC, abstractmethod
 
+from ..commentparser.language import Lang, classify
+
 
 class AnalysisResult:
-    def __init__(self, category: str, data: t.Any):
+    def __init__(self, category: str, data: t.Any, timeout: bool = False):
         self.category = category
         self.data = data
+        # Set if the analysis was stopped at its deadline, the data is partial then, or None if nothing
+        # has been found until then
+        self.timeout = timeout
+
+
+# Files of at least this size are memory mapped instead of being read into memory
+_mmap_min_size = 1 << 24
+
+# Deadline of the file being analysed, shared by all of its analysers (see file_budget)
+_file_deadline: contextvars.ContextVar[float] = contextvars.ContextVar('file_deadline', default=sys.maxsize)
+
+
+@contextmanager
+def file_budget(seconds: float) -> t.Iterator[float]:
+    """
+    Sets a time budget shared by all analysers of a file, so that a file cannot take the timeout
+    of each analyser one after another. Yields the deadline of the file (see time.time).
+    """
+    deadline = time.time() + seconds if seconds > 0 else sys.maxsize
+    token = _file_deadline.set(deadline)
+
+    try:
+        yield deadline
+    finally:
+        _file_deadline.reset(token)
+
+
+class FileContent(object):
+    """
+    Contents of a file shared by all analysers of the file, so that the file is read only once.
+
+    The data is either given as an in-memory buffer (e.g. a member of an archive) or read lazily
+    from a file on disk on first access. Large files are memory mapped. The decoded text is computed
+    on first access as well. Analysers requiring a real path receive the file on disk, or a temporary
+    file for in-memory contents, which is written once and shared by all analysers (see FileContent.as_file).
+    """
+
+    def __init__(self, relpath: str, data: t.Optional[bytes] = None, digest: t.Optional[str] = None):
+        # Relative path of the file, e.g. 'lib/archive.jar/inner/path'
+        self.relpath = relpath
+        # Content key known upfront, e.g. a git blob id
+        self.digest = digest
+        # Content hash, computed once by the first consumer
+        self.hash: t.Optional[str] = None
+
+        # File on disk the data is read from, and its root directory
+        self.source: t.Optional[Path] = None
+        self.root: t.Optional[Path] = None
+        self.stat: t.Optional[os.stat_result] = None
+
+        self._data = data
+        self._text: t.Optional[str] = None
+        self._probe: t.Optional[FileProbe] = None
+
+        # Temporary file of in-memory contents and its root, removed by close
+        self._file: t.Optional[t.Tuple[Path, Path]] = None
+        self._remove_file: t.Optional[weakref.finalize] = None
+
+    @staticmethod
+    def from_file(path: Path,
+                  root: t.Optional[Path] = None,
+                  stat: t.Optional[os.stat_result] = None,
+                  digest: t.Optional[str] = None) -> 'FileContent':
+        content = FileContent(str(path.relative_to(root) if root else path), None, digest)
+
+        content.source = path
+        content.root = root
+        content.stat = stat
+
+        return content
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    @property
+    def path(self) -> PurePosixPath:
+        return PurePosixPath(self.relpath)
+
+    @property
+    def size(self) -> int:
+        if self._data is None and self.source:
+            if self.stat is None:
+                self.stat = self.source.stat()
+            return self.stat.st_size
+
+        return len(self.data)
+
+    @property
+    def mapped(self) -> bool:
+        """
+        True if the data is memory mapped rather than a bytes object.
+        """
+        return bool(self.source) and self.size >= _mmap_min_size
+
+    @property
+    def data(self) -> t.Union[bytes, mmap.mmap]:
+        if self._data is None:
+            self._data = self._load()
+        return self._data
+
+    def _load(self) -> t.Union[bytes, mmap.mmap]:
+        if not self.source:
+            return b''
+
+        with self.source.open('rb') as fp:
+            if self.mapped:
+                return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                return fp.read()
+
+    @property
+    def probe(self) -> 'FileProbe':
+        if self._probe is None:
+            self._probe = FileProbe(self)
+        return self._probe
+
+    def head(self, size: int) -> bytes:
+        """
+        Returns the first bytes of the data without loading the whole file.
+        """
+        if self._data is None and self.source:
+            with self.source.open('rb') as fp:
+                return fp.read(size)
+
+        return self.data[:size]
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = str(self.data, 'utf-8', errors='surrogateescape')
+        return self._text
+
+    def __getstate__(self):
+        # Do not pickle the decoded text and data which can be read from disk again
+        state = self.__dict__.copy()
+        state['_text'] = None
+        if self.source:
+            state['_data'] = None
+        # The temporary file belongs to the process which has written it
+        state['_file'] = None
+        state['_remove_file'] = None
+        return state
+
+    @contextmanager
+    def as_file(self) -> t.Iterator[t.Tuple[Path, t.Optional[Path]]]:
+        """
+        Yields the file path together with its root. In-memory contents are written into a temporary
+        directory, so that the relative path of the file is preserved. The temporary file is written on
+        first use only and kept until the contents are closed (see close).
+        """
+        if self.source:
+            yield self.source, self.root
+            return
+
+        if self._file is None:
+            root = Path(tempfile.mkdtemp(prefix='ts-deepscan-'))
+            # Removes the file once closed, or at the latest when the contents are dropped
+            self._remove_file = weakref.finalize(self, shutil.rmtree, root, ignore_errors=True)
+
+            path = root / self.relpath
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(self.data)
+
+            self._file = (path, root)
+
+        yield self._file
+
+    def close(self):
+        """
+        Removes the temporary file of in-memory contents, if one has been written (see as_file).
+        """
+        if self._remove_file:
+            self._remove_file()
+
+        self._file = None
+        self._remove_file = None
 
 
 class FileAnalyser(ABC):
@@ -30,9 +220,48 @@ class FileAnalyser(ABC):
     def category(self) -> str:
         raise NotImplementedError()
 
+    def deadline(self) -> float:
+        """
+        Returns the time (see time.time) by which the analysis of a file started now has to be finished,
+        at the latest when the budget of the file is used up (see file_budget). Long running analysers
+        check it cooperatively and return partial results once it has passed.
+        """
+        deadline = time.time() + self.timeout if self.timeout > 0 else sys.maxsize
+        return min(deadline, _file_deadline.get())
+
     def __call__(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
         return self.apply(path, root) if self.accepts(path) else None
 
+    def warm_up(self):
+        """
+        Loads what the analyser needs up front, e.g. models, indexes or compiled rules, instead of on the first file.
+        Workers are forked from a process having done it (see scanner.pool.preload), the default does nothing.
+        """
+        pass
+
+    def may_accept(self, name: str, size: int) -> bool:
+        """
+        Checks by the name and the size of a file only, i.e. without reading it, if the file may be accepted
+        (see accepts_content). Files failing the check are not accepted for sure. The default accepts any file.
+        """
+        return True
+
+    def accepts_content(self, content: FileContent) -> bool:
+        """
+        Checks if the file contents can be analysed. The default implementation falls back to the path
+        of the file (or of a temporary file for in-memory contents), analysers able to work on buffers override it.
+        """
+        with content.as_file() as (path, _):
+            return self.accepts(path)
+
+    def apply_content(self, content: FileContent) -> t.Optional[AnalysisResult]:
+        """
+        Analyses the file contents. The default implementation falls back to the path of the file
+        (or of a temporary file for in-memory contents), analysers able to work on buffers override it.
+        """
+        with content.as_file() as (path, root):
+            return self.apply(path, root)
+
     @abstractmethod
     def _match(self, path: Path) -> bool:
         raise NotImplementedError()
@@ -52,48 +281,92 @@ class FileAnalyser(ABC):
             return False
 
 
-class TextFileAnalyser(FileAnalyser, ABC):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+# Common binary file signatures
+_binary_signatures = (b'\x89PNG', b'\xff\xd8\xff', b'GIF8', b'\x00\x00\x00', b'PK\x03\x04')
 
-    def _match(self, path: Path) -> bool:
-        if not path.exists():
-            return False
+# Number of bytes used to check if a file is a text file
+_text_probe_size = 8192
 
-        if path.stat().st_size > self.max_file_size:
-            return False
 
-        # Check for common binary file signatures
+def _is_text(head: bytes, eof: bool) -> bool:
+    """
+    Checks if the head of a file looks like UTF-8 encoded text.
+    """
+    header = head[:8]
+
+    if header.startswith(_binary_signatures):
+        return False
+
+    # Check for null bytes in header (often found in binary files)
+    if b'\x00' in header:
+        return False
+
+    # Try to decode as UTF-8 text with strict error handling
+    try:
+        codecs.getincrementaldecoder('utf-8')('strict').decode(head, final=eof)
+        return True
+
+    except UnicodeDecodeError:
+        return False
+
+
+class FileProbe(object):
+    """
+    Properties of a file checked by the analysers to decide if they accept the file. The probe is computed
+    once per file and shared by all analysers, the text check and the language are computed on first use.
+    """
+
+    def __init__(self, content: FileContent):
+        self._content = content
+
         try:
-            with path.open('rb') as fp:
-                header = fp.read(8)
-                                
-                if header.startswith((b'\x89PNG', b'\xff\xd8\xff', b'GIF8', b'\x00\x00\x00', b'PK\x03\x04')):
-                    return False
-                
-                # Check for null bytes in header (often found in binary files)                
-                if b'\x00' in header:
-                    return False
-                
-        except (IOError, OSError):
+            self.size = content.size
+            self.exists = True
+        except OSError:
+            self.size = 0
+            self.exists = False
+
+    @functools.cached_property
+    def is_text(self) -> bool:
+        if not self.exists:
             return False
 
-        # Try to read as UTF-8 text with strict error handling
         try:
-            with path.open('r', encoding='utf-8', errors='strict') as fp:
-                # Read first chunk to validate it's text
-                fp.read(1024)
-                return True
-            
-        except (UnicodeDecodeError, IOError, OSError):
+            head = self._content.head(_text_probe_size)
+        except OSError:
             return False
 
+        return _is_text(head, eof=self.size <= _text_probe_size)
 
-class SourceCodeAnalyser(TextFileAnalyser, ABC):
+    @functools.cached_property
+    def lang(self) -> Lang:
+        return classify(self._content.path)
+
+
+class TextFileAnalyser(FileAnalyser, ABC):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     def _match(self, path: Path) -> bool:
-        from ..commentparser.language import classify, Lang
+        return self._match_content(FileContent.from_file(path))
+
+    def _match_content(self, content: FileContent) -> bool:
+        probe = content.probe
+        return probe.exists and probe.size <= self.max_file_size and probe.is_text
+
+    def may_accept(self, name: str, size: int) -> bool:
+        return size <= self.max_file_size
+
+    def accepts_content(self, content: FileContent) -> bool:
+        return self._match_content(content)
+
+
+class SourceCodeAnalyser(TextFileAnalyser, ABC):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def may_accept(self, name: str, size: int) -> bool:
+        return classify(PurePosixPath(name)) != Lang.Unknown and super().may_accept(name, size)
 
-        return classify(path) != Lang.Unknown and super()._match(path)
\ No newline at end of file
+    def _match_content(self, content: FileContent) -> bool:
+        return content.probe.lang != Lang.Unknown and super()._match_content(content)
@@ -1,20 +1,52 @@
+import sys
+import time
 import typing as t
 import functools
 import warnings
+import contextvars
 
-from time import time
+from contextlib import contextmanager
+
+
+# Flag of the detections run within deadline_tracking, set once one of them has been stopped at its deadline
+_stopped: contextvars.ContextVar[t.Optional[t.List[bool]]] = contextvars.ContextVar('scancode_stopped',
+                                                                                    default=None)
+
+
+@contextmanager
+def deadline_tracking() -> t.Iterator[t.Callable[[], bool]]:
+    """
+    Yields a function telling if a detection run within the block has been stopped at its deadline. scancode checks
+    the deadline while matching and returns early without telling, so a detection returning past its deadline is
+    taken as stopped. Passing the deadline after the detections have returned does not count.
+    """
+    stopped = [False]
+    token = _stopped.set(stopped)
+
+    try:
+        yield lambda: stopped[0]
+    finally:
+        _stopped.reset(token)
+
+
+def _check_deadline(deadline: float):
+    if time.time() > deadline and (stopped := _stopped.get()) is not None:
+        stopped[0] = True
 
 
 def detect_copyrights(text: str,
                       copyrights=True, holders=True, authors=True,
                       include_years=True, include_allrights=False,
-                      timeout=-1):
+                      deadline: float = sys.maxsize):
+    """
+    Detects copyrights, holders and authors. The detection stops at the deadline (see time.time),
+    yielding what has been detected so far.
+    """
 
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
 
         from cluecode.copyrights import Detection, detect_copyrights_from_lines
-        from scancode.interrupt import interruptible
 
     numbered_lines = list(enumerate(text.splitlines()))
 
@@ -24,14 +56,11 @@ def detect_copyrights(text: str,
                                include_holders=holders,
                                include_authors=authors,
                                include_copyright_years=include_years,
-                               include_copyright_allrights=include_allrights)
-    # if timeout > 0:
-    #     detect = functools.partial(detect, deadline=time() + int(timeout / 2.5))
-    #     _, detections = interruptible(detect, timeout=timeout)
-    # else:
-    #     detections = detect()
+                               include_copyright_allrights=include_allrights,
+                               deadline=deadline)
 
     detections = detect()
+    _check_deadline(deadline)
 
     copyrights, holders, authors = Detection.split(detections)
 
@@ -45,9 +74,28 @@ def detect_copyrights(text: str,
         yield 'authors', v.author, v.start_line, v.end_line
 
 
+def load_index():
+    """
+    Loads the license index and the copyright grammar of scancode, which happens on first use otherwise.
+    """
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+
+        from licensedcode.cache import get_index
+
+    get_index()
+
+    for _ in detect_copyrights('Copyright (c) 2020 EACG GmbH'):
+        pass
+
+
 def detect_licenses(text: str,
                     include_text: bool = False,
-                    timeout=-1) -> t.Tuple[list, list, t.Optional[str]]:
+                    deadline: float = sys.maxsize) -> t.Tuple[list, list, t.Optional[str]]:
+    """
+    Detects licenses. The matching stops at the deadline (see time.time), returning the detections found so far.
+    """
 
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
@@ -55,19 +103,14 @@ def detect_licenses(text: str,
         from licensedcode.detection import detect_licenses
         from licensedcode.cache import build_spdx_license_expression, get_cache
         from packagedcode.utils import combine_expressions
-        from scancode.interrupt import interruptible
 
     detect = functools.partial(detect_licenses,
                                query_string=text,
-                               include_text=include_text)
-
-    # if timeout > 0:
-    #     detect = functools.partial(detect, deadline=time() + int(timeout / 2.5))
-    #     _, detections = interruptible(detect, timeout=timeout)
-    # else:
-    #     detections = detect()
+                               include_text=include_text,
+                               deadline=deadline)
 
     detections = detect()
+    _check_deadline(deadline)
 
     lic_detections = []
     lic_expressions = []
@@ -2,6 +2,7 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import sys
 import typing as t
 
 import hashlib
@@ -16,7 +17,7 @@ from spacy.vocab import Vocab
 from spacy.tokens import Doc, Token
 
 from ..spdx import get_licenses_from_spdx
-from ..scancode import detect_copyrights
+from ..scancode import detect_copyrights, load_index
 from ...analyser.Dataset import Dataset
 
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -43,6 +44,17 @@ def create_doc(text: str = '') -> t.Optional[Doc]:
         return Doc(Vocab())
 
 
+def load_models(dataset: Dataset):
+    """
+    Loads the spaCy pipeline, the scancode index and the dataset used by the text analysis.
+    """
+    create_doc()
+    load_index()
+
+    # Maps the compact dataset, its pages are shared through the page cache
+    dataset.compact
+
+
 def word_tokens_from_doc(doc: Doc) -> t.Iterable[Token]:
     return (tok for tok in doc if not (tok.is_space or tok.is_punct))
 
@@ -112,7 +124,7 @@ def compute_file_hash(path: Path) -> t.Tuple[str, str]:
 #
 #     return None #if not results else results[0]
 
-def extract_copyright(text) -> dict:
+def extract_copyright(text, deadline: float = sys.maxsize) -> dict:
     authors = []
     copyrights: t.List[t.Dict[str, t.Any]] = []
 
@@ -127,10 +139,11 @@ def extract_copyright(text) -> dict:
     for spdx_copyright_text in find_spdx_copyright_text(text):
         copyrights.append({'clause': 'SPDX-FileCopyrightText: {}'.format(spdx_copyright_text)})
 
-        for (ty, val, _, _) in detect_copyrights('Copyright {}'.format(spdx_copyright_text), copyrights=False):
+        for (ty, val, _, _) in detect_copyrights('Copyright {}'.format(spdx_copyright_text), copyrights=False,
+                                                 deadline=deadline):
             push_detection_to_results(ty, val)
 
-    for (ty, val, _, _) in detect_copyrights(text):
+    for (ty, val, _, _) in detect_copyrights(text, deadline=deadline):
         if ty == 'copyrights':
             copyrights.append({'clause': val})
         elif ty == 'authors':
@@ -194,24 +207,13 @@ def find_match(text: str, dataset: Dataset):
     hsh = compute_hash(doc)
 
     # Compare hashes
-    for key, val in dataset.data.items():
-        if hsh == val['hash']:
-            return key, 1.0
-
-    lic = None
-    score = 0.0
+    if key := dataset.compact.find_hash(hsh):
+        return key, 1.0
 
     w1 = {tok.orth for tok in similarity_tokens_from_doc(doc)}
 
     # Compute similarity scores
-    for key, val in dataset.data.items():
-        w2 = set(val['orths'])
-
-        similarity = float(2 * len(w1.intersection(w2))) / (len(w1) + len(w2))
-
-        if similarity > score:
-            score = similarity
-            lic = key
+    lic, score = dataset.compact.best_match(w1)
 
     if score >= __similarity_threshold:
         return lic, score
@@ -219,24 +221,11 @@ def find_match(text: str, dataset: Dataset):
         return None, None
 
 
-__ignored_aliases = [
-    'Intel', 'MIT', 'Crossword', 'Cube', 'curl', 'DOC', 'EPICS', 'Fair', 'Glide', 'JSON', 'Libpng', 'MakeIndex',
-    'Nokia', 'Noweb', 'NTP', 'OML', 'OpenSSL', 'Plexus', 'PostgreSQL', 'psutils', 'psfrag', 'Ruby', 'Saxpath',
-    'Sendmail', 'Sleepycat', 'TCL', 'Vim', 'W3C', 'X11', 'Xerox', 'Xnet', 'Zed', 'Zlib'
-]
-
-
 def find_aliases(text: str, dataset: Dataset) -> t.Iterable[str]:
-    for k, v in dataset.data.items():
-        name = v['name']
-        aliases = v['aliases']
-
-        if k not in aliases and k not in __ignored_aliases:
-            aliases.append(k)
-
-        if name not in aliases:
-            aliases.append(name)
+    compact = dataset.compact
 
+    # Aliases include the keys and names of the licenses
+    for k, aliases in zip(compact.keys, compact.aliases):
         for alias in aliases:
             if not alias:
                 continue
@@ -257,8 +246,12 @@ def find_aliases(text: str, dataset: Dataset) -> t.Iterable[str]:
 
 
 def analyse_text(text: str, dataset: Dataset,
-                 timeout: int = -1,
+                 deadline: float = sys.maxsize,
                  search_copyright: bool = True) -> t.Optional[dict]:
+    """
+    Detects licenses and copyrights in a text. The detection stops at the deadline (see time.time),
+    the result contains what has been found so far then.
+    """
 
     from ..scancode import detect_licenses as scancode_detect_licenses
 
@@ -268,7 +261,7 @@ def analyse_text(text: str, dataset: Dataset,
         result['spdx'] = spdx
         result['licenses'] = get_licenses_from_spdx(spdx)
 
-    lics, clues, spdx = scancode_detect_licenses(text, timeout=timeout)
+    lics, clues, spdx = scancode_detect_licenses(text, deadline=deadline)
 
     if spdx:
         result['licenses'] = get_licenses_from_spdx(spdx)
@@ -281,13 +274,15 @@ def analyse_text(text: str, dataset: Dataset,
     if 'licenses' not in result and (lics := list(find_aliases(text, dataset))):
         result['licenses'] = lics
 
-    if search_copyright and (copyrights := extract_copyright(text)):
+    if search_copyright and (copyrights := extract_copyright(text, deadline)):
         result.update(copyrights)
 
     return result if result else None
 
 
-def analyse_license_text(text: str, dataset: Dataset, search_copyright: bool = True) -> t.Optional[dict]:
+def analyse_license_text(text: str, dataset: Dataset,
+                         search_copyright: bool = True,
+                         deadline: float = sys.maxsize) -> t.Optional[dict]:
     key, score = find_match(text, dataset)
     if key:
         result = {
@@ -295,7 +290,7 @@ def analyse_license_text(text: str, dataset: Dataset, search_copyright: bool = T
             'score': score,
         }
 
-        _copyright = extract_copyright(text) if search_copyright else None
+        _copyright = extract_copyright(text, deadline) if search_copyright else None
         if _copyright:
             result.update(_copyright)
 
@@ -21,7 +21,7 @@ class Cacheable(t.Protocol):
     """Protocol for objects that can be stored in the cache."""
     data: t.Any
     cache_key: str
-    fastpath_key: str
+    fastpath_key: t.Optional[str]
     file_size: int
     mtime_ns: int
 
@@ -37,7 +37,7 @@ class CacheableResult:
     Attributes:
         data: The data to cache
         cache_key: The primary cache key (content-based)
-        fastpath_key: The fast-path cache key (stat-based)
+        fastpath_key: The fast-path cache key (stat-based), None for in-memory contents
         file_size: File size at analysis time
         mtime_ns: File modification time (nanoseconds) at analysis time
     """
@@ -46,7 +46,7 @@ class CacheableResult:
         self,
         data: t.Any,
         cache_key: str,
-        fastpath_key: str,
+        fastpath_key: t.Optional[str],
         file_size: int,
         mtime_ns: int,
     ):
@@ -247,13 +247,16 @@ class ResultsCache:
         # Check if data is a Cacheable object
         if cache_key is None:
             cacheable = data
-            self.set_with_fastpath(
-                cacheable.cache_key,
-                cacheable.data,
-                cacheable.fastpath_key,
-                cacheable.file_size,
-                cacheable.mtime_ns,
-            )
+            if cacheable.fastpath_key is None:
+                self.set(cacheable.cache_key, cacheable.data)
+            else:
+                self.set_with_fastpath(
+                    cacheable.cache_key,
+                    cacheable.data,
+                    cacheable.fastpath_key,
+                    cacheable.file_size,
+                    cacheable.mtime_ns,
+                )
         else:
             # All params must be provided
             assert fastpath_key is not None
@@ -8,10 +8,12 @@ import pathlib
 import typing as t
 import shutil
 
+from multiprocessing import AuthenticationError
+
 from .scanner import Scan
 from .analyser import FileAnalyser
 
-from . import create_scanner, execute_scan, upload_scan, baseUrl
+from . import create_scanner, execute_scan, upload_scan, run_worker, merge_scans, baseUrl, parse_jobs, Shard
 
 
 def main():
@@ -25,9 +27,29 @@ def cli():
     pass
 
 
+def validate_jobs(ctx, param, value: str) -> str:
+    try:
+        parse_jobs(value)
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+    return value
+
+
+def validate_shard(ctx, param, value: t.Optional[str]) -> t.Optional[str]:
+    try:
+        if value:
+            Shard.parse(value)
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+    return value
+
+
 @cli.command('scan')
-@click.option('-j', '--jobs', default=-1 if sys.platform != 'win32' else 1,
-              help='Number of parallel jobs')
+@click.option('-j', '--jobs', type=str, default='-1' if sys.platform != 'win32' else '1', callback=validate_jobs,
+              help='Number of parallel jobs, optionally per analyser category, e.g. \'license=12,crypto=2,scanoss=2\'. '
+                   'A plain number in the list applies to the remaining categories')
 @click.option('--timeout', default=FileAnalyser.DEFAULT_TIMEOUT, show_default=True, required=False,
               help='Timeout in seconds for each file')
 @click.option('--max-file-size', default=FileAnalyser.MAX_FILE_SIZE, show_default=True, required=False,
@@ -48,12 +70,49 @@ def cli():
               help='Directory path containing YARA rules')
 @click.option('--ignore-pattern', type=str, multiple=True, required=False,
               help='Unix filename pattern for files that has to be ignored during a scan')
+@click.option('--deduplicate/--no-deduplicate', default=True, show_default=True,
+              help='Analyses files with identical name and content only once')
+@click.option('--git/--no-git', default=False, show_default=True,
+              help='Uses blob ids of files tracked by git as content keys instead of hashing the files')
+@click.option('--git-base', type=str, default=None, required=False,
+              help='Scans only files changed since the given git revision (implies --git)')
+@click.option('--git-revision', type=str, default=None, required=False,
+              help='Scans the given git revision straight from the object store, paths are (bare) repositories')
+@click.option('--time-budget', type=float, default=None, required=False,
+              help='Time budget in seconds for the whole scan. When it runs short, files which cannot be analysed '
+                   'in the time left are skipped and reported as not scanned')
+@click.option('--journal', type=click.Path(path_type=pathlib.Path), required=False,
+              help='Records the completed files in a journal, so that the scan can be resumed if it does not finish')
+@click.option('--resume', type=click.Path(exists=True, path_type=pathlib.Path), required=False,
+              help='Resumes a scan from its journal, files recorded in it are not scanned again. '
+                   'The journal is continued, so it cannot be combined with --journal')
+@click.option('--listen', type=str, default=None, required=False,
+              help='Runs the scan distributed: files are handed out to worker nodes (see \'worker\' command) '
+                   'connecting to this address, given as host:port. Nodes authenticate with the secret '
+                   'in TS_DEEPSCAN_CLUSTER_SECRET')
+@click.option('--local-workers', type=int, default=0, show_default=True,
+              help='Number of worker nodes of a distributed scan started on this machine, each with --jobs workers')
+@click.option('--shard', type=str, default=None, required=False, callback=validate_shard,
+              help='Scans only the part i/N of the files, e.g. \'2/10\'. Files are assigned to the parts by a hash '
+                   'of their paths, the scans of all parts can be combined using the \'merge\' command')
+@click.option('--previous-scan', type=click.Path(exists=True, path_type=pathlib.Path), required=False,
+              help='Previous scan of the same paths, results of unchanged files are taken over from it')
 @click.option('-o', '--output', 'output_path', type=click.Path(path_type=pathlib.Path), required=False,
               help='Output path for the scan')
 @click.argument('paths', type=click.Path(exists=True, path_type=pathlib.Path), nargs=-1)
-def scan(paths: tuple, output_path: t.Optional[pathlib.Path], *args, **kwargs):
-    scanner = create_scanner(*args, **kwargs)
-    s = execute_scan(list(paths), scanner)
+def scan(paths: tuple, output_path: t.Optional[pathlib.Path], previous_scan: t.Optional[pathlib.Path], *args, **kwargs):
+    previous = None
+
+    if previous_scan:
+        with previous_scan.open() as fp:
+            previous = Scan.from_json(fp.read()) # type: ignore
+
+    try:
+        scanner = create_scanner(*args, **kwargs)
+    except ValueError as err:
+        raise click.UsageError(str(err))
+
+    s = execute_scan(list(paths), scanner, previous=previous)
 
     # noinspection PyUnresolvedReferences
     s_json = s.to_json() # type: ignore
@@ -65,6 +124,40 @@ def scan(paths: tuple, output_path: t.Optional[pathlib.Path], *args, **kwargs):
         print(s_json)
 
 
+@cli.command('merge')
+@click.option('-o', '--output', 'output_path', type=click.Path(path_type=pathlib.Path), required=False,
+              help='Output path for the merged scan')
+@click.argument('paths', type=click.Path(exists=True, dir_okay=False, path_type=pathlib.Path), nargs=-1, required=True)
+def merge(paths: tuple, output_path: t.Optional[pathlib.Path]):
+    try:
+        if output_path:
+            with output_path.resolve().open('w') as fp:
+                merge_scans(list(paths), fp)
+        else:
+            merge_scans(list(paths), sys.stdout)
+            print()
+
+    except ValueError as err:
+        raise click.ClickException(f'Cannot merge the scans: {err}')
+
+
+@cli.command('worker')
+@click.option('--connect', type=str, required=True,
+              help='Address of the coordinator of a distributed scan (see --listen of the \'scan\' command), '
+                   'given as host:port. The node authenticates with the secret in TS_DEEPSCAN_CLUSTER_SECRET')
+@click.option('-j', '--jobs', type=str, default='-1', callback=validate_jobs,
+              help='Number of parallel jobs of the node, optionally per analyser category')
+@click.option('--retry', type=float, default=0, show_default=True,
+              help='Time in seconds to retry connecting to the coordinator')
+def worker(connect: str, jobs: str, retry: float):
+    try:
+        run_worker(connect, jobs, retry)
+    except ValueError as err:
+        raise click.UsageError(str(err))
+    except (OSError, AuthenticationError) as err:
+        raise click.ClickException(f'Cannot connect to the coordinator at {connect}: {err}')
+
+
 @cli.command('upload')
 @click.option('--base-url', default=baseUrl,
               help='DeepScan API base URL')
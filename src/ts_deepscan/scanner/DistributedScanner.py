@@ -0,0 +1,448 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import sys
+import time
+import queue
+import secrets
+import threading
+import subprocess
+import collections
+import typing as t
+import multiprocessing.connection as connection
+
+import ts_deepscan.util as util
+
+from . import FileScanInput, ScanResults
+from .Scanner import Scanner, NOT_SCANNED_BUDGET, NOT_SCANNED_CANCELLED
+from .cluster import Address, SECRET_ENV
+from ..analyser import FileAnalyser, FileContent
+
+
+# Max number of files handed out to a worker node at once
+DEFAULT_CLUSTER_BATCH_SIZE = int(os.environ.get('TS_DEEPSCAN_CLUSTER_BATCH_SIZE', 32))
+
+# Max time in seconds the scan waits for worker nodes, if none is connected
+DEFAULT_CLUSTER_WAIT = float(os.environ.get('TS_DEEPSCAN_CLUSTER_WAIT', 300))
+
+# Max number of bytes of file data read ahead to be handed out to worker nodes (in MB)
+DEFAULT_CLUSTER_QUEUE_BYTES = 1024 * 1024 * int(os.environ.get('TS_DEEPSCAN_CLUSTER_QUEUE_BYTES', 256))
+
+
+class _Node(object):
+    def __init__(self, conn: connection.Connection, name: str, jobs: int):
+        self.conn = conn
+        self.name = name
+        self.jobs = max(jobs, 1)
+
+        # Relative paths of the files handed out to the node and not completed yet
+        self.assigned: t.Set[str] = set()
+
+        # Set while the node is asked to give back files, until it completes a file
+        self.stealing = False
+
+
+class DistributedScanner(Scanner):
+    """
+    Coordinator of a distributed scan. Discovers the files like any scanner and hands them out in batches
+    to worker nodes (see cluster.WorkerNode, 'ts-deepscan worker'), which connect over TCP, run the analysers
+    and send the results back. Nodes ask for files when they run low, so faster nodes get more of them.
+    Once all files are handed out, idle nodes steal files not started yet from the node with the most of them.
+
+    Files handed out to a node which disconnects are handed out again, files which were assigned to
+    several lost nodes are failed instead. Worker nodes can be started along with the coordinator on the
+    same machine (local_workers), remote nodes authenticate with the shared secret.
+
+    The data of the files is read ahead up to queue_size files and queue_bytes bytes. Files which no analyser
+    accepts by their name and size (e.g. larger than max_file_size) are completed without being read.
+    """
+
+    # Max time in seconds waiting for messages of the nodes before checking the scan state
+    poll_interval = 0.5
+
+    # Max number of lost nodes a file may be assigned to, before it is failed
+    max_attempts = 3
+
+    def __init__(self,
+                 address: Address = ('127.0.0.1', 0),
+                 secret: t.Optional[bytes] = None,
+                 local_workers: int = 0,
+                 local_jobs: str = '1',
+                 task_timeout=FileAnalyser.DEFAULT_TIMEOUT,
+                 *args,
+                 batch_size: int = DEFAULT_CLUSTER_BATCH_SIZE,
+                 wait: float = DEFAULT_CLUSTER_WAIT,
+                 queue_bytes: int = DEFAULT_CLUSTER_QUEUE_BYTES,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.address = address
+        # Local nodes only are authenticated with a random secret
+        self.secret = secret or secrets.token_hex(16).encode('utf-8')
+
+        self.local_workers = local_workers
+        self.local_jobs = local_jobs
+
+        self.batch_size = max(batch_size, 1)
+        self.wait = wait
+        self.queue_bytes = queue_bytes if queue_bytes > 0 else DEFAULT_CLUSTER_QUEUE_BYTES
+
+        self._task_timeout = task_timeout
+        self._restarts = 0
+
+        # Address the coordinator is listening on while scanning
+        self.listening: t.Optional[Address] = None
+
+    @property
+    def workerRestarts(self) -> int:
+        """
+        Number of worker nodes lost during the last run while analysing files.
+        """
+        return self._restarts
+
+    def _ship(self, f: FileScanInput) -> t.Optional[FileScanInput]:
+        """
+        Attaches the data to the file, so that nodes do not need access to it. Returns None for files which
+        no analyser accepts, they are not read.
+        """
+        content = Scanner._content(f)
+
+        if not any(a.may_accept(f.path.name, content.size) for a in self.analysers):
+            return None
+
+        shipped = FileContent(content.relpath, bytes(content.data), content.digest)
+        shipped.hash = content.hash
+
+        return f._replace(content=shipped)
+
+    def _start_local_workers(self, address: Address) -> t.List[subprocess.Popen]:
+        host, port = address
+        if host in ('0.0.0.0', '::', ''):
+            host = '127.0.0.1'
+
+        env = dict(os.environ, **{SECRET_ENV: self.secret.decode('utf-8')})
+        cmd = [sys.executable, '-m', 'ts_deepscan', 'worker',
+               '--connect', f'{host}:{port}', '--jobs', str(self.local_jobs), '--retry', '10']
+
+        return [subprocess.Popen(cmd, env=env) for _ in range(self.local_workers)]
+
+    def _do_scan(self, files: t.Iterable[FileScanInput]) -> ScanResults:
+        results = {}
+
+        self._restarts = 0
+
+        listener = connection.Listener(self.address, authkey=self.secret)
+        self.listening = listener.address
+
+        util.info(f'Waiting for worker nodes on {self.listening[0]}:{self.listening[1]}')
+
+        # Messages of the nodes: ( node, message )
+        events: queue.Queue = queue.Queue()
+        stopped = threading.Event()
+
+        def handshake(conn: connection.Connection):
+            try:
+                _, name, jobs = conn.recv()
+                conn.send(('setup', self.analysers, self._task_timeout))
+            except (EOFError, OSError):
+                conn.close()
+                return
+
+            node = _Node(conn, name, jobs)
+            events.put((node, ('joined',)))
+
+            try:
+                while True:
+                    events.put((node, conn.recv()))
+            except (EOFError, OSError):
+                events.put((node, ('closed',)))
+
+            # The connection is closed by the thread receiving from it, once the node has disconnected
+            conn.close()
+
+        def accept():
+            while True:
+                try:
+                    conn = listener.accept()
+                except connection.AuthenticationError:
+                    util.warning('A worker node failed to authenticate')
+                    continue
+                except OSError:
+                    break
+
+                if stopped.is_set():
+                    conn.close()
+                    break
+
+                threading.Thread(target=handshake, args=(conn,), name='ts-deepscan-node', daemon=True).start()
+
+        # Files ready to be handed out along with the size of their data, files which are not read (size None),
+        # or files which cannot be read along with the errors
+        available: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        feeding_failure: t.List[BaseException] = []
+
+        # Number of bytes of the files in the queue, a file exceeding the limit is queued once the queue is empty
+        queued_bytes = 0
+        dequeued = threading.Condition()
+
+        def put(item, size: int = 0) -> bool:
+            nonlocal queued_bytes
+
+            with dequeued:
+                while queued_bytes and queued_bytes + size > self.queue_bytes:
+                    if stopped.is_set():
+                        return False
+                    dequeued.wait(self.poll_interval)
+
+                queued_bytes += size
+
+            while not stopped.is_set():
+                try:
+                    available.put(item, timeout=self.poll_interval)
+                    return True
+                except queue.Full:
+                    pass
+
+            return False
+
+        def feed():
+            try:
+                for f in files:
+                    try:
+                        shipped = self._ship(f)
+                    except OSError as err:
+                        item = (f, str(err), 0)
+                    else:
+                        item = (shipped, None, len(shipped.content.data)) if shipped else (f, None, None)
+
+                    if not put(item, item[2] or 0):
+                        break
+
+            except BaseException as err:
+                feeding_failure.append(err)
+            finally:
+                put(None)
+
+        acceptor = threading.Thread(target=accept, name='ts-deepscan-acceptor', daemon=True)
+        acceptor.start()
+
+        feeder = threading.Thread(target=feed, name='ts-deepscan-feeder', daemon=True)
+        feeder.start()
+
+        local_workers = self._start_local_workers(self.listening) if self.local_workers > 0 else []
+
+        nodes: t.Set[_Node] = set()
+        hungry: t.List[_Node] = []
+
+        # Files handed out or to be handed out again: relpath -> file
+        pending: t.Dict[str, FileScanInput] = {}
+        requeued: t.Deque[FileScanInput] = collections.deque()
+        # Number of lost nodes the files were assigned to
+        attempts: t.Dict[str, int] = {}
+
+        feeding_done = False
+        idle_since = time.monotonic()
+
+        def complete(relpath: str, result, errors):
+            pending.pop(relpath, None)
+            attempts.pop(relpath, None)
+            self._complete(results, relpath, result, errors)
+
+        def fail(f: FileScanInput, reason: str):
+            util.error(f'Scan of {f.relpath} failed: {reason}')
+            complete(f.relpath, [], [f'Scan of {f.relpath} failed: {reason}'])
+
+        def take(block: bool = False) -> t.Optional[FileScanInput]:
+            nonlocal feeding_done, queued_bytes
+
+            if requeued:
+                return requeued.popleft()
+
+            while not feeding_done:
+                try:
+                    item = available.get(timeout=self.poll_interval) if block else available.get_nowait()
+                except queue.Empty:
+                    if block and not self._cancelled:
+                        continue
+                    return None
+
+                if item is None:
+                    feeding_done = True
+                    break
+
+                f, err, size = item
+
+                if size:
+                    with dequeued:
+                        queued_bytes -= size
+                        dequeued.notify()
+
+                if err:
+                    fail(f, err)
+                elif size is None:
+                    # Not accepted by any analyser, as if analysed by a node
+                    complete(f.relpath, [], [])
+                elif self._budget_left() <= 0:
+                    complete(f.relpath, [], [NOT_SCANNED_BUDGET])
+                else:
+                    return f
+
+            return None
+
+        def send(node: _Node, msg) -> bool:
+            try:
+                node.conn.send(msg)
+                return True
+            except OSError:
+                # The node is dropped once its connection is reported closed
+                return False
+
+        def assign(node: _Node) -> bool:
+            size = self.batch_size
+
+            # Smaller batches for the rest of the files, so that they are spread over the nodes
+            if feeding_done:
+                size = min(size, max(len(requeued) // len(nodes), 1))
+
+            batch = []
+            while len(batch) < size and (f := take()):
+                batch.append(f)
+
+            if not batch:
+                return False
+
+            for f in batch:
+                pending[f.relpath] = f
+                node.assigned.add(f.relpath)
+
+            send(node, ('files', batch))
+            return True
+
+        def steal():
+            victims = sorted((n for n in nodes if not n.stealing and n not in hungry and len(n.assigned) > n.jobs),
+                             key=lambda n: len(n.assigned) - n.jobs, reverse=True)
+
+            for victim in victims[:len(hungry) - sum(1 for n in nodes if n.stealing)]:
+                victim.stealing = True
+                send(victim, ('steal',))
+
+        def handle(node: _Node, msg):
+            kind = msg[0]
+
+            if kind == 'joined':
+                util.info(f'Worker node {node.name} joined with {node.jobs} workers')
+                nodes.add(node)
+
+            elif kind == 'more':
+                if node in nodes and node not in hungry:
+                    hungry.append(node)
+
+            elif kind == 'result':
+                _, relpath, result, errors = msg
+                node.stealing = False
+
+                if relpath in node.assigned:
+                    node.assigned.discard(relpath)
+                    complete(relpath, result, errors)
+
+            elif kind == 'released':
+                for relpath in msg[1]:
+                    if relpath in node.assigned:
+                        node.assigned.discard(relpath)
+                        requeued.append(pending[relpath])
+
+                if msg[1]:
+                    node.stealing = False
+
+            elif kind == 'closed' and node in nodes:
+                nodes.discard(node)
+                if node in hungry:
+                    hungry.remove(node)
+
+                if node.assigned:
+                    util.warning(f'Worker node {node.name} has been lost with {len(node.assigned)} files')
+                    self._restarts += 1
+
+                for relpath in node.assigned:
+                    attempts[relpath] = attempts.get(relpath, 0) + 1
+
+                    if attempts[relpath] >= self.max_attempts:
+                        fail(pending[relpath], 'the worker nodes analysing it have been lost')
+                    else:
+                        requeued.append(pending[relpath])
+
+        try:
+            while not self._cancelled:
+                if feeding_done and not pending:
+                    break
+
+                try:
+                    # Poll for discovered files while nodes are waiting for them
+                    timeout = 0.01 if hungry and not feeding_done else self.poll_interval
+                    handle(*events.get(timeout=timeout))
+
+                    while True:
+                        handle(*events.get_nowait())
+                except queue.Empty:
+                    pass
+
+                while hungry and assign(hungry[0]):
+                    hungry.pop(0)
+
+                if hungry and feeding_done:
+                    steal()
+
+                if nodes:
+                    idle_since = None
+                elif idle_since is None:
+                    idle_since = time.monotonic()
+                elif time.monotonic() - idle_since > self.wait:
+                    util.error(f'No worker nodes connected for {self.wait} seconds, the scan is aborted')
+
+                    for f in list(pending.values()):
+                        fail(f, 'no worker nodes available')
+                    requeued.clear()
+
+                    while f := take(block=True):
+                        fail(f, 'no worker nodes available')
+                    break
+
+            if self._cancelled:
+                for f in list(pending.values()):
+                    util.info(f'Scan of {f.relpath} has been cancelled')
+                    complete(f.relpath, [], [NOT_SCANNED_CANCELLED])
+
+        finally:
+            stopped.set()
+
+            for node in nodes:
+                send(node, ('cancel',) if self._cancelled else ('stop',))
+
+            # Wakes up the acceptor waiting for connections
+            try:
+                host, port = self.listening
+                connection.Client(('127.0.0.1' if host in ('0.0.0.0', '::', '') else host, port),
+                                  authkey=self.secret).close()
+            except (OSError, EOFError, connection.AuthenticationError):
+                pass
+
+            acceptor.join()
+            listener.close()
+
+            for p in local_workers:
+                try:
+                    p.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    p.kill()
+
+            feeder.join()
+            self.listening = None
+
+            util.info(f"Shutdown scanner...")
+
+        if feeding_failure:
+            raise feeding_failure[0]
+
+        return results
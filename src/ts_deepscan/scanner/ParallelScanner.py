@@ -2,10 +2,12 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-import sys
-import queue
+import threading
 import typing as t
 import multiprocessing as mp
+import multiprocessing.connection as connection
+
+from multiprocessing.reduction import ForkingPickler
 
 import ts_deepscan.util as util
 
@@ -14,19 +16,10 @@ from pathlib import Path
 from . import FileScanInput, ScanResults
 
 from .Scanner import Scanner
+from .pool import get_context, preload
 from ..analyser import FileAnalyser
 
 
-def get_context() -> mp.context.DefaultContext:
-    """
-    Return multiprocessing context based on the OS        
-    """
-    if sys.platform != "win32":
-        return mp.get_context('fork')
-    else:
-        return mp.get_context('spawn')
-
-
 _ctx = get_context()
 
 
@@ -34,101 +27,202 @@ class ParallelScanner(Scanner):
     Queue = _ctx.Queue
     Process = _ctx.Process
 
-    results_wait_time = 60
+    # Max time in seconds waiting for results or worker exits before checking for cancellation
+    results_poll_time = 1
 
     def __init__(self, num_jobs: int, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self._num_jobs = num_jobs if num_jobs > 0 else mp.cpu_count() - 1
+        self._restarts = 0
+
+    @property
+    def workerRestarts(self) -> int:
+        return self._restarts
 
-    def _do_scan(self, files: t.List[FileScanInput]) -> ScanResults:
+    def _do_scan(self, files: t.Iterable[FileScanInput]) -> ScanResults:
         results = {}
 
         tasks = _ctx.Queue()
-        task_results = _ctx.Queue()
+        # Results are written by the workers synchronously, none are lost in a buffer when a worker crashes.
+        # The workers share the writing end of the pipe, a result is written as a whole under the lock.
+        task_results, results_writer = _ctx.Pipe(duplex=False)
+        results_lock = _ctx.Lock()
 
-        workers = self._create_workers(tasks, task_results, min(self._num_jobs, len(files)))
+        workers = self._create_workers(tasks, results_writer, results_lock, self._num_jobs)
 
         util.info(f'Num of workers: {self._num_jobs}')
 
-        for w in workers:
-            w.start()
+        with preload.template(_ctx, self.analysers):
+            for w in workers:
+                w.start()
+
+        self._restarts = 0
 
-        for f in files:
-            tasks.put(f)
+        # Files submitted to the workers and not completed yet, by their sequence numbers. At most queue_size
+        # files are in flight, incl. the queued tasks and the results not taken yet, further files are submitted
+        # as results come back.
+        pending: t.Dict[int, FileScanInput] = {}
+        pending_cond = threading.Condition()
 
-        for _ in range(self._num_jobs):
-            tasks.put((None, None))
+        # Feed the workers while the files are being discovered
+        feeding_done = threading.Event()
+        feeding_failure: t.List[BaseException] = []
 
-        tasks_done = 0
-        while not self._cancelled and tasks_done < len(files):
+        def feed():
             try:
-                relpath, result, errors = task_results.get(timeout=ParallelScanner.results_wait_time)
+                for seq, f in enumerate(files):
+                    with pending_cond:
+                        while len(pending) >= self.queue_size and not self._cancelled:
+                            pending_cond.wait()
 
-            except queue.Empty:
-                util.info(f'No results received within {ParallelScanner.results_wait_time} seconds. Checking status...')
+                        if self._cancelled:
+                            break
 
-                w_live = []
-                w_failed = []
+                        pending[seq] = f
 
-                for w in workers:
-                    if w.exitcode is None or w.exitcode == 0:
-                        w_live.append(w)
-                    else:
-                        w_failed.append(w)
+                    tasks.put((seq, f))
+            except BaseException as err:
+                feeding_failure.append(err)
+            finally:
+                for _ in range(self._num_jobs):
+                    tasks.put(None)
+                feeding_done.set()
+
+        feeder = threading.Thread(target=feed, name='ts-deepscan-feeder', daemon=True)
+        feeder.start()
+
+        def complete(seq: int, relpath: str, result, errors):
+            with pending_cond:
+                if pending.pop(seq, None) is None:
+                    # The file has been failed already
+                    return
+
+                pending_cond.notify()
+
+            self._complete(results, relpath, result, errors)
+
+        while not self._cancelled:
+            with pending_cond:
+                if feeding_done.is_set() and not pending:
+                    break
+
+            # Wakes up on results as well as on exits of workers, crashes are handled right away
+            ready = connection.wait([task_results] + [w.sentinel for w in workers],
+                                    timeout=ParallelScanner.results_poll_time)
+
+            # Results are taken first, so that the file of a crashed worker is not failed if its result has arrived
+            while task_results.poll():
+                seq, (relpath, result, errors) = task_results.recv()
+                complete(seq, relpath, result, errors)
 
-                if len(w_failed) > 0:
-                    for w in w_failed:
+            w_exited = [w for w in workers if w.sentinel in ready]
+            w_failed = []
+
+            for w in w_exited:
+                w.join()
+
+                if w.exitcode != 0:
+                    w_failed.append(w)
+
+                    if (f := w.failed_task(pending, pending_cond)) is not None:
+                        reason = f'worker exited with code {w.exitcode}'
+                        util.error(f'Scan of {f[1].relpath} failed: {reason}')
+                        complete(f[0], f[1].relpath, [], [f'Scan of {f[1].relpath} failed: {reason}'])
+                    else:
                         util.error(f'Worker exited with code {w.exitcode}')
 
-                    util.info('Restarting failed workers')
+            if w_exited:
+                workers = [w for w in workers if w not in w_exited]
 
-                    w_restarted = self._create_workers(tasks, task_results, len(w_failed))
-                    for w in w_restarted:
-                        w.start()
+            if w_failed:
+                w_restarted = self._create_workers(tasks, results_writer, results_lock, len(w_failed))
+                for w in w_restarted:
+                    w.start()
 
-                    workers = w_live + w_restarted
-                    continue
+                workers += w_restarted
+                self._restarts += len(w_restarted)
 
-                elif any(w.is_alive() for w in workers):
-                    continue
+            elif not workers:
+                # All workers have finished, files taken by workers that failed to report them are left
+                with pending_cond:
+                    lost = list(pending.items())
 
-                else:
-                    util.info(f'All workers exited')
-                    break
+                for seq, f in lost:
+                    complete(seq, f.relpath, [], [f'Scan of {f.relpath} failed: the result has been lost'])
 
-            self._notifyCompletion(relpath, result, errors)
+                break
 
-            if result:
-                results[relpath] = result
+        if self._cancelled:
+            with pending_cond:
+                pending_cond.notify_all()
 
-            tasks_done += 1
+            tasks.cancel_join_thread()
 
         for w in workers:
             if self._cancelled:
                 w.terminate()
             w.join()
 
+        feeder.join()
+
+        task_results.close()
+        results_writer.close()
+
+        if feeding_failure:
+            raise feeding_failure[0]
+
         return results
 
-    def _create_workers(self, tasks: _ctx.Queue, results: _ctx.Queue, num: int = 1) -> 'Worker':
-        return [ParallelScanner.Worker(tasks, results, self.analysers) for _ in range(num)]
+    def _create_workers(self,
+                        tasks: _ctx.Queue,
+                        results: connection.Connection,
+                        results_lock: _ctx.Lock,
+                        num: int = 1) -> t.List['Worker']:
+        return [ParallelScanner.Worker(tasks, results, results_lock, self.analysers) for _ in range(num)]
 
     class Worker(_ctx.Process):
-        def __init__(self, tasks: _ctx.Queue, results: _ctx.Queue, analysers: t.List[FileAnalyser]):
+        def __init__(self,
+                     tasks: _ctx.Queue,
+                     results: connection.Connection,
+                     results_lock: _ctx.Lock,
+                     analysers: t.List[FileAnalyser]):
             super().__init__()
 
             self._tasksQueue = tasks
-            self._resultsQueue = results
+            self._results = results
+            self._resultsLock = results_lock
 
             self._analysers = analysers
 
+            # Sequence number of the last task taken by the worker, shared with the parent
+            self._task = _ctx.Value('q', -1, lock=False)
+
+        def failed_task(self,
+                        pending: t.Dict[int, FileScanInput],
+                        lock: threading.Condition) -> t.Optional[t.Tuple[int, FileScanInput]]:
+            """
+            Returns the task the worker has been working on when it exited, unless its result has been received.
+            """
+            seq = self._task.value
+
+            with lock:
+                return (seq, pending[seq]) if seq in pending else None
+
         def run(self) -> None:
+            preload.warm_up(self._analysers)
+
             while True:
-                path, root = self._tasksQueue.get()
+                task = self._tasksQueue.get()
 
-                if not path:
+                if not task:
                     break
 
-                result = Scanner._scan_file(path, self._analysers, root)
-                self._resultsQueue.put(result)
+                seq, f = task
+                self._task.value = seq
+
+                # Pickled before taking the lock, so that the workers do not wait for each other to pickle
+                result = ForkingPickler.dumps((seq, Scanner._scan_file(f, self._analysers)))
+
+                with self._resultsLock:
+                    self._results.send_bytes(result)
@@ -1,67 +1,283 @@
+import os
+import time
+import queue
+import signal
 import typing as t
+import threading
 import concurrent.futures as futures
+import concurrent.futures.process
+import multiprocessing as mp
+import multiprocessing.queues
 
 import ts_deepscan.util as util
 
 
 from . import FileScanInput, FileScanResult, ScanResults
 
-from .Scanner import Scanner
+from .Scanner import Scanner, NOT_SCANNED_CANCELLED
+from .pool import get_context, preload
+from .pool.scheduler import DEFAULT_WATCHDOG_GRACE
 from ..analyser import FileAnalyser
 
 
+_ctx = get_context()
+
+# Queue the workers report the tasks they start on, and the analysers, set up once when a worker starts
+_started: t.Optional[mp.queues.SimpleQueue] = None
+_analysers: t.List[FileAnalyser] = []
+
+
+def _init_worker(started: mp.queues.SimpleQueue, analysers: t.List[FileAnalyser]):
+    global _started, _analysers
+
+    _started = started
+    _analysers = analysers
+
+    preload.warm_up(analysers)
+
+
+def _scan_task(seq: int, f: FileScanInput) -> FileScanResult:
+    _started.put((seq, os.getpid()))
+    return Scanner._scan_file(f, _analysers)
+
+
 class PoolExecutorScanner(Scanner):
+    """
+    Runs the analysis in a ProcessPoolExecutor. Workers report the files they start on, so that every file
+    has a deadline of its own. A worker exceeding it by far (see DEFAULT_WATCHDOG_GRACE) is killed and its
+    file is reported as failed. Killing a worker, as well as a crashing one, breaks the executor: it is replaced
+    and the files it has not completed are submitted again. Files which were being analysed in two broken
+    executors are failed instead, since they are likely the ones crashing the workers.
+    """
+
+    # Max time in seconds waiting for completed files before checking the deadlines and the cancellation
+    poll_interval = 0.5
+
+    # Max number of executors a file may be analysed in, before it is failed
+    max_attempts = 2
+
+    watchdog_grace = DEFAULT_WATCHDOG_GRACE
 
     def __init__(self, num_jobs: int, task_timeout=FileAnalyser.DEFAULT_TIMEOUT, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self._num_jobs = num_jobs
         self._task_timeout = task_timeout
+        self._restarts = 0
+
+    @property
+    def workerRestarts(self) -> int:
+        return self._restarts
 
-    def _do_scan(self, files: t.List[FileScanInput]) -> ScanResults:
+    def _create_executor(self, started: mp.queues.SimpleQueue) -> futures.ProcessPoolExecutor:
+        return futures.ProcessPoolExecutor(max_workers=self._num_jobs if self._num_jobs > 0 else None,
+                                           mp_context=_ctx,
+                                           initializer=_init_worker,
+                                           initargs=(started, self.analysers))
+
+    def _do_scan(self, files: t.Iterable[FileScanInput]) -> ScanResults:
         results = {}
-        tasks = []
 
-        def task_completed(_task: futures.Future[FileScanResult]):
-            if _task.cancelled():
-                self.finishedTasks += 1
-                self._progress()
-                return
+        self._restarts = 0
+
+        started = _ctx.SimpleQueue()
+
+        # Submitted tasks: future -> ( sequence number, file, executor )
+        tasks: t.Dict[futures.Future, t.Tuple[int, FileScanInput, futures.Executor]] = {}
+        # Futures of the tasks in the order they are done, None marks the end of the feeding
+        done: queue.Queue = queue.Queue()
+        # Files being analysed in the order they have started: sequence number -> ( worker pid, start time )
+        running: t.Dict[int, t.Tuple[int, float]] = {}
+        # Number of broken executors the files have been analysed in
+        attempts: t.Dict[int, int] = {}
+        # Files whose workers have been killed, they are reported once their futures are done
+        killed: t.Set[int] = set()
+        # Files not submitted, because the scan has been cancelled
+        dropped: t.List[FileScanInput] = []
+
+        lock = threading.Lock()
+
+        with preload.template(_ctx, self.analysers):
+            executor = self._create_executor(started)
+
+        # Limit the number of submitted files, so that the discovery is not drained at once
+        pending = threading.BoundedSemaphore(self.queue_size)
+
+        feeding_done = threading.Event()
+        feeding_failure: t.List[BaseException] = []
+
+        def replace(broken: futures.Executor):
+            """
+            Replaces the executor, unless it has been replaced already. Workers have been killed or have crashed.
+            Called with the lock held.
+            """
+            nonlocal executor
+
+            if broken is executor:
+                util.info('Replacing the broken process pool')
+                executor.shutdown(wait=False)
+                executor = self._create_executor(started)
+                self._restarts += 1
+
+        def submit(seq: int, f: FileScanInput) -> bool:
+            """
+            Submits the file, unless the scan has been cancelled. The cancellation is checked with the lock held,
+            since the submitted tasks are taken over and the executor is shut down once it has been cancelled.
+            """
+            with lock:
+                if self._cancelled:
+                    dropped.append(f)
+                    return False
+
+                try:
+                    task = executor.submit(_scan_task, seq, f)
+                except futures.process.BrokenProcessPool:
+                    # The executor broke before its failed tasks have been handled
+                    replace(executor)
+                    task = executor.submit(_scan_task, seq, f)
+                except RuntimeError:
+                    # Submitted after the executor has been shut down
+                    if not self._cancelled:
+                        raise
+
+                    dropped.append(f)
+                    return False
 
-            relpath, result, errors = _task.result()
-            self._notifyCompletion(relpath, result, errors)
+                tasks[task] = (seq, f, executor)
 
-            if result:
-                results[relpath] = result                
+            task.add_done_callback(done.put)
+            return True
 
-        executor = futures.ProcessPoolExecutor(max_workers=self._num_jobs if self._num_jobs > 0 else None)
+        def feed():
+            try:
+                for seq, f in enumerate(files):
+                    pending.acquire()
 
-        task_paths = {}
+                    if not submit(seq, f):
+                        break
 
-        for path, root in files:
-            task = executor.submit(Scanner._scan_file, path, self.analysers, root)
-            task.add_done_callback(task_completed)
+            except BaseException as err:
+                feeding_failure.append(err)
+            finally:
+                feeding_done.set()
+                done.put(None)
 
-            tasks.append(task)
-            task_paths[task] = path
+        def complete(relpath: str, result, errors):
+            pending.release()
+            self._complete(results, relpath, result, errors)
 
-        while len(tasks) > 0:
-            done, not_done = futures.wait(tasks, timeout=10, return_when=futures.FIRST_COMPLETED)
+        def fail(f: FileScanInput, reason: str):
+            util.error(f'Scan of {f.relpath} failed: {reason}')
+            complete(f.relpath, [], [f'Scan of {f.relpath} failed: {reason}'])
 
-            if not_done == 0:
-                break
-            elif len(done) > 0:
-                tasks = not_done
-            else:
-                tasks = list(not_done)
-                task_to_cancel = tasks.pop()
+        feeder = threading.Thread(target=feed, name='ts-deepscan-feeder', daemon=True)
+        feeder.start()
 
-                if tp := task_paths[task_to_cancel]:
-                    util.info(f"Scan of {tp} has been cancelled")
+        while not self._cancelled:
+            with lock:
+                if not tasks and feeding_done.is_set():
+                    break
 
-                task_to_cancel.cancel()
+            try:
+                task = done.get(timeout=min(self._check_deadlines(running, killed), PoolExecutorScanner.poll_interval))
+            except queue.Empty:
+                task = None
 
-        executor.shutdown(wait=False)
+            # Files are reported as started before their futures are done
+            while not started.empty():
+                seq, pid = started.get()
+                running[seq] = (pid, time.monotonic())
+
+            if task is None:
+                continue
+
+            with lock:
+                seq, f, task_executor = tasks.pop(task)
+
+            if not isinstance(task.exception(), futures.process.BrokenProcessPool):
+                running.pop(seq, None)
+                attempts.pop(seq, None)
+                killed.discard(seq)
+
+                if task.exception():
+                    fail(f, str(task.exception()))
+                else:
+                    complete(*task.result())
+
+                continue
+
+            with lock:
+                replace(task_executor)
+
+            if seq in killed:
+                killed.discard(seq)
+                running.pop(seq, None)
+                fail(f, 'timeout exceeded, the worker has been killed')
+                continue
+
+            # Files being analysed when the executor broke are suspected to have crashed it
+            if running.pop(seq, None):
+                attempts[seq] = attempts.get(seq, 0) + 1
+
+                if attempts[seq] >= self.max_attempts:
+                    attempts.pop(seq)
+                    fail(f, 'the worker has exited unexpectedly')
+                    continue
+
+            submit(seq, f)
+
+        if self._cancelled:
+            with lock:
+                cancelled = list(tasks.values())
+                tasks.clear()
+
+            for seq, f, _ in cancelled:
+                util.info(f'Scan of {f.relpath} has been cancelled')
+                complete(f.relpath, [], [NOT_SCANNED_CANCELLED])
+
+            for pid, _ in running.values():
+                self._kill(pid)
+
+        executor.shutdown(wait=not self._cancelled, cancel_futures=True)
         util.info(f"Shutdown scanner...")
 
+        feeder.join()
+
+        for f in dropped:
+            complete(f.relpath, [], [NOT_SCANNED_CANCELLED])
+
+        if feeding_failure:
+            raise feeding_failure[0]
+
         return results
+
+    def _check_deadlines(self, running: t.Dict[int, t.Tuple[int, float]], killed: t.Set[int]) -> float:
+        """
+        Kills the workers of files exceeding their deadlines. The files are ordered by their start times,
+        so only the files up to the first one within its deadline are looked at. Returns the seconds
+        until the next deadline.
+        """
+        if self._task_timeout <= 0:
+            return float('inf')
+
+        now = time.monotonic()
+
+        # The timeout is the time budget of a file shared by its analysers
+        limit = self._task_timeout * self.watchdog_grace
+
+        for seq, (pid, start) in running.items():
+            if now - start <= limit:
+                return start + limit - now
+
+            if seq not in killed:
+                killed.add(seq)
+                self._kill(pid)
+
+        return float('inf')
+
+    @staticmethod
+    def _kill(pid: int):
+        try:
+            os.kill(pid, signal.SIGKILL if hasattr(signal, 'SIGKILL') else signal.SIGTERM)
+        except OSError:
+            pass
@@ -2,51 +2,75 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import io
 import os
-import fnmatch
+import queue
+import asyncio
 import functools
+import collections
+import time
 import shutil
 import tempfile
+import threading
+import weakref
 
 import ts_deepscan.util as util
 
 import typing as t
 from pathlib import Path
 from shutil import ReadError
-from gitignore_parser import parse_gitignore
 
 from . import FileScanInput, FileScanResult, ScanResults
+from .ignore import IgnorePatterns, GitignoreRules, IgnoreMatcher
+from .archives import ArchiveMember, ArchiveErrors, SizeBudget, ExtractionPool
+from .archives import archive_format, is_streamable, iter_members
+from .git import GitWorktree, GitError, CatFile, find_worktree_root, iter_tree, changed_between
+from .journal import Journal
+from .shards import Shard
 
-from ..analyser import FileAnalyser, AnalysisResult
+from ..analyser import FileAnalyser, AnalysisResult, FileContent, file_budget
+from ..analyser.CachingAnalyser import _fast_file_hash, _fast_content_hash
 from .postprocessing import PostProcessor
 
 
-def _register_unpack_formats() -> t.Set[str]:
-    """
-    Registers unpack formats and returns all supported archive extensions.
-    """
+DEFAULT_FILE_MAX_SIZE = 1024 * int(os.environ.get('TS_DEPSCAN_FILE_MAX_SIZE', 1000))
 
-    def unpack_zip(filename, extract_dir):
-        shutil.unpack_archive(filename, extract_dir, format='zip')
+# Max number of discovered files waiting for the analysis
+DEFAULT_QUEUE_SIZE = int(os.environ.get('TS_DEEPSCAN_QUEUE_SIZE', 4096))
 
-    # Check for registered formats using get_unpack_formats instead of private _UNPACK_FORMATS
-    registered_formats = {fmt[0] for fmt in shutil.get_unpack_formats()}
-    
-    if "wheel" not in registered_formats:
-        shutil.register_unpack_format('wheel', ['.whl'], unpack_zip)
+# Number of threads unpacking archives concurrently
+DEFAULT_ARCHIVE_THREADS = int(os.environ.get('TS_DEEPSCAN_ARCHIVE_THREADS', 4))
 
-    if "jar" not in registered_formats:
-        shutil.register_unpack_format('jar', ['.jar'], unpack_zip)
+# Max nesting level of archives to be unpacked, deeper archives are scanned as regular files
+DEFAULT_ARCHIVE_MAX_DEPTH = int(os.environ.get('TS_DEEPSCAN_ARCHIVE_MAX_DEPTH', 5))
 
-    return functools.reduce(lambda exts, fmt: exts.union(set(fmt[1])), shutil.get_unpack_formats(), set())
+# Max number of bytes unpacked from a single archive incl. its nested archives (in MB)
+DEFAULT_ARCHIVE_MAX_SIZE = 1024 * 1024 * int(os.environ.get('TS_DEEPSCAN_ARCHIVE_MAX_SIZE', 4096))
 
+# Error reported for files skipped, because the time budget of the scan did not suffice to analyse them
+NOT_SCANNED_BUDGET = 'not scanned (budget)'
 
-_archive_exts = _register_unpack_formats()
+# Error reported for files whose analysis has been aborted by cancelling the scan
+NOT_SCANNED_CANCELLED = 'not scanned (cancelled)'
 
-DEFAULT_FILE_MAX_SIZE = 1024 * int(os.environ.get('TS_DEPSCAN_FILE_MAX_SIZE', 1000))
+# Max number of completed files buffered for consumers of streamed results
+DEFAULT_STREAM_BUFFER_SIZE = int(os.environ.get('TS_DEEPSCAN_STREAM_BUFFER_SIZE', 1024))
 
+# Max number of contents whose results are kept for identical files while streaming results,
+# the least recently used ones are dropped and analysed again if another identical file shows up
+DEFAULT_DEDUP_CACHE_SIZE = int(os.environ.get('TS_DEEPSCAN_DEDUP_CACHE_SIZE', 16384))
 
 
+# Marks names and sizes of files not seen yet by the deduplication
+_unseen = object()
+
+
+def _provisional_key(relpath: str) -> str:
+    """
+    Returns the content key of a file which has not been hashed, it cannot be taken for a digest.
+    """
+    return f'path:{relpath}'
+
 
 class Scanner(object):
     def __init__(self,
@@ -56,7 +80,18 @@ class Scanner(object):
                  ignore_patterns: t.Optional[t.List[str]] = None,
                  ignore_hidden_files: bool = True,
                  default_gitignores: t.Optional[t.List[Path]] = None,
-                 unpack_archives: bool = True):
+                 unpack_archives: bool = True,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 archive_threads: int = DEFAULT_ARCHIVE_THREADS,
+                 archive_max_depth: int = DEFAULT_ARCHIVE_MAX_DEPTH,
+                 archive_max_size: int = DEFAULT_ARCHIVE_MAX_SIZE,
+                 deduplicate: bool = True,
+                 git: bool = False,
+                 git_base: t.Optional[str] = None,
+                 git_revision: t.Optional[str] = None,
+                 time_budget: t.Optional[float] = None,
+                 journal: t.Optional[Journal] = None,
+                 shard: t.Optional[Shard] = None):
 
         self.analysers = analysers
         self.postprocessor = postprocessor
@@ -71,10 +106,59 @@ class Scanner(object):
         # Archives
         self.unpack_archives = unpack_archives
         self.unpack_folder = None
+        self.archive_threads = archive_threads if archive_threads > 0 else DEFAULT_ARCHIVE_THREADS
+        self.archive_max_depth = archive_max_depth
+        self.archive_max_size = archive_max_size
+
+        # Discovery
+        self.queue_size = queue_size if queue_size > 0 else DEFAULT_QUEUE_SIZE
+
+        # Deduplication of identical files within a scan
+        self.deduplicate = deduplicate
+        self._dedup_lock = threading.Lock()
+        self._dedup_keys: t.Dict[str, str] = {}
+        # First file on disk of each name and size, it is hashed once another file of the same name and size shows up
+        self._dedup_candidates: t.Dict[t.Tuple[str, int], t.Optional[t.Tuple[str, Path]]] = {}
+        self._dedup_pending: t.Dict[str, t.List[str]] = {}
+        self._dedup_completed: t.OrderedDict[str, t.Tuple[t.List[AnalysisResult], t.List[str]]] = \
+            collections.OrderedDict()
+        self._dedup_late: t.List[t.Tuple[str, str]] = []
+        # Max number of completed contents kept while streaming results (see Scanner._remember)
+        self.dedup_cache_size = DEFAULT_DEDUP_CACHE_SIZE
+
+        # Git work trees: blob ids are used as content keys, files unchanged since the base revision are skipped
+        self.git = git or bool(git_base)
+        self.git_base = git_base
+        # Git revision scanned from the object store instead of the work tree (scan paths are repositories)
+        self.git_revision = git_revision
+
+        # Time budget of a scan in seconds, files which cannot be analysed within it are skipped
+        self.time_budget = time_budget if time_budget and time_budget > 0 else None
+        self._budget_deadline: t.Optional[float] = None
+
+        # Journal of the completed files, files recorded by an earlier run are taken over from it
+        self.journal = journal
+
+        # Part of the scanned paths analysed by this scanner, files of other shards are not discovered
+        self.shard = shard
 
-        # Statistics
+        # Statistics (total is the number of files discovered so far)
         self.totalTasks = 0
         self.finishedTasks = 0
+        self.duplicateTasks = 0
+        self.discoveryCompleted = False
+
+        # Relative paths of files skipped, because they did not change since the git base revision
+        self.unchangedFiles: t.Set[str] = set()
+
+        # Relative paths of files with partial results, because their analysis was stopped at the deadline
+        self.timedOutFiles: t.Set[str] = set()
+
+        # Relative paths of files skipped, because the time budget of the scan was running out
+        self.budgetSkippedFiles: t.Set[str] = set()
+
+        # Relative paths of files taken over from the journal of an earlier run
+        self.resumedFiles: t.Set[str] = set()
 
         # Result callbacks
 
@@ -88,27 +172,68 @@ class Scanner(object):
         # Running
         self._cancelled = False
 
+        # Receives the results of completed files instead of collecting them while streaming (see iter_results)
+        self._sink: t.Optional[t.Callable[[FileScanResult], None]] = None
+
+        # Serialises the completions of files (see Scanner._report)
+        self._completion_lock = threading.Lock()
+
         # Cleanup files
         self._cleanup: t.List[Path] = []
 
     @staticmethod
-    def _scan_file(path: Path, analysers: t.List[FileAnalyser], root: t.Optional[Path]) -> FileScanResult:
+    def _scan_file(file: FileScanInput,
+                   analysers: t.List[FileAnalyser],
+                   durations: t.Optional[t.Dict[str, float]] = None) -> FileScanResult:
+        """
+        Runs the analysers on a file. If a durations dict is given, the time spent by each analyser is recorded in it.
+        """
         results = []
         errors = []
 
-        relpath = str(path.relative_to(root) if root else path)
+        relpath = file.relpath
 
-        for analyser in analysers:
-            try:
-                if analyser.accepts(path) and (res := analyser(path, root=root)):
-                    results.append(res)
-            except: # noqa
-                msg = f'An error occured while scanning {relpath} using \'{analyser.category}\' analyser'
-                util.error(msg)
-                errors.append(msg)
+        # The file is read at most once and the data is shared by all analysers
+        content = Scanner._content(file)
+
+        # The timeout is the time budget of the file shared by all analysers rather than given to each of them
+        timeouts = [analyser.timeout for analyser in analysers]
+        budget = max(timeouts) if timeouts and min(timeouts) > 0 else 0
+
+        try:
+            with file_budget(budget) as deadline:
+                for analyser in analysers:
+                    if time.time() > deadline:
+                        errors.append(f'Scan of {relpath} using \'{analyser.category}\' analyser has been skipped, '
+                                      f'the time budget of the file is used up')
+                        continue
+
+                    started = time.perf_counter()
+
+                    try:
+                        if analyser.accepts_content(content) and (res := analyser.apply_content(content)):
+                            results.append(res)
+                    except: # noqa
+                        msg = f'An error occured while scanning {relpath} using \'{analyser.category}\' analyser'
+                        util.error(msg)
+                        errors.append(msg)
+
+                    if durations is not None:
+                        durations[analyser.category] = time.perf_counter() - started
+
+        finally:
+            # Temporary file of in-memory contents shared by the analysers
+            content.close()
 
         return relpath, results, errors
 
+    @staticmethod
+    def _content(file: FileScanInput) -> FileContent:
+        if content := file.content:
+            return content
+        else:
+            return FileContent.from_file(file.path, file.root, file.stat, file.digest)
+
     @property
     def options(self) -> dict:
         if opts := [a.options for a in self.analysers]:
@@ -121,100 +246,674 @@ class Scanner(object):
         return self._cancelled
 
     def run(self, paths: t.List[Path]) -> ScanResults:
-        files: t.List[t.Tuple[Path, t.Optional[Path]]] = []
+        return self._run(paths)
+
+    def iter_results(self,
+                     paths: t.List[Path],
+                     buffer_size: int = DEFAULT_STREAM_BUFFER_SIZE) -> t.Iterator[FileScanResult]:
+        """
+        Scans the paths in the background and yields the result of each file as soon as it is completed,
+        without collecting the results of the whole scan. At most buffer_size results are buffered, the scan
+        is held back while the consumer falls behind. Closing the iterator (e.g. leaving the loop) cancels the scan.
+
+        The post processor is applied to the results which are available at once rather than to the whole scan.
+        """
+        stream = _ResultStream(self, paths, buffer_size)
+
+        try:
+            while (chunk := stream.next_chunk()) is not None:
+                yield from chunk
+        finally:
+            stream.close()
+
+    async def scan_async(self,
+                         paths: t.List[Path],
+                         buffer_size: int = DEFAULT_STREAM_BUFFER_SIZE) -> t.AsyncIterator[FileScanResult]:
+        """
+        Asynchronous variant of iter_results. The scan runs in the background, waiting for results does not
+        block the event loop. Closing the iterator or cancelling the consuming task cancels the scan.
+        """
+        loop = asyncio.get_running_loop()
+        stream = _ResultStream(self, paths, buffer_size)
+
+        try:
+            while (chunk := await loop.run_in_executor(None, stream.next_chunk)) is not None:
+                for res in chunk:
+                    yield res
+        finally:
+            await loop.run_in_executor(None, stream.close)
+
+    def _run(self, paths: t.List[Path], sink: t.Optional[t.Callable[[FileScanResult], None]] = None) -> ScanResults:
+        self._sink = sink
+
+        self.totalTasks = 0
+        self.finishedTasks = 0
+        self.duplicateTasks = 0
+        self.discoveryCompleted = False
+        self.unchangedFiles = set()
+        self.timedOutFiles = set()
+        self.budgetSkippedFiles = set()
+        self.resumedFiles = set()
+
+        self._budget_deadline = time.monotonic() + self.time_budget if self.time_budget else None
+
+        if self.journal:
+            self.journal.open(self.options)
+
+        discovered = self._discover(paths)
+        files = self._resume(discovered) if self.journal and self.journal.completed else discovered
+        unique_files = self._deduplicate(files) if self.deduplicate else files
+
+        try:
+            results = self._do_scan(unique_files)
+
+            for relpath, key in self._dedup_late:
+                if result := self._dedup_completed[key][0]:
+                    results[relpath] = result
+
+            if not sink:
+                for relpath in self.resumedFiles:
+                    if result := self.journal.completed[relpath][0]:
+                        results[relpath] = result
+
+            if self.postprocessor and not sink:
+                results = self.postprocessor.apply(results)
+
+            return results
+
+        finally:
+            unique_files.close()
+            files.close()
+            discovered.close()
+            self._do_cleanup()
+
+            if self.journal:
+                self.journal.close()
+
+            self._sink = None
+
+            self._dedup_keys = {}
+            self._dedup_candidates = {}
+            self._dedup_pending = {}
+            self._dedup_completed = collections.OrderedDict()
+            self._dedup_late = []
+
+    def _budget_left(self) -> float:
+        """
+        Returns the seconds left of the time budget of the running scan.
+        """
+        return self._budget_deadline - time.monotonic() if self._budget_deadline else float('inf')
+
+    @property
+    def workerRestarts(self) -> int:
+        """
+        Number of worker processes replaced during the last run, because they got stuck or crashed.
+        """
+        return 0
+
+    @property
+    def dedup_ratio(self) -> float:
+        """
+        Share of the discovered files which were not analysed, because an identical file was analysed instead.
+        """
+        return self.duplicateTasks / self.totalTasks if self.totalTasks else 0.0
+
+    def _resume(self, files: t.Iterable[FileScanInput]) -> t.Iterator[FileScanInput]:
+        """
+        Passes only the files not recorded in the journal through to the analysis. The recorded files
+        are completed with their results from the journal.
+        """
+        for f in files:
+            if (completed := self.journal.completed.get(f.relpath)) is None:
+                yield f
+                continue
+
+            self.resumedFiles.add(f.relpath)
+            self._report(f.relpath, *completed, resumed=True)
+
+    def _deduplicate(self, files: t.Iterable[FileScanInput]) -> t.Iterator[FileScanInput]:
+        """
+        Passes only the first file of each content through to the analysis. Results of the analysed file
+        are fanned out to all identical files (see Scanner._complete). The content key includes the file name,
+        since analysers select files and languages by name.
+
+        Files on disk are not read here, unless an earlier file has the same name and size. Only then both
+        files are hashed, the first one keeps a provisional key until then. Files which no analyser accepts
+        by their name and size are passed through without a key.
+        """
+        for f in files:
+            content = Scanner._content(f)
+            name = f.path.name
+            relpath = f.relpath
+
+            try:
+                size = content.size
+            except OSError:
+                yield f
+                continue
+
+            if not any(a.may_accept(name, size) for a in self.analysers):
+                yield f
+                continue
+
+            f = f._replace(content=content)
+
+            if content.source and not content.digest:
+                with self._dedup_lock:
+                    first = self._dedup_candidates.get((name, size), _unseen)
+
+                    if first is _unseen:
+                        self._dedup_candidates[(name, size)] = (relpath, content.source)
+                        self._dedup_keys[relpath] = _provisional_key(relpath)
+
+                if first is _unseen:
+                    yield f
+                    continue
+
+                if first is not None:
+                    self._rekey(*first, name)
+
+                    with self._dedup_lock:
+                        self._dedup_candidates[(name, size)] = None
+
+            try:
+                if content.digest:
+                    digest = content.digest
+                elif content.source:
+                    # Hash without keeping the data, the hash is reused by the caching analysers
+                    digest = content.hash = _fast_file_hash(content.source)
+                else:
+                    digest = content.hash = _fast_content_hash(content.data)
+            except OSError:
+                yield f
+                continue
+
+            key = f'{digest}:{name}'
+
+            with self._dedup_lock:
+                if (completed := self._dedup_completed.get(key)) is not None:
+                    if self._sink:
+                        self._dedup_completed.move_to_end(key)
+                    else:
+                        self._dedup_late.append((relpath, key))
+                    self.duplicateTasks += 1
+
+                elif (pending := self._dedup_pending.get(key)) is not None:
+                    pending.append(relpath)
+                    self.duplicateTasks += 1
+                    continue
+
+                else:
+                    self._dedup_pending[key] = []
+                    self._dedup_keys[relpath] = key
+
+            if completed is None:
+                yield f
+            else:
+                self._report(relpath, *completed)
+
+    def _rekey(self, relpath: str, source: Path, name: str):
+        """
+        Hashes a file passed through with a provisional key, since an identical file may have shown up.
+        The state of the file is moved to its content key, whether it is still analysed or completed.
+        """
+        try:
+            key = f'{_fast_file_hash(source)}:{name}'
+        except OSError:
+            return
+
+        provisional = _provisional_key(relpath)
+
+        with self._dedup_lock:
+            if self._dedup_keys.get(relpath) == provisional:
+                self._dedup_keys[relpath] = key
+                self._dedup_pending.setdefault(key, [])
+
+            elif (completed := self._dedup_completed.pop(provisional, None)) is not None:
+                if key not in self._dedup_completed:
+                    self._remember(key, completed)
+
+    def _remember(self, key: str, completed: t.Tuple[t.List[AnalysisResult], t.List[str]]):
+        """
+        Keeps the results of a content for identical files discovered later, the dedup lock is held by the caller.
+        While streaming results, the results are not collected otherwise, hence only the most recently used
+        contents are kept. Identical files discovered after their content was dropped are analysed again.
+        """
+        self._dedup_completed[key] = completed
+
+        if self._sink:
+            self._dedup_completed.move_to_end(key)
+
+            while len(self._dedup_completed) > self.dedup_cache_size:
+                self._dedup_completed.popitem(last=False)
+
+    def _complete(self, results: ScanResults, relpath: str, result: t.List[AnalysisResult], errors: t.List[str]):
+        """
+        Reports the completion of a file and stores its results. If identical files were discovered
+        while the file was analysed, they are completed with the same results.
+        """
+        duplicates = []
+
+        with self._dedup_lock:
+            if (key := self._dedup_keys.pop(relpath, None)) is not None:
+                duplicates = self._dedup_pending.pop(key, [])
+                self._remember(key, (result, errors))
+
+        for path in (relpath, *duplicates):
+            self._report(path, result, errors)
+
+            if not self._sink and result:
+                results[path] = result
+
+    def _discover(self, paths: t.List[Path]) -> t.Iterator[FileScanInput]:
+        """
+        Walks the paths in a background thread and yields discovered files as soon as they are found.
+        The number of files waiting for the analysis is bounded by the queue size.
+        """
+        files: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stopped = threading.Event()
+        failure: t.List[BaseException] = []
+
+        def put(item) -> bool:
+            while not (stopped.is_set() or self._cancelled):
+                try:
+                    files.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        counter_lock = threading.Lock()
+
+        def emit(f: FileScanInput) -> bool:
+            with counter_lock:
+                self.totalTasks += 1
+            return put(f)
+
+        def produce():
+            try:
+                # Archives are unpacked in the background, their members are emitted as they land
+                with ExtractionPool(self.archive_threads, emit) as extraction:
+                    for f in self._walk_paths(paths, extraction):
+                        if not emit(f):
+                            return
+
+                    extraction.join()
+
+            except BaseException as err:
+                failure.append(err)
+            finally:
+                self.discoveryCompleted = True
+                put(None)
 
+        producer = threading.Thread(target=produce, name='ts-deepscan-discovery', daemon=True)
+        producer.start()
+
+        try:
+            while not self._cancelled:
+                try:
+                    f = files.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+                if f is None:
+                    break
+
+                yield f
+
+            if failure:
+                raise failure[0]
+
+        finally:
+            stopped.set()
+            producer.join()
+
+    def _walk_paths(self, paths: t.List[Path], extraction: ExtractionPool) -> t.Iterator[FileScanInput]:
+        """
+        Walks the paths and yields regular files. Archives are submitted to the extraction pool,
+        which emits their members concurrently with the walk.
+        """
         if self.unpack_folder:
             unpack_path = self.unpack_folder
         else:
-            temp_dir = tempfile.TemporaryDirectory()
-            unpack_path = Path(temp_dir.name)
+            temp_dir = tempfile.mkdtemp()
+            unpack_path = Path(temp_dir)
+            self._cleanup.append(unpack_path)
+
+        matcher = IgnoreMatcher(IgnorePatterns(self.ignore_patterns), self.ignore_hidden_files)
+
+        def unpack(_path: Path,
+                   root: Path,
+                   relpath: str,
+                   depth: int,
+                   budget: SizeBudget) -> t.Iterator[FileScanInput]:
+
+            fmt = archive_format(_path.name)
+
+            if is_streamable(fmt):
+                yield from walk_archive(_path, fmt, root, relpath + os.sep, depth, budget)
+                return
+
+            # Formats which cannot be read in place are extracted to disk
+            if not budget.consume(_path.stat().st_size):
+                util.warning(f'Archive {relpath} was not unpacked: size budget of {budget.limit} bytes exceeded')
+                return
+
+            extract_dir = unpack_path / relpath
+            try:
+                shutil.unpack_archive(_path, extract_dir, format=fmt)
+                self._cleanup.append(extract_dir)
+
+                # Do not apply gitignores to extracted archives
+                yield from walk(str(extract_dir), unpack_path, relpath + os.sep, matcher, depth, budget)
+            except (ValueError, ReadError):
+                pass
+
+        # Archives which are too large to be kept in memory are written apart from the unpacked files,
+        # so that their members can be written to the same relative path
+        spill_path = Path(tempfile.mkdtemp())
+        self._cleanup.append(spill_path)
+
+        def spill(relpath: str, write: t.Callable[[t.BinaryIO], None], archive: bool = False) -> Path:
+            """
+            Writes a single file which is too large to be kept in memory.
+            """
+            path = (spill_path if archive else unpack_path) / relpath
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            with path.open('wb') as dst:
+                write(dst)
+
+            self._cleanup.append(path)
+            return path
+
+        def spill_member(member: ArchiveMember, relpath: str, archive: bool = False) -> Path:
+            def write(dst: t.BinaryIO):
+                with member.open() as src:
+                    shutil.copyfileobj(src, dst)
+
+            return spill(relpath, write, archive)
+
+        def walk_archive(source: t.Union[Path, t.BinaryIO],
+                         fmt: str,
+                         root: Path,
+                         relprefix: str,
+                         depth: int,
+                         budget: SizeBudget) -> t.Iterator[FileScanInput]:
+            """
+            Streams the archive members to the analysers as in-memory buffers without extracting the archive.
+            Relative paths of the members are prefixed with the archive path, e.g. 'lib/archive.jar/inner/path'.
+            """
+            try:
+                for member in iter_members(source, fmt):
+                    relpath = relprefix + member.name
+
+                    if any(matcher.ignored(part, relpath) for part in member.name.split(os.sep)):
+                        if self.onPathIgnored:
+                            self.onPathIgnored(relpath)
+                        continue
+
+                    if not budget.consume(member.size):
+                        util.warning(f'Unpacking of {relprefix.rstrip(os.sep)} stopped: '
+                                     f'size budget of {budget.limit} bytes exceeded')
+                        return
+
+                    if member_fmt := is_archive(member.name, depth + 1):
+                        # Nested archives are unpacked by a separate job
+                        if is_streamable(member_fmt) and member.size <= self.file_max_size:
+                            with member.open() as fp:
+                                nested = io.BytesIO(fp.read())
 
-        def match(_path: Path, gitignores: t.List[t.Callable[[Path], bool]]):
-            if self.ignore_hidden_files and _path.name.startswith('.'):
-                return False
+                            extraction.submit(walk_archive(nested, member_fmt, root, relpath + os.sep, depth + 1, budget))
+                        else:
+                            extraction.submit(unpack(spill_member(member, relpath, archive=True), root, relpath, depth + 1, budget))
 
-            if any(fnmatch.fnmatch(_path.name, pat) for pat in self.ignore_patterns):
-                return False
+                    elif member.size <= self.file_max_size:
+                        with member.open() as fp:
+                            content = FileContent(relpath, fp.read())
 
-            return all(not gitignore(_path) for gitignore in gitignores)
+                        yield FileScanInput(root / relpath, root, None, content)
+
+                    else:
+                        path = spill_member(member, relpath)
+                        yield FileScanInput(path, unpack_path, path.stat())
+
+            except ArchiveErrors as err:
+                util.warning(f'Cannot read archive {relprefix.rstrip(os.sep)}: {err}')
+
+        def is_archive(_name: str, depth: int) -> t.Optional[str]:
+            if not self.unpack_archives or depth > self.archive_max_depth:
+                return None
+
+            return archive_format(_name)
+
+        def walk(top: str,
+                 root: Path,
+                 relprefix: str,
+                 topmatcher: IgnoreMatcher,
+                 depth: int = 0,
+                 budget: t.Optional[SizeBudget] = None,
+                 worktree: t.Optional[GitWorktree] = None) -> t.Iterator[FileScanInput]:
+            """
+            Walks the directory tree using os.scandir. File types are taken from the cached DirEntry data,
+            so that only one stat call per discovered file is required. Ignored directories are pruned
+            before descending into them.
+            """
+            stack = [(top, relprefix, topmatcher)]
+
+            while stack:
+                dirpath, dirprefix, dirmatcher = stack.pop()
+
+                try:
+                    with os.scandir(dirpath) as it:
+                        entries = list(it)
+                except OSError as err:
+                    util.warning(f'Cannot read directory {dirpath}: {err}')
+                    continue
+
+                if gitignore_entry := next((e for e in entries if e.name == '.gitignore'), None):
+                    if gitignore_entry.is_file():
+                        dirmatcher = dirmatcher.extend(GitignoreRules.parse(gitignore_entry.path))
+
+                subdirs = []
+
+                for entry in entries:
+                    if dirmatcher.ignored(entry.name, entry.path):
+                        if self.onPathIgnored:
+                            self.onPathIgnored(dirprefix + entry.name)
+                        continue
 
-        def walk(_path: Path, _root: t.Optional[Path], gitignores: t.List[t.Callable[[Path], bool]]):
-            if _path.is_file():
-                ext = ''.join(_path.suffixes)
-                if self.unpack_archives and (archive_ext := next((e for e in _archive_exts if ext.endswith(e)), None)):
-                    extract_dir = unpack_path / _path.name[:-len(archive_ext)]
                     try:
-                        shutil.unpack_archive(_path, extract_dir)
-                        self._cleanup.append(extract_dir)
+                        if entry.is_dir():
+                            subdirs.append((entry.path, dirprefix + entry.name + os.sep, dirmatcher))
 
-                        # Do not apply gitignores to extracted archives
-                        yield from walk(extract_dir, unpack_path, [])
-                    except (ValueError, ReadError):
-                        pass
-                else:
-                    yield _path.resolve(), _root.resolve() if _root else None
+                        elif entry.is_file():
+                            # Members of archives go with the archive
+                            if depth == 0 and not self._in_shard(dirprefix + entry.name):
+                                continue
 
-            elif _path.is_dir():
-                gitignore_file = _path / '.gitignore'
-                if gitignore_file.exists():
-                    gitignores = gitignores + [parse_gitignore(gitignore_file)]
+                            if worktree and worktree.unchanged(entry.path):
+                                self.unchangedFiles.add(dirprefix + entry.name)
 
-                for p in _path.iterdir():
-                    if not match(p, gitignores):
+                            elif is_archive(entry.name, depth + 1):
+                                extraction.submit(unpack(Path(entry.path),
+                                                         root,
+                                                         dirprefix + entry.name,
+                                                         depth + 1,
+                                                         budget or SizeBudget(self.archive_max_size)))
+                            else:
+                                yield FileScanInput(Path(entry.path),
+                                                    root,
+                                                    entry.stat(),
+                                                    digest=worktree.digest(entry.path) if worktree else None)
+
+                    except OSError as err:
+                        util.warning(f'Cannot access {entry.path}: {err}')
+
+                # Keep the depth-first order of the directory listing
+                stack.extend(reversed(subdirs))
+
+        def walk_revision(repo: Path, topmatcher: IgnoreMatcher) -> t.Iterator[FileScanInput]:
+            """
+            Streams the files of a git revision from the object store of the repository, so that neither
+            a checkout nor a work tree is required. Blob ids are used as content keys. The .gitignore files
+            of the revision are applied like the ones of a work tree (see walk), they are listed upfront,
+            since the tree is not listed directory by directory.
+            """
+            root = repo.resolve()
+            revision = t.cast(str, self.git_revision)
+            changed = changed_between(root, self.git_base, revision) if self.git_base else None
+
+            gitignores = {os.path.dirname(e.name): e.blob for e in iter_tree(root, revision)
+                          if os.path.basename(e.name) == '.gitignore'}
+
+            # Matchers of the directories by their relative paths, extended by the .gitignore files on the way
+            matchers: t.Dict[str, IgnoreMatcher] = {}
+
+            def matcher_of(dirname: str) -> IgnoreMatcher:
+                if (dirmatcher := matchers.get(dirname)) is None:
+                    dirmatcher = matcher_of(os.path.dirname(dirname)) if dirname else topmatcher
+
+                    if (blob := gitignores.get(dirname)) is not None:
+                        lines = catfile.read(blob).decode('utf-8', errors='replace').splitlines()
+                        dirpath = root / dirname
+                        dirmatcher = dirmatcher.extend(GitignoreRules(lines, str(dirpath / '.gitignore'), str(dirpath)))
+
+                    matchers[dirname] = dirmatcher
+
+                return dirmatcher
+
+            with CatFile(root) as catfile:
+                for entry in iter_tree(root, revision):
+                    relpath = entry.name
+
+                    parts = relpath.split(os.sep)
+                    if any(matcher_of(os.sep.join(parts[:i])).ignored(part, str(root.joinpath(*parts[:i + 1])))
+                           for i, part in enumerate(parts)):
                         if self.onPathIgnored:
-                            p = p.resolve()
-                            p = p.relative_to(_root.resolve()) if _root else p
-                            self.onPathIgnored(str(p))
+                            self.onPathIgnored(relpath)
                         continue
+
+                    if not self._in_shard(relpath):
+                        continue
+
+                    if changed is not None and relpath not in changed:
+                        self.unchangedFiles.add(relpath)
+
+                    elif fmt := is_archive(relpath, 1):
+                        budget = SizeBudget(self.archive_max_size)
+
+                        if is_streamable(fmt) and entry.size <= self.file_max_size:
+                            source = io.BytesIO(catfile.read(entry.blob))
+                            extraction.submit(walk_archive(source, fmt, root, relpath + os.sep, 1, budget))
+                        else:
+                            archive = spill(relpath, functools.partial(catfile.copy, entry.blob), archive=True)
+                            extraction.submit(unpack(archive, root, relpath, 1, budget))
+
+                    elif entry.size <= self.file_max_size:
+                        content = FileContent(relpath, catfile.read(entry.blob), entry.blob)
+                        yield FileScanInput(root / relpath, root, None, content, entry.blob)
+
                     else:
-                        yield from walk(p, _root, gitignores)
+                        path = spill(relpath, functools.partial(catfile.copy, entry.blob))
+                        yield FileScanInput(path, unpack_path, path.stat(), digest=entry.blob)
 
-        try:
-            for path in paths:
-                if path.is_dir():
-                    root = path if path.is_absolute() else (Path.cwd() / path).resolve()
-                    default_gitignores = [parse_gitignore(p, base_dir=root) for p in self.default_gitignores]
-                else:
-                    root = path.parent
-                    default_gitignores = []
+        worktrees: t.Dict[Path, t.Optional[GitWorktree]] = {}
 
-                for p in walk(path, root, default_gitignores):
-                    files.append(p)
+        def get_worktree(_path: Path) -> t.Optional[GitWorktree]:
+            if not self.git or not (worktree_root := find_worktree_root(_path)):
+                return None
 
-            self.totalTasks = len(files)
-            self.finishedTasks = 0
+            if worktree_root not in worktrees:
+                try:
+                    worktrees[worktree_root] = GitWorktree(worktree_root, self.git_base)
+                except GitError as err:
+                    util.warning(f'Cannot read git work tree {worktree_root}: {err}')
+                    worktrees[worktree_root] = None
 
-            results = self._do_scan(files)
-            if self.postprocessor:
-                results = self.postprocessor.apply(results)
+            return worktrees[worktree_root]
 
-            return results
+        for path in paths:
+            if path.is_dir():
+                root = path.resolve()
+                default_gitignores = tuple(GitignoreRules.parse(p, base_dir=root) for p in self.default_gitignores)
 
-        finally:
-            self._do_cleanup()
+                if self.git_revision:
+                    yield from walk_revision(root, IgnoreMatcher(matcher.patterns,
+                                                                 matcher.ignore_hidden_files,
+                                                                 default_gitignores))
+                    continue
+
+                yield from walk(str(root), root, '', IgnoreMatcher(matcher.patterns,
+                                                                   matcher.ignore_hidden_files,
+                                                                   default_gitignores),
+                                worktree=get_worktree(root))
+
+            elif path.is_file():
+                path = path.resolve()
+                worktree = get_worktree(path)
+
+                if not self._in_shard(path.name):
+                    continue
+
+                if worktree and worktree.unchanged(path):
+                    self.unchangedFiles.add(path.name)
+                elif is_archive(path.name, 1):
+                    extraction.submit(unpack(path, path.parent, path.name, 1, SizeBudget(self.archive_max_size)))
+                else:
+                    yield FileScanInput(path, path.parent, path.stat(), digest=worktree.digest(path) if worktree else None)
+
+    def _in_shard(self, relpath: str) -> bool:
+        return not self.shard or self.shard.contains(relpath)
 
     def cancel(self):
         self._cancelled = True
 
-    def _do_scan(self, files: t.List[FileScanInput]) -> ScanResults:
+    def _do_scan(self, files: t.Iterable[FileScanInput]) -> ScanResults:
         results = {}
 
-        for path, root in files:
-            relpath, result, errors = self.__class__._scan_file(path, self.analysers, root)
+        for f in files:
+            if self._budget_left() <= 0:
+                self._complete(results, f.relpath, [], [NOT_SCANNED_BUDGET])
+                continue
 
-            self._notifyCompletion(relpath, result, errors)
-            
-            if result:
-                results[relpath] = result
+            relpath, result, errors = self.__class__._scan_file(f, self.analysers)
+            self._complete(results, relpath, result, errors)
 
         return results
 
     def _do_cleanup(self):
-        for p in (p for p in self._cleanup if p.exists()):
-            if p.is_file():
-                p.unlink()
-            else:
-                shutil.rmtree(p)
+        """
+        Removes unpacked files in the background, so that the next scan is not blocked.
+        The thread is not a daemon, hence the cleanup is completed before the interpreter exits.
+        """
+        cleanup, self._cleanup = self._cleanup, []
+
+        def remove():
+            for p in (p for p in cleanup if p.exists()):
+                if p.is_file():
+                    p.unlink(missing_ok=True)
+                else:
+                    shutil.rmtree(p, ignore_errors=True)
+
+        if cleanup:
+            threading.Thread(target=remove, name='ts-deepscan-cleanup').start()
+
+    def _report(self,
+                relpath: str,
+                result: t.List[AnalysisResult],
+                errors: t.List[str],
+                resumed: bool = False):
+        """
+        Reports the completion of a file to the callbacks and passes its results to the sink. Files are completed
+        by the thread feeding the analysis (duplicates, resumed files) and by the thread collecting the results,
+        the completions are serialised, so that the counters and the callbacks do not need to be thread-safe.
+        """
+        with self._completion_lock:
+            self._notifyCompletion(relpath, result, errors, resumed)
+
+            if self._sink:
+                self._sink((relpath, result, errors))
 
     def _progress(self):
         self.finishedTasks += 1
@@ -222,8 +921,126 @@ class Scanner(object):
         if self.onProgress:
             self.onProgress(self.finishedTasks, self.totalTasks)
 
-    def _notifyCompletion(self, relpath: str, result: t.List[AnalysisResult], errors: t.List[str]):
+    def _notifyCompletion(self,
+                          relpath: str,
+                          result: t.List[AnalysisResult],
+                          errors: t.List[str],
+                          resumed: bool = False):
+        if any(r.timeout for r in result):
+            self.timedOutFiles.add(relpath)
+
+        if NOT_SCANNED_BUDGET in errors:
+            self.budgetSkippedFiles.add(relpath)
+
+        # Files skipped due to the time budget or cancelled are left to a resumed scan
+        elif self.journal and not resumed and NOT_SCANNED_CANCELLED not in errors:
+            self.journal.record(relpath, result, errors)
+
         if self.onFileScanCompleted:
             self.onFileScanCompleted(relpath, result, errors)
 
         self._progress()
+
+
+class _ResultStream(object):
+    """
+    Runs a scan in a background thread and passes the results of completed files through a bounded queue.
+    The scan is cancelled when the stream is closed, or when it is dropped without being closed,
+    e.g. by an abandoned asynchronous iterator.
+    """
+
+    # Marks the end of the scan in the queue
+    _end = object()
+
+    def __init__(self, scanner: Scanner, paths: t.List[Path], buffer_size: int):
+        self.scanner = scanner
+        self.buffer_size = buffer_size if buffer_size > 0 else DEFAULT_STREAM_BUFFER_SIZE
+
+        self._queue: queue.Queue = queue.Queue(maxsize=self.buffer_size)
+        self._stopped = threading.Event()
+        self._finished = False
+        self._failure: t.List[BaseException] = []
+
+        # The thread does not refer to the stream, so that the stream can be dropped while it is running
+        self._thread = threading.Thread(target=_ResultStream._scan,
+                                        args=(scanner, paths, self._queue, self._stopped, self._failure),
+                                        name='ts-deepscan-stream', daemon=True)
+        self._thread.start()
+
+        self._stop = weakref.finalize(self, _ResultStream._cancel, scanner, self._thread, self._stopped)
+
+    @staticmethod
+    def _put(q: queue.Queue, stopped: threading.Event, item):
+        # Blocks the scan while the buffer is full, unless the consumer has gone
+        while not stopped.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    @staticmethod
+    def _scan(scanner: Scanner,
+              paths: t.List[Path],
+              q: queue.Queue,
+              stopped: threading.Event,
+              failure: t.List[BaseException]):
+        try:
+            scanner._run(paths, sink=functools.partial(_ResultStream._put, q, stopped))
+        except BaseException as err:
+            failure.append(err)
+        finally:
+            _ResultStream._put(q, stopped, _ResultStream._end)
+
+    @staticmethod
+    def _cancel(scanner: Scanner, thread: threading.Thread, stopped: threading.Event):
+        stopped.set()
+
+        if thread.is_alive():
+            scanner.cancel()
+            thread.join()
+
+            # The scanner can be used for further scans
+            scanner._cancelled = False
+
+    def next_chunk(self) -> t.Optional[t.List[FileScanResult]]:
+        """
+        Waits for completed files and returns the results available at once, or None at the end of the scan.
+        """
+        chunk = []
+
+        while not self._finished and not self._stopped.is_set():
+            try:
+                item = self._queue.get(timeout=0.1) if not chunk else self._queue.get_nowait()
+            except queue.Empty:
+                if chunk:
+                    break
+                continue
+
+            if item is _ResultStream._end:
+                self._finished = True
+            else:
+                chunk.append(item)
+
+                if len(chunk) >= self.buffer_size:
+                    break
+
+        if not chunk:
+            if self._failure:
+                raise self._failure[0]
+            return None
+
+        return self._postprocess(chunk)
+
+    def _postprocess(self, chunk: t.List[FileScanResult]) -> t.List[FileScanResult]:
+        if not (postprocessor := self.scanner.postprocessor):
+            return chunk
+
+        results = postprocessor.apply({relpath: result for relpath, result, _ in chunk if result})
+        return [(relpath, results.get(relpath, result), errors) for relpath, result, errors in chunk]
+
+    def close(self):
+        """
+        Stops the stream, the scan is cancelled if it is still running.
+        """
+        self._stop()
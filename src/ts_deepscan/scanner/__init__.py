@@ -13,11 +13,27 @@ from datetime import datetime
 from dataclasses import dataclass, field
 from dataclasses_json import dataclass_json, config
 
-from ..analyser import AnalysisResult
+from ..analyser import AnalysisResult, FileContent
+
+class FileScanInput(t.NamedTuple):
+    """
+    A file scan input represented as:
+     ( absolute_file_path, optional_root_path, optional_stat_result, optional_content, optional_digest )
+
+    The stat result is collected during the discovery, so that later stages do not need to stat the file again.
+    Files without a counterpart on disk (e.g. archive members) carry their in-memory content and a virtual path.
+    The digest is a content key known upfront (e.g. a git blob id), which saves reading the file to hash it.
+    """
+    path: Path
+    root: t.Optional[Path] = None
+    stat: t.Optional[os.stat_result] = None
+    content: t.Optional[FileContent] = None
+    digest: t.Optional[str] = None
+
+    @property
+    def relpath(self) -> str:
+        return str(self.path.relative_to(self.root) if self.root else self.path)
 
-# Alias for a file scan input represented as:
-#  ( absolute_file_path, optional_root_path )
-FileScanInput = t.Tuple[Path, t.Optional[Path]]
 
 # Alias for a file scan result represented as:
 #  ( relative_file_path, [ analyser_results ], [ error_messages ] )
@@ -150,6 +166,37 @@ class SummaryTree:
 
         return node
 
+    def add_result(self, path: str, res: dict):
+        """
+        Adds the results of a file to the summary of its directory.
+        """
+        dirpath = os.path.dirname(path)
+        summary_entry = self.get_node(dirpath).summary
+
+        if lic_info := res.get('license'):
+            summary_entry._add_license_info(lic_info)            
+
+        # Collect licenses from commets iff. no license result was found
+        elif comments := res.get('comments'):
+            for c in comments:
+                if c_lic_info := c.get('license'):
+                    summary_entry._add_license_info(c_lic_info)
+                else:
+                    summary_entry._add_license_info(c)
+
+        if crypto_algs := res.get('crypto'):
+            for crypto_alg in crypto_algs:
+                alg = crypto_alg['algorithm']
+                codings = summary_entry.crypto_algorithms.get(alg, [])
+                if (coding := crypto_alg.get('coding')) and (coding not in codings):
+                    codings.append(coding)
+                summary_entry.crypto_algorithms[alg] = codings
+
+        if scanoss := res.get('scanoss'):
+            for scanoss_scan in scanoss.get('scan', []):
+                if purl := scanoss_scan.get('purl'):                    
+                    summary_entry._add_component(purl, scanoss_scan.get('version'))
+
     def flatten(self) -> t.Dict[str, Summary]:    
         def _flatten(node: 'SummaryTree', path: str) -> t.Dict[str, Summary]:
             if not node.children:
@@ -188,34 +235,8 @@ def compute_summary(scan: Scan):
     # Sort paths by depth (children first), then alphabetically within same depth
     # sorted_paths = sorted(scan.result.keys(), key=lambda p: (-p.count(os.sep), p))
 
-    for path, res in scan.result.items():        
-        dirpath = os.path.dirname(path)
-        summary_entry = summary.get_node(dirpath).summary
-        
-        if lic_info := res.get('license'):
-            summary_entry._add_license_info(lic_info)            
-
-        # Collect licenses from commets iff. no license result was found
-        elif comments := res.get('comments'):
-            for c in comments:
-                if c_lic_info := c.get('license'):
-                    summary_entry._add_license_info(c_lic_info)
-                else:
-                    summary_entry._add_license_info(c)
-
-        if crypto_algs := res.get('crypto'):
-            for crypto_alg in crypto_algs:
-                alg = crypto_alg['algorithm']
-                codings = summary_entry.crypto_algorithms.get(alg, [])
-                if (coding := crypto_alg.get('coding')) and (coding not in codings):
-                    codings.append(coding)
-                summary_entry.crypto_algorithms[alg] = codings
-
-        if scanoss := res.get('scanoss'):
-            for scanoss_scan in scanoss.get('scan', []):
-                if purl := scanoss_scan.get('purl'):                    
-                    summary_entry._add_component(purl, scanoss_scan.get('version'))
-
+    for path, res in scan.result.items():
+        summary.add_result(path, res)
 
     scan.summary = summary.flatten()
 
@@ -0,0 +1,206 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import shutil
+import tarfile
+import zipfile
+import threading
+import typing as t
+
+from pathlib import PurePosixPath
+from concurrent import futures
+
+import ts_deepscan.util as util
+
+
+def _register_unpack_formats() -> t.Dict[str, str]:
+    """
+    Registers unpack formats and returns all supported archive extensions mapped to their format names.
+    """
+
+    def unpack_zip(filename, extract_dir):
+        shutil.unpack_archive(filename, extract_dir, format='zip')
+
+    # Check for registered formats using get_unpack_formats instead of private _UNPACK_FORMATS
+    registered_formats = {fmt[0] for fmt in shutil.get_unpack_formats()}
+
+    if "wheel" not in registered_formats:
+        shutil.register_unpack_format('wheel', ['.whl'], unpack_zip)
+
+    if "jar" not in registered_formats:
+        shutil.register_unpack_format('jar', ['.jar'], unpack_zip)
+
+    return {ext: fmt[0] for fmt in shutil.get_unpack_formats() for ext in fmt[1]}
+
+
+_archive_formats = _register_unpack_formats()
+
+# Longest extensions first, so that '.tar.gz' wins over '.gz'
+_archive_exts = tuple(sorted(_archive_formats.keys(), key=len, reverse=True))
+
+# Formats which can be read member by member without extracting them to disk
+_zip_formats = {'zip', 'wheel', 'jar'}
+_tar_formats = {'tar', 'gztar', 'bztar', 'xztar'}
+
+# Errors raised while reading broken or unsupported archives
+ArchiveErrors = (zipfile.BadZipFile, zipfile.LargeZipFile, tarfile.TarError, EOFError, ValueError, OSError)
+
+
+class ArchiveMember(t.NamedTuple):
+    # Sanitized relative path of the member inside the archive
+    name: str
+    size: int
+    open: t.Callable[[], t.BinaryIO]
+
+
+def archive_format(name: str) -> t.Optional[str]:
+    """
+    Returns the unpack format name of an archive file or None if the file is not an archive.
+    """
+    if not name.endswith(_archive_exts):
+        return None
+
+    ext = ''.join(PurePosixPath(name).suffixes)
+    return next((_archive_formats[e] for e in _archive_exts if ext.endswith(e)), None)
+
+
+def is_streamable(fmt: str) -> bool:
+    """
+    Returns True if the members of the archive format can be read in place.
+    """
+    return fmt in _zip_formats or fmt in _tar_formats
+
+
+def iter_members(source: t.Union[str, os.PathLike, t.BinaryIO], fmt: str) -> t.Iterator[ArchiveMember]:
+    """
+    Iterates over regular file members of a zip or tar archive. The archive is read in place,
+    the members are opened on demand and have to be consumed before advancing the iterator.
+    """
+    if fmt in _zip_formats:
+        with zipfile.ZipFile(source) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+
+                if name := _sanitize(info.filename):
+                    yield ArchiveMember(name, info.file_size, lambda _info=info: zf.open(_info))
+
+    elif fmt in _tar_formats:
+        if isinstance(source, (str, os.PathLike)):
+            tf = tarfile.open(name=source, mode='r:*')
+        else:
+            tf = tarfile.open(fileobj=source, mode='r:*')
+
+        with tf:
+            for info in tf:
+                if not info.isfile():
+                    continue
+
+                if name := _sanitize(info.name):
+                    yield ArchiveMember(name, info.size, lambda _info=info: tf.extractfile(_info))
+
+    else:
+        raise ValueError(f'Archive format {fmt} cannot be read in place')
+
+
+def _sanitize(name: str) -> str:
+    """
+    Converts a member name into a relative path, dropping absolute and parent directory components.
+    """
+    parts = (p for p in name.replace('\\', '/').split('/') if p not in ('', '.', '..'))
+    return os.sep.join(parts)
+
+
+class SizeBudget(object):
+    """
+    Thread safe budget of bytes that may be unpacked from an archive incl. all of its nested archives.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.consumed = 0
+        self.exceeded = False
+
+        self._lock = threading.Lock()
+
+    def consume(self, size: int) -> bool:
+        with self._lock:
+            if self.consumed + size > self.limit:
+                self.exceeded = True
+                return False
+
+            self.consumed += size
+            return True
+
+
+class ExtractionPool(object):
+    """
+    Runs archive jobs on a thread pool. A job is an iterator over the files found in an archive,
+    each file is passed to the emit callback as soon as it is available. Jobs may submit further
+    jobs for nested archives, join() waits until all of them are finished.
+    """
+
+    def __init__(self, num_threads: int, emit: t.Callable[[t.Any], bool]):
+        self._emit = emit
+        self._executor = futures.ThreadPoolExecutor(max_workers=num_threads,
+                                                    thread_name_prefix='ts-deepscan-extraction')
+
+        self._pending = 0
+        self._stopped = False
+        self._failure: t.Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+    def __enter__(self) -> 'ExtractionPool':
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, job: t.Iterator[t.Any]):
+        with self._cond:
+            if self._stopped:
+                return
+            self._pending += 1
+
+        try:
+            self._executor.submit(self._run, job)
+        except RuntimeError:
+            self._done()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def join(self):
+        with self._cond:
+            while self._pending > 0 and not self._stopped:
+                self._cond.wait()
+
+        if self._failure:
+            raise self._failure
+
+    def _run(self, job: t.Iterator[t.Any]):
+        try:
+            for f in job:
+                if self._stopped or not self._emit(f):
+                    break
+
+        except BaseException as err:
+            util.error(f'Archive extraction failed: {err}')
+            with self._cond:
+                self._failure = self._failure or err
+            self.stop()
+
+        finally:
+            if hasattr(job, 'close'):
+                job.close()
+            self._done()
+
+    def _done(self):
+        with self._cond:
+            self._pending -= 1
+            self._cond.notify_all()
@@ -0,0 +1,209 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Protocol between the coordinator of a distributed scan (see DistributedScanner) and its worker nodes.
+
+Nodes connect to the coordinator over TCP (multiprocessing.connection, authenticated by a shared secret)
+and exchange pickled messages:
+
+ node -> coordinator                            coordinator -> node
+  ('hello', name, jobs)                          ('setup', analysers, task_timeout)
+  ('more',)          asks for files              ('files', [ file_scan_input ])
+  ('result', relpath, results, errors)           ('steal',)   asks to give back files not started yet
+  ('released', [ relpath ])                      ('stop',)    when all files have been analysed
+                                                 ('cancel',)
+
+Files are sent with their contents, nodes do not need access to the scanned paths. A node analyses the
+files with a local pool of workers and asks for more files when it runs low. Files are taken from the
+front of its queue, stolen files are given back from the end.
+"""
+
+import os
+import time
+import socket
+import threading
+import collections
+import typing as t
+import multiprocessing.connection as connection
+
+import ts_deepscan.util as util
+
+from . import FileScanInput, FileScanResult
+from .Scanner import Scanner
+from ..analyser import FileAnalyser
+
+
+# Variable holding the secret shared by the coordinator and the worker nodes
+SECRET_ENV = 'TS_DEEPSCAN_CLUSTER_SECRET'
+
+# Number of files queued on a node per local worker, before the node asks for more
+DEFAULT_NODE_PREFETCH = int(os.environ.get('TS_DEEPSCAN_NODE_PREFETCH', 2))
+
+Address = t.Tuple[str, int]
+
+
+def parse_address(address: str, default_host: str = '127.0.0.1') -> Address:
+    """
+    Parses an address given as 'host:port' or 'port'.
+    """
+    host, sep, port = address.rpartition(':')
+
+    try:
+        return (host.strip('[]') if sep and host else default_host), int(port)
+    except ValueError:
+        raise ValueError(f'Invalid address: {address}')
+
+
+def get_secret(secret: t.Optional[str] = None) -> t.Optional[bytes]:
+    """
+    Returns the secret authenticating the nodes, if not given it is taken from the environment (see SECRET_ENV).
+    """
+    if secret := secret or os.environ.get(SECRET_ENV):
+        return secret.encode('utf-8')
+
+    return None
+
+
+class WorkerNode(object):
+    """
+    Worker node of a distributed scan. Receives the analysers from the coordinator and analyses the files
+    it is given using the scanner created by the scanner factory, e.g. a PoolScanner with local workers.
+    """
+
+    def __init__(self,
+                 address: Address,
+                 secret: bytes,
+                 jobs: int,
+                 scanner_factory: t.Callable[[t.List[FileAnalyser], int], Scanner],
+                 prefetch: int = DEFAULT_NODE_PREFETCH):
+        self.address = address
+        self.secret = secret
+        self.jobs = jobs if jobs > 0 else os.cpu_count() or 1
+        self.scanner_factory = scanner_factory
+
+        # Files queued beyond the ones being analysed, the node asks for more when it holds fewer
+        self.low_watermark = max(self.jobs * prefetch, 1)
+
+        self._conn: t.Optional[connection.Connection] = None
+        self._send_lock = threading.Lock()
+
+        self._cond = threading.Condition()
+        self._queue: t.Deque[FileScanInput] = collections.deque()
+        self._requested = False
+        self._stopped = False
+
+    def serve(self, retry: float = 0) -> int:
+        """
+        Connects to the coordinator, retrying for the given number of seconds, and analyses files until
+        the coordinator stops the node. Returns the number of analysed files.
+        """
+        deadline = time.monotonic() + retry
+
+        while True:
+            try:
+                self._conn = connection.Client(self.address, authkey=self.secret)
+                break
+            except (OSError, connection.AuthenticationError) as err:
+                if isinstance(err, connection.AuthenticationError) or time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.2)
+
+        receiver = None
+
+        try:
+            self._send(('hello', socket.gethostname(), self.jobs))
+            _, analysers, task_timeout = self._conn.recv()
+
+            scanner = self.scanner_factory(analysers, task_timeout)
+            scanner.queue_size = self.low_watermark
+
+            util.info(f'Connected to {self.address[0]}:{self.address[1]}, analysing with {self.jobs} workers')
+
+            receiver = threading.Thread(target=self._receive, args=(scanner,), name='ts-deepscan-node', daemon=True)
+            receiver.start()
+
+            analysed = 0
+
+            def sink(res: FileScanResult):
+                nonlocal analysed
+                analysed += 1
+                self._send(('result', *res))
+
+            scanner._sink = sink
+
+            try:
+                scanner._do_scan(self._files())
+            finally:
+                scanner._sink = None
+                if close := getattr(scanner, 'close', None):
+                    close()
+
+            return analysed
+
+        except (EOFError, OSError):
+            util.warning('The connection to the coordinator has been lost')
+            return 0
+
+        finally:
+            if receiver:
+                # Stopped by the coordinator, or the connection is lost and the receiver stops on its own
+                receiver.join(timeout=1)
+
+            self._conn.close()
+
+    def _send(self, msg):
+        with self._send_lock:
+            self._conn.send(msg)
+
+    def _receive(self, scanner: Scanner):
+        try:
+            while True:
+                msg = self._conn.recv()
+
+                if msg[0] == 'files':
+                    with self._cond:
+                        self._queue.extend(msg[1])
+                        self._requested = False
+                        self._cond.notify_all()
+
+                elif msg[0] == 'steal':
+                    with self._cond:
+                        released = [self._queue.pop() for _ in range(len(self._queue) - len(self._queue) // 2)]
+
+                    self._send(('released', [f.relpath for f in released]))
+
+                elif msg[0] == 'stop':
+                    break
+
+                elif msg[0] == 'cancel':
+                    scanner.cancel()
+                    break
+
+        except (EOFError, OSError):
+            util.warning('The connection to the coordinator has been lost')
+            scanner.cancel()
+
+        with self._cond:
+            self._queue.clear()
+
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _files(self) -> t.Iterator[FileScanInput]:
+        while True:
+            with self._cond:
+                if len(self._queue) < self.low_watermark and not self._requested and not self._stopped:
+                    self._requested = True
+                    self._send(('more',))
+
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+
+                if not self._queue:
+                    return
+
+                f = self._queue.popleft()
+
+            yield f
@@ -0,0 +1,127 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import json
+import tempfile
+import threading
+import typing as t
+
+from pathlib import Path
+
+import ts_deepscan.util as util
+
+from ..commentparser.language import classify
+
+
+# Name of the file keeping the recorded durations, it is stored next to the results cache
+DEFAULT_COSTS_FILE = 'durations.json'
+
+# Fixed cost of analysing a file expressed in bytes, so that small files are not predicted to be free
+_base_size = 4096
+
+# Seconds per byte assumed for files of categories without any recorded durations
+_default_rate = 1e-7
+
+# Max number of durations kept per key, older durations fade out by halving the stats
+_max_count = 1000
+
+
+class CostModel(object):
+    """
+    Predicts the time the analysers take on a file from the durations recorded in earlier runs.
+
+    Durations are recorded per analyser category and file extension, as well as per language of the file
+    and per category in total. The prediction for a file scales the time per byte of the most specific key
+    having any records with the file size.
+    """
+
+    def __init__(self, path: t.Optional[Path] = None):
+        self.path = path
+
+        # '<category>:<key>' -> [ count, seconds, bytes ]
+        self._stats: t.Dict[str, t.List[float]] = {}
+        self._keys: t.Dict[str, t.Tuple[str, ...]] = {}
+
+        self._lock = threading.Lock()
+        self._changed = False
+
+        if path and path.exists():
+            try:
+                with path.open('r') as fp:
+                    self._stats = json.load(fp)
+            except (OSError, ValueError) as err:
+                util.warning(f'Could not load the recorded durations from {path}: {err}')
+
+    def _keys_of(self, path: Path) -> t.Tuple[str, ...]:
+        """
+        Returns the keys for a file path, from the most to the least specific one. The keys are cached by
+        the suffix of the file, which determines its language (matched case-sensitively, unlike the extension).
+        """
+        suffix = path.suffix
+
+        if (keys := self._keys.get(suffix)) is None:
+            keys = self._keys[suffix] = (f'ext{suffix.lower()}', f'lang:{classify(path).name}', '*')
+
+        return keys
+
+    def predict(self, path: Path, size: int, categories: t.Iterable[str]) -> float:
+        """
+        Returns the predicted analysis time of a file in seconds.
+        """
+        keys = self._keys_of(path)
+        cost = 0.0
+
+        for category in categories:
+            rate = _default_rate
+
+            for key in keys:
+                if stats := self._stats.get(f'{category}:{key}'):
+                    count, seconds, total = stats
+                    rate = seconds / (total + count * _base_size)
+                    break
+
+            cost += rate * (size + _base_size)
+
+        return cost
+
+    def record(self, path: Path, size: int, durations: t.Dict[str, float]):
+        keys = self._keys_of(path)
+
+        with self._lock:
+            for category, seconds in durations.items():
+                for key in keys:
+                    stats = self._stats.setdefault(f'{category}:{key}', [0, 0.0, 0])
+
+                    if stats[0] >= _max_count:
+                        stats[:] = [stats[0] / 2, stats[1] / 2, stats[2] / 2]
+
+                    stats[0] += 1
+                    stats[1] += seconds
+                    stats[2] += size
+
+            self._changed = True
+
+    def save(self):
+        """
+        Writes the recorded durations to the file, if any durations were recorded since the last save.
+        """
+        if not self.path or not self._changed:
+            return
+
+        with self._lock:
+            data = json.dumps(self._stats)
+            self._changed = False
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix='.durations')
+            with os.fdopen(fd, 'w') as fp:
+                fp.write(data)
+
+            os.replace(tmp, self.path)
+
+        except OSError as err:
+            util.warning(f'Could not save the recorded durations to {self.path}: {err}')
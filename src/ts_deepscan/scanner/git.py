@@ -0,0 +1,228 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import threading
+import subprocess
+import typing as t
+
+from pathlib import Path
+
+import ts_deepscan.util as util
+
+
+# Modes of regular files in git trees and in the index (symlinks and submodules are skipped)
+_regular_file_modes = ('100644', '100755')
+
+
+class GitError(Exception):
+    pass
+
+
+def git(*args: str, cwd: t.Union[str, Path]) -> bytes:
+    """
+    Runs a git command and returns its output.
+    """
+    try:
+        proc = subprocess.run(['git', *args], cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    except FileNotFoundError:
+        raise GitError('git executable not found')
+    except subprocess.CalledProcessError as err:
+        raise GitError(f'git {args[0]} failed: {err.stderr.decode(errors="replace").strip()}')
+
+    return proc.stdout
+
+
+def _split_z(output: bytes) -> t.Iterator[str]:
+    return (os.fsdecode(p) for p in output.split(b'\0') if p)
+
+
+def find_worktree_root(path: Path) -> t.Optional[Path]:
+    """
+    Returns the top level directory of the work tree containing the path or None if the path is not in a work tree.
+    """
+    cwd = path if path.is_dir() else path.parent
+
+    try:
+        return Path(os.fsdecode(git('rev-parse', '--show-toplevel', cwd=cwd).rstrip(b'\n'))).resolve()
+    except GitError:
+        return None
+
+
+class GitWorktree(object):
+    """
+    Tracked files of a git work tree with their blob ids taken from the index.
+
+    Blob ids identify the contents of files, so they are used as content keys instead of hashing the files.
+    Files modified in the work tree (i.e. differing from the index) have no blob id. If a base revision
+    is given, tracked files which are neither modified nor changed since the base revision are 'unchanged'.
+    """
+
+    def __init__(self, root: Path, base: t.Optional[str] = None):
+        self.root = root
+        self.base = base
+
+        # Relative paths (using os.sep) mapped to blob ids
+        self.blobs: t.Dict[str, str] = {}
+
+        for entry in git('ls-files', '-s', '-z', cwd=root).split(b'\0'):
+            if not entry:
+                continue
+
+            # <mode> SP <object> SP <stage> TAB <file>
+            info, _, name = entry.partition(b'\t')
+            mode, blob, stage = info.decode().split(' ')
+
+            if mode in _regular_file_modes and stage == '0':
+                self.blobs[os.path.normpath(os.fsdecode(name))] = blob
+
+        # Files differing from the index
+        modified = {os.path.normpath(p) for p in _split_z(git('diff-files', '--name-only', '-z', cwd=root))}
+
+        for p in modified:
+            self.blobs.pop(p, None)
+
+        # Files changed since the base revision, incl. the modified ones
+        self.changed: t.Optional[t.Set[str]] = None
+
+        if base:
+            self.changed = {os.path.normpath(p) for p in
+                            _split_z(git('diff', '--name-only', '--no-renames', '-z', base, cwd=root))}
+            self.changed |= modified
+
+        util.info(f'Git work tree {root}: {len(self.blobs)} tracked files'
+                  + (f', {len(self.changed)} changed since {base}' if base else ''))
+
+    def _relpath(self, path: t.Union[str, Path]) -> t.Optional[str]:
+        relpath = os.path.relpath(path, self.root)
+        return None if relpath.startswith(os.pardir) else relpath
+
+    def digest(self, path: t.Union[str, Path]) -> t.Optional[str]:
+        """
+        Returns the blob id of a tracked and unmodified file.
+        """
+        if (relpath := self._relpath(path)) is None:
+            return None
+
+        return self.blobs.get(relpath)
+
+    def unchanged(self, path: t.Union[str, Path]) -> bool:
+        """
+        Returns True if the file is tracked and did not change since the base revision.
+        Always returns False if there is no base revision.
+        """
+        if self.changed is None or (relpath := self._relpath(path)) is None:
+            return False
+
+        return relpath in self.blobs and relpath not in self.changed
+
+
+class TreeEntry(t.NamedTuple):
+    # Relative path (using os.sep)
+    name: str
+    blob: str
+    size: int
+
+
+def iter_tree(repo: Path, treeish: str) -> t.Iterator[TreeEntry]:
+    """
+    Iterates over regular files of a tree-ish using `git ls-tree`. Works for bare repositories as well.
+    """
+    # Fail early on unknown revisions
+    try:
+        git('rev-parse', '--verify', '--quiet', f'{treeish}^{{tree}}', cwd=repo)
+    except GitError:
+        raise GitError(f'{treeish} is not a valid tree-ish in {repo}')
+
+    proc = subprocess.Popen(['git', 'ls-tree', '-r', '-z', '--long', '--full-tree', treeish],
+                            cwd=repo, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        pending = b''
+
+        while chunk := proc.stdout.read(1 << 16):
+            *entries, pending = (pending + chunk).split(b'\0')
+
+            for entry in entries:
+                # <mode> SP <type> SP <object> SP+ <size> TAB <file>
+                info, _, name = entry.partition(b'\t')
+                mode, _, blob, size = info.decode().split()
+
+                if mode in _regular_file_modes:
+                    yield TreeEntry(os.path.normpath(os.fsdecode(name)), blob, int(size))
+
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+class CatFile(object):
+    """
+    Reads blobs from the object store of a repository over a single long-lived `git cat-file --batch` process.
+    """
+
+    def __init__(self, repo: Path):
+        self.repo = repo
+
+        self._lock = threading.Lock()
+        self._proc = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=repo,
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def __enter__(self) -> 'CatFile':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._proc.poll() is None:
+                self._proc.stdin.close()
+                self._proc.wait()
+            self._proc.stdout.close()
+
+    def _request(self, blob: str) -> int:
+        self._proc.stdin.write(blob.encode() + b'\n')
+        self._proc.stdin.flush()
+
+        # <object> SP <type> SP <size> LF or <object> SP missing LF
+        header = self._proc.stdout.readline().split()
+
+        if len(header) != 3:
+            raise GitError(f'git object {blob} is missing')
+
+        return int(header[2])
+
+    def read(self, blob: str) -> bytes:
+        with self._lock:
+            size = self._request(blob)
+            data = self._proc.stdout.read(size)
+            self._proc.stdout.read(1)
+
+        return data
+
+    def copy(self, blob: str, fp: t.BinaryIO):
+        """
+        Writes the blob into a file without keeping it in memory.
+        """
+        with self._lock:
+            size = self._request(blob)
+
+            while size > 0:
+                chunk = self._proc.stdout.read(min(size, 1 << 20))
+                if not chunk:
+                    raise GitError(f'git object {blob} is truncated')
+
+                fp.write(chunk)
+                size -= len(chunk)
+
+            self._proc.stdout.read(1)
+
+
+def changed_between(repo: Path, base: str, treeish: str) -> t.Set[str]:
+    """
+    Returns relative paths of files changed between two revisions.
+    """
+    return {os.path.normpath(p) for p in
+            _split_z(git('diff', '--name-only', '--no-renames', '-z', base, treeish, cwd=repo))}
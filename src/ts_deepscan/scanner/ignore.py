@@ -0,0 +1,156 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import re
+import sys
+import fnmatch
+import functools
+import typing as t
+
+from pathlib import Path
+from gitignore_parser import rule_from_pattern, handle_negation
+
+
+_is_windows = sys.platform.startswith('win')
+
+
+class IgnorePatterns(object):
+    """
+    Unix filename patterns compiled into a single regular expression.
+    Matches file names exactly like fnmatch.fnmatch does for each of the patterns.
+    """
+
+    def __init__(self, patterns: t.Iterable[str]):
+        patterns = [os.path.normcase(p) for p in patterns]
+        self._regex = re.compile('|'.join(fnmatch.translate(p) for p in patterns)) if patterns else None
+
+    def __bool__(self):
+        return self._regex is not None
+
+    def match(self, name: str) -> bool:
+        return bool(self._regex and self._regex.match(os.path.normcase(name)))
+
+
+class _CompiledRules(t.NamedTuple):
+    # Union of all rules, used to reject non-matching paths with a single search
+    any_rule: t.Optional[t.Pattern]
+    # Rules in reversed order, used to evaluate negations (the last matching rule wins)
+    reversed_rules: t.Tuple[t.Tuple[t.Pattern, bool], ...]
+    has_negation: bool
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile_rules(lines: t.Tuple[str, ...]) -> t.Tuple[_CompiledRules, t.Tuple[t.Any, ...]]:
+    """
+    Compiles the gitignore lines. Regular expressions do not depend on the base directory,
+    so identical .gitignore files (e.g. in vendored trees) are compiled only once.
+    """
+    rules = tuple(r for r in (rule_from_pattern(line) for line in lines) if r)
+
+    compiled = _CompiledRules(
+        any_rule=re.compile('|'.join(f'(?:{r.regex})' for r in rules)) if rules else None,
+        reversed_rules=tuple((re.compile(r.regex), r.negation) for r in reversed(rules)),
+        has_negation=any(r.negation for r in rules)
+    )
+
+    return compiled, rules
+
+
+class GitignoreRules(object):
+    """
+    Rules of a single .gitignore file. Decisions are the same as made by the gitignore_parser callables,
+    but the path relative to the base directory is computed once per path instead of once per rule.
+    """
+
+    def __init__(self, lines: t.Iterable[str], path: str, base_dir: str):
+        self.path = path
+        self.base_dir = os.path.abspath(base_dir)
+
+        self._prefix = self.base_dir.rstrip(os.sep) + os.sep
+        self._compiled, rules = _compile_rules(tuple(line.rstrip('\n') for line in lines))
+
+        if _is_windows:
+            # Keep the original matching (incl. handling of trailing symbols) on Windows
+            base_path = Path(self.base_dir)
+            self._rules = [r._replace(base_path=base_path) for r in rules]
+
+    @staticmethod
+    def parse(path: t.Union[str, Path], base_dir: t.Optional[t.Union[str, Path]] = None) -> 'GitignoreRules':
+        path = str(path)
+
+        with open(path) as fp:
+            lines = fp.readlines()
+
+        return GitignoreRules(lines, path, str(base_dir) if base_dir else os.path.dirname(path))
+
+    def __call__(self, path: t.Union[str, Path]) -> bool:
+        """
+        Returns True if the path is ignored by the rules.
+        """
+        if _is_windows:
+            if self._compiled.has_negation:
+                return handle_negation(path, self._rules)
+            else:
+                return any(r.match(path) for r in self._rules)
+
+        if not (any_rule := self._compiled.any_rule):
+            return False
+
+        abspath = os.path.abspath(path)
+
+        if abspath.startswith(self._prefix):
+            relpath = abspath[len(self._prefix):]
+        elif abspath == self.base_dir:
+            relpath = '.'
+        else:
+            raise ValueError(f'{path} is not in the subpath of {self.base_dir}')
+
+        if not any_rule.search(relpath):
+            return False
+
+        if not self._compiled.has_negation:
+            return True
+
+        # Negations of directories (e.g. '!build/') match directory paths given with a trailing slash only,
+        # which is stripped by abspath
+        negated_relpath = relpath + '/' if isinstance(path, str) and path.endswith('/') else relpath
+
+        for regex, negation in self._compiled.reversed_rules:
+            if regex.search(negated_relpath if negation else relpath):
+                return not negation
+
+        return False
+
+
+class IgnoreMatcher(object):
+    """
+    Ignore rules applicable to the entries of a single directory: hidden files, ignore patterns
+    and the stack of .gitignore files found on the way from the root. Matchers of subdirectories
+    share the rules of their parents and are only extended if a subdirectory has its own .gitignore.
+    """
+
+    def __init__(self,
+                 patterns: IgnorePatterns,
+                 ignore_hidden_files: bool = True,
+                 gitignores: t.Tuple[GitignoreRules, ...] = ()):
+
+        self.patterns = patterns
+        self.ignore_hidden_files = ignore_hidden_files
+        self.gitignores = gitignores
+
+    def extend(self, gitignore: GitignoreRules) -> 'IgnoreMatcher':
+        return IgnoreMatcher(self.patterns, self.ignore_hidden_files, self.gitignores + (gitignore,))
+
+    def ignored(self, name: str, path: str) -> bool:
+        """
+        Returns True if the directory entry has to be skipped. For directories, the whole subtree is pruned.
+        """
+        if self.ignore_hidden_files and name.startswith('.'):
+            return True
+
+        if self.patterns.match(name):
+            return True
+
+        return any(gitignore(path) for gitignore in self.gitignores)
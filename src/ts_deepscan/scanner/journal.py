@@ -0,0 +1,178 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import json
+import threading
+import typing as t
+
+from pathlib import Path
+
+from dataclasses import dataclass, field
+from dataclasses_json import dataclass_json, config
+
+import ts_deepscan.util as util
+
+from ..analyser import AnalysisResult
+
+
+# Max time in seconds completed files are buffered before they are written to the journal
+DEFAULT_JOURNAL_FLUSH_INTERVAL = float(os.environ.get('TS_DEEPSCAN_JOURNAL_FLUSH_INTERVAL', 1))
+
+# Max number of completed files buffered before they are written to the journal
+DEFAULT_JOURNAL_FLUSH_SIZE = int(os.environ.get('TS_DEEPSCAN_JOURNAL_FLUSH_SIZE', 1024))
+
+_version = 1
+
+
+def _omitted_if_empty():
+    return field(default=None, metadata=config(exclude=lambda v: not v))
+
+
+@dataclass_json
+@dataclass
+class _Record:
+    """
+    Line of the journal for a completed file, encoded like the results of the scan.
+    """
+    path: str
+    result: t.Optional[dict] = _omitted_if_empty()
+    errors: t.Optional[t.List[str]] = _omitted_if_empty()
+    timeout: t.Optional[t.List[str]] = _omitted_if_empty()
+
+
+class Journal(object):
+    """
+    Append-only record of the files completed by a scan, one JSON object per line, so that a scan which
+    does not finish (e.g. killed for running out of memory) can be resumed without analysing the recorded
+    files again (see Scanner.journal).
+
+    Records are buffered and written in batches, when the buffer is full and by a background thread every
+    flush interval. A killed scan loses the records of the last interval at most, a record cut off by the kill
+    is skipped when the journal is loaded. The journal is synced to the disk when it is closed only, so records
+    written to the OS survive the process but not a crash of the system.
+    """
+
+    def __init__(self,
+                 path: Path,
+                 resume: bool = False,
+                 flush_interval: float = DEFAULT_JOURNAL_FLUSH_INTERVAL,
+                 flush_size: int = DEFAULT_JOURNAL_FLUSH_SIZE):
+        self.path = path
+        self.resume = resume
+        self.flush_interval = flush_interval
+        self.flush_size = max(flush_size, 1)
+
+        # Files recorded by earlier runs: relpath -> ( results, errors ), they are not scanned again
+        self.completed: t.Dict[str, t.Tuple[t.List[AnalysisResult], t.List[str]]] = {}
+        self.options: t.Optional[dict] = None
+
+        if resume and path.exists():
+            self.options, self.completed = Journal.load(path)
+
+        self._fp: t.Optional[t.BinaryIO] = None
+        self._buffer: t.List[bytes] = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher: t.Optional[threading.Thread] = None
+
+    @staticmethod
+    def load(path: Path) -> t.Tuple[t.Optional[dict], t.Dict[str, t.Tuple[t.List[AnalysisResult], t.List[str]]]]:
+        """
+        Reads a journal. Returns the analyser options of the scan and the recorded files.
+        """
+        options = None
+        completed = {}
+
+        with path.open('rb') as fp:
+            for num, line in enumerate(fp, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    util.warning(f'Skipping the incomplete record at line {num} of the journal {path}')
+                    continue
+
+                if 'version' in record:
+                    options = record.get('options')
+                    continue
+
+                timeouts = record.get('timeout', ())
+                results = [AnalysisResult(category, data, category in timeouts)
+                           for category, data in record.get('result', {}).items()]
+
+                completed[record['path']] = (results, record.get('errors', []))
+
+        return options, completed
+
+    def open(self, options: dict):
+        """
+        Opens the journal for writing. A resumed journal is continued, otherwise it is started anew.
+        """
+        if self.resume and self.options is not None and self.options != options:
+            util.warning(f'The journal {self.path} has been recorded with different options')
+
+        self._fp = self.path.open('ab' if self.resume else 'wb')
+
+        if self._fp.tell() == 0:
+            self._write([json.dumps({'version': _version, 'options': options}).encode('utf-8')])
+        elif self._ends_incomplete():
+            # Terminates a record cut off by an earlier run, so that it does not swallow the next one
+            self._fp.write(b'\n')
+
+        # Further runs of the scanner continue the journal
+        self.resume = True
+
+        self._closed.clear()
+        self._flusher = threading.Thread(target=self._flush_periodically, name='journal-flusher', daemon=True)
+        self._flusher.start()
+
+    def _ends_incomplete(self) -> bool:
+        with self.path.open('rb') as fp:
+            fp.seek(-1, os.SEEK_END)
+            return fp.read(1) != b'\n'
+
+    def record(self, relpath: str, result: t.List[AnalysisResult], errors: t.List[str]):
+        record = _Record(relpath,
+                         result={r.category: r.data for r in result},
+                         errors=errors,
+                         timeout=[r.category for r in result if r.timeout])
+
+        line = record.to_json().encode('utf-8')  # type: ignore[attr-defined]
+
+        with self._lock:
+            self._buffer.append(line)
+
+            if len(self._buffer) >= self.flush_size:
+                self._flush()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            with self._lock:
+                self._flush()
+
+    def _flush(self):
+        if self._buffer and self._fp:
+            self._write(self._buffer)
+            self._buffer = []
+
+    def _write(self, lines: t.List[bytes]):
+        self._fp.write(b'\n'.join(lines) + b'\n')
+        self._fp.flush()
+
+    def close(self):
+        self._closed.set()
+
+        if self._flusher:
+            self._flusher.join()
+            self._flusher = None
+
+        with self._lock:
+            if not self._fp:
+                return
+
+            self._flush()
+
+            os.fsync(self._fp.fileno())
+            self._fp.close()
+            self._fp = None
@@ -1,3 +1,4 @@
+import os
 import sys
 import typing as t
 import multiprocessing as mp
@@ -7,14 +8,18 @@ import multiprocessing.queues
 import ts_deepscan.util as util
 
 
+# Start method of the worker processes. With 'forkserver' workers are forked from a fork server, which is
+# a single threaded process with the analysers warmed up (see preload), rather than from the scanning process
+# running the discovery, unpacking and watchdog threads. 'fork' is faster to start the first workers.
+DEFAULT_START_METHOD = os.environ.get('TS_DEEPSCAN_START_METHOD',
+                                      'spawn' if sys.platform == 'win32' else 'forkserver')
+
+
 def get_context() -> mp.context.DefaultContext:
     """
-    Return multiprocessing context based on the OS
+    Return multiprocessing context of the worker processes (see DEFAULT_START_METHOD)
     """
-    if sys.platform != "win32":
-        return mp.get_context('fork')
-    else:
-        return mp.get_context('spawn')
+    return mp.get_context(DEFAULT_START_METHOD)
 
 
 _ctx = get_context()
@@ -0,0 +1,175 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Warm template of the worker processes. With the 'forkserver' start method (see DEFAULT_START_METHOD) the fork
+server imports this module once on start (see multiprocessing.set_forkserver_preload) and warms up the analysers
+of the scan, i.e. it loads the scancode index, the spaCy pipeline, the dataset and the compiled YARA rules.
+Every worker, incl. the respawned ones, is forked from the fork server and inherits the loaded state instead
+of paying for it on its first file.
+"""
+
+import os
+import sys
+import atexit
+import pickle
+import hashlib
+import tempfile
+import threading
+import typing as t
+import multiprocessing as mp
+import multiprocessing.forkserver
+
+from contextlib import contextmanager
+
+import ts_deepscan.util as util
+
+from ...analyser import FileAnalyser
+
+
+# Variable of the fork server environment naming the file with the pickled analysers to warm up
+PRELOAD_ENV = 'TS_DEEPSCAN_PRELOAD'
+
+# Fork server started by template: the digest of its analysers and the file they are loaded from
+_server_lock = threading.Lock()
+_server_digest: t.Optional[str] = None
+_server_file: t.Optional[str] = None
+
+
+def warm_up(analysers: t.Iterable[FileAnalyser]):
+    """
+    Loads what the analysers need up front (see FileAnalyser.warm_up). Failures are not fatal,
+    the analysers load it on first use then.
+    """
+    for a in analysers:
+        try:
+            a.warm_up()
+        except Exception as err:
+            util.warning(f'Could not warm up the {a.category} analyser: {err}')
+
+
+@contextmanager
+def template(ctx: mp.context.BaseContext, analysers: t.List[FileAnalyser]) -> t.Iterator[None]:
+    """
+    Makes the fork server of the context a warm template of the workers started within the block. Other start
+    methods are not affected, the workers warm up on start (see scheduler._init_worker).
+
+    The fork server is started here rather than by the first worker, so that it loads the given analysers.
+    A fork server of other analysers (e.g. of an earlier scan) is restarted, unless workers forked from it
+    are still running or the server cannot be stopped. The workers are started cold then.
+    """
+    if ctx.get_start_method() == 'forkserver':
+        with _server_lock:
+            _ensure_server(ctx, analysers)
+
+    yield
+
+
+def _ensure_server(ctx: mp.context.BaseContext, analysers: t.List[FileAnalyser]):
+    global _server_digest, _server_file
+
+    from ...analyser.CachingAnalyser import CachingAnalyzer
+
+    # Results caches are left to the workers, the template only loads the data of the analysers
+    analysers = [a.analyser if isinstance(a, CachingAnalyzer) else a for a in analysers]
+
+    try:
+        # The module search path is needed to unpickle the analysers. It is passed to the fork server by
+        # multiprocessing, but applied to the forked workers only, not to the server importing this module.
+        data = pickle.dumps((list(sys.path), pickle.dumps(analysers)))
+    except Exception as err:
+        util.warning(f'Workers are not started from a warm template: {err}')
+        return
+
+    digest = hashlib.sha1(data).hexdigest()
+
+    if digest == _server_digest:
+        # Restarts the server with the same analysers, if it has exited
+        _start_server(ctx, _server_file)
+        return
+
+    if _server_digest is not None:
+        # Workers would be forked from the server of other analysers until it is replaced
+        if any(isinstance(p, mp.context.ForkServerProcess) for p in mp.active_children()):
+            util.info('Workers are not started from a warm template: workers of another template are running')
+            return
+
+        if not _stop_server():
+            util.info('Workers are not started from a warm template: the fork server cannot be restarted')
+            return
+
+    fd, path = tempfile.mkstemp(prefix='ts-deepscan-preload')
+    with os.fdopen(fd, 'wb') as fp:
+        fp.write(data)
+
+    # The server reads the file after it has been started, the file is kept until the server is replaced
+    _remove_file(_server_file)
+    _server_file = path
+
+    _start_server(ctx, path)
+    _server_digest = digest
+
+
+def _start_server(ctx: mp.context.BaseContext, path: str):
+    prev = os.environ.get(PRELOAD_ENV)
+    os.environ[PRELOAD_ENV] = path
+    ctx.set_forkserver_preload([__name__])
+
+    try:
+        mp.forkserver.ensure_running()
+    finally:
+        if prev is None:
+            os.environ.pop(PRELOAD_ENV, None)
+        else:
+            os.environ[PRELOAD_ENV] = prev
+
+
+def _stop_server() -> bool:
+    """
+    Stops the fork server, so that the next worker starts a new one. multiprocessing does not offer it publicly,
+    returns False if its internals are not available.
+    """
+    stop = getattr(getattr(mp.forkserver, '_forkserver', None), '_stop', None)
+
+    if not callable(stop):
+        return False
+
+    try:
+        stop()
+        return True
+    except Exception as err:
+        util.warning(f'Could not stop the fork server: {err}')
+        return False
+
+
+def _remove_file(path: t.Optional[str]):
+    if path:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+@atexit.register
+def _cleanup():
+    _remove_file(_server_file)
+
+
+def _preload(path: str):
+    try:
+        with open(path, 'rb') as fp:
+            sys_path, data = pickle.load(fp)
+
+        sys.path.extend(p for p in sys_path if p not in sys.path)
+        analysers = pickle.loads(data)
+
+    except Exception as err:
+        util.warning(f'Could not load the analysers of the worker template: {err}')
+        return
+
+    warm_up(analysers)
+
+
+if _path := os.environ.pop(PRELOAD_ENV, None):
+    _preload(_path)
@@ -0,0 +1,583 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import time
+import heapq
+import itertools
+import threading
+import typing as t
+import multiprocessing as mp
+import multiprocessing.connection
+
+import ts_deepscan.util as util
+
+from . import _ctx, preload
+from .. import FileScanInput, FileScanResult
+from ..Scanner import Scanner, NOT_SCANNED_BUDGET, NOT_SCANNED_CANCELLED
+from ..costs import CostModel
+from ...analyser import FileAnalyser
+
+
+# Max number of files dispatched to a worker at once
+DEFAULT_BATCH_SIZE = int(os.environ.get('TS_DEEPSCAN_BATCH_SIZE', 64))
+
+# Max number of bytes of the files dispatched to a worker at once (in KB)
+DEFAULT_BATCH_BYTES = 1024 * int(os.environ.get('TS_DEEPSCAN_BATCH_BYTES', 4096))
+
+# Multiple of the analysis timeout after which a worker is killed. Analysers stop at the timeout on their own,
+# the watchdog only catches the ones which do not.
+DEFAULT_WATCHDOG_GRACE = float(os.environ.get('TS_DEEPSCAN_WATCHDOG_GRACE', 2))
+
+
+def parse_jobs(jobs: t.Union[int, str]) -> t.Tuple[int, t.Dict[str, int]]:
+    """
+    Parses the jobs option, either a number of workers or a comma separated list of lanes,
+    e.g. 'license=12,crypto=2,scanoss=2'. A plain number in the list sets the number of workers
+    for the categories without a lane of their own.
+
+    Returns the number of workers and the lane sizes mapped to the categories.
+    """
+    if isinstance(jobs, int):
+        return jobs, {}
+
+    num_jobs = -1
+    lanes = {}
+
+    for item in (i.strip() for i in jobs.split(',')):
+        if not item:
+            continue
+
+        category, sep, value = item.rpartition('=')
+
+        try:
+            size = int(value)
+        except ValueError:
+            raise ValueError(f'Invalid number of jobs: {item}')
+
+        if sep:
+            if size < 1:
+                raise ValueError(f'Invalid number of jobs: {item}')
+            lanes[category.strip()] = size
+        else:
+            num_jobs = size
+
+    return num_jobs, lanes
+
+
+def _file_size(f: FileScanInput) -> int:
+    if f.content:
+        try:
+            return f.content.size
+        except OSError:
+            return 0
+
+    return f.stat.st_size if f.stat else 0
+
+
+# Analysers of a worker process mapped to their categories, set up once when the worker starts
+_registry: t.Dict[str, FileAnalyser] = {}
+
+
+def _init_worker(analysers: t.List[FileAnalyser]):
+    """
+    Worker initializer: registers the analysers, so that batches refer to them by category only,
+    and warms them up, unless the worker inherited it from its template (see preload).
+    """
+    preload.warm_up(analysers)
+
+    _registry.clear()
+    _registry.update((a.category, a) for a in analysers)
+
+
+def _worker_main(conn: mp.connection.Connection, analysers: t.List[FileAnalyser]):
+    """
+    Worker loop: receives batches of files, runs the analysers on each file and streams
+    the result of every file back as soon as it is available.
+    """
+    _init_worker(analysers)
+
+    parent = mp.parent_process()
+
+    while True:
+        # Stops once the parent is gone (e.g. a killed worker node, whose connection to the coordinator
+        # would be kept open otherwise), on fork the end of the connection is not reported as it is inherited
+        if parent and conn not in mp.connection.wait([conn, parent.sentinel]):
+            break
+
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+
+        if msg is None:
+            break
+
+        categories, batch = msg
+        selected = [_registry[c] for c in categories]
+
+        for f in batch:
+            durations = {}
+            res = Scanner._scan_file(f, selected, durations)
+            conn.send((res, durations))
+
+        conn.send(None)
+
+
+class _Lane(object):
+    """
+    Files waiting for the analysers of one or more categories and the number of workers dedicated to them.
+    The files are ordered by their predicted costs, the most expensive ones come first.
+    """
+
+    def __init__(self, name: str, categories: t.Tuple[str, ...], num_workers: int):
+        self.name = name
+        self.categories = categories
+        self.num_workers = num_workers
+
+        # ( -cost, sequence number, file )
+        self._heap: t.List[t.Tuple[float, int, FileScanInput]] = []
+        self._seq = itertools.count()
+
+        # Total predicted cost of the waiting files
+        self.cost = 0.0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, f: FileScanInput, cost: float):
+        heapq.heappush(self._heap, (-cost, next(self._seq), f))
+        self.cost += cost
+
+    def pop(self) -> t.Tuple[FileScanInput, float]:
+        cost, _, f = heapq.heappop(self._heap)
+        self.cost = max(self.cost + cost, 0.0) if self._heap else 0.0
+        return f, -cost
+
+    def clear(self):
+        self._heap.clear()
+        self.cost = 0.0
+
+
+class _Worker(object):
+    """
+    Parent side of a worker process incl. the batch it is working on.
+    Workers take batches from their own lane and help out other lanes while it is empty.
+    """
+
+    def __init__(self, analysers: t.List[FileAnalyser], lane: _Lane):
+        self.conn, child_conn = _ctx.Pipe()
+
+        # The analysers are passed once on start (inherited on fork, pickled once on spawn and forkserver)
+        self.process = _ctx.Process(target=_worker_main, args=(child_conn, analysers), daemon=True)
+        self.process.start()
+
+        child_conn.close()
+
+        self.lane = lane
+
+        self.batch: t.Optional[t.List[FileScanInput]] = None
+        # Lane of the batch, which is not the own lane if the worker is lent to another lane
+        self.batch_lane = lane
+        # Index of the file of the batch being analysed and the time its analysis has started
+        self.index = 0
+        self.started = 0.0
+
+    @property
+    def idle(self) -> bool:
+        return self.batch is None
+
+    @property
+    def current(self) -> t.Optional[FileScanInput]:
+        return self.batch[self.index] if self.batch and self.index < len(self.batch) else None
+
+    def dispatch(self, lane: _Lane, batch: t.List[FileScanInput]):
+        self.batch = batch
+        self.batch_lane = lane
+        self.index = 0
+        self.started = time.monotonic()
+
+        self.conn.send((lane.categories, batch))
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class BatchScheduler(object):
+    """
+    Runs the analysis in worker processes. Files are dispatched to idle workers in batches, the workers
+    stream the result of each file back. The batch size adapts to the number of files waiting and to their
+    sizes: while few files are waiting, they are spread across all workers, otherwise batches are filled
+    up to the batch size or the batch bytes limit.
+
+    Analyser categories may be given lanes with a number of workers of their own, so that cheap analysers
+    do not queue behind expensive ones. Every file is passed through each lane and its results are reported
+    once all lanes are done with it. Idle workers are lent to the lane with the most work waiting.
+
+    Waiting files are dispatched by their predicted costs (see CostModel), most expensive first, so that
+    long running files start early and short ones fill the gaps. The durations of the analysers are recorded
+    while scanning to improve the predictions.
+
+    Analysers stop at their deadlines and return partial results, so workers survive slow files. A worker
+    exceeding the timeout on a file by far (see DEFAULT_WATCHDOG_GRACE) or exiting unexpectedly is replaced,
+    the file is reported as failed and the rest of its batch is dispatched again.
+    """
+
+    # Max time in seconds waiting for worker messages before checking the deadlines
+    poll_interval = 0.5
+
+    watchdog_grace = DEFAULT_WATCHDOG_GRACE
+
+    def __init__(self,
+                 analysers: t.List[FileAnalyser],
+                 num_workers: int,
+                 timeout: int,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 batch_bytes: int = DEFAULT_BATCH_BYTES,
+                 lanes: t.Optional[t.Dict[str, int]] = None,
+                 costs: t.Optional[CostModel] = None):
+
+        self.analysers = analysers
+        self.timeout = timeout
+        self.batch_size = max(batch_size, 1)
+        self.batch_bytes = max(batch_bytes, 1)
+
+        self.lanes = self._create_lanes([a.category for a in analysers], num_workers, lanes or {})
+        self.num_workers = sum(lane.num_workers for lane in self.lanes)
+
+        self.costs = costs or CostModel()
+
+        self._workers: t.List[_Worker] = []
+
+        # Number of workers replaced due to timeouts or failures during the last run
+        self.restarts = 0
+
+        # Results of files which are not done in all lanes yet: relpath -> (lanes left, results, errors)
+        self._partial: t.Dict[str, t.Tuple[int, list, list]] = {}
+        self._order = {a.category: i for i, a in enumerate(analysers)}
+
+        self._deadline: t.Optional[float] = None
+
+        self._cond = threading.Condition()
+        self._closed = False
+        self._cancelled = False
+
+        self._wakeup_reader, self._wakeup_writer = _ctx.Pipe(duplex=False)
+        self._wakeup_lock = threading.Lock()
+        self._sleeping = False
+
+    @staticmethod
+    def _create_lanes(categories: t.List[str], num_workers: int, lanes: t.Dict[str, int]) -> t.List[_Lane]:
+        for category in lanes:
+            if category not in categories:
+                util.warning(f'No analyser for the jobs of \'{category}\' category, ignoring them')
+
+        result = [_Lane(c, (c,), lanes[c]) for c in categories if c in lanes]
+
+        # Categories without a lane of their own share the default one
+        if rest := tuple(c for c in categories if c not in lanes):
+            if num_workers <= 0:
+                num_workers = 1 if result else mp.cpu_count()
+
+            result.append(_Lane('*', rest, num_workers))
+
+        return result
+
+    def run(self,
+            files: t.Iterable[FileScanInput],
+            on_completed: t.Callable[[FileScanResult], None],
+            max_pending: int,
+            deadline: t.Optional[float] = None):
+        """
+        Analyses the files and reports the results by calling on_completed in the scheduling thread.
+        At most max_pending files are taken from the iterable ahead of the analysis.
+
+        If a deadline (see time.monotonic) is given, files predicted to take longer than the time left
+        are not dispatched anymore, they are reported as not scanned instead.
+        """
+        self._deadline = deadline
+        self._closed = False
+        self._cancelled = False
+        self._partial.clear()
+        self.restarts = 0
+
+        for lane in self.lanes:
+            lane.clear()
+
+        if missing := [lane for lane in self.lanes
+                       for _ in range(lane.num_workers - sum(1 for w in self._workers if w.lane is lane))]:
+            # Replacements of failed workers are forked from the same template later on
+            with preload.template(_ctx, self.analysers):
+                self._workers.extend(_Worker(self.analysers, lane) for lane in missing)
+
+        failure: t.List[BaseException] = []
+
+        def schedule():
+            try:
+                self._schedule(on_completed)
+            except BaseException as err:
+                failure.append(err)
+                self.cancel()
+
+        scheduler = threading.Thread(target=schedule, name='ts-deepscan-scheduler', daemon=True)
+        scheduler.start()
+
+        try:
+            for f in files:
+                size = _file_size(f)
+                costs = [self.costs.predict(f.path, size, lane.categories) for lane in self.lanes]
+
+                with self._cond:
+                    while self._max_pending() >= max_pending and not self._cancelled:
+                        self._cond.wait()
+
+                    if self._cancelled:
+                        break
+
+                    for lane, cost in zip(self.lanes, costs):
+                        lane.push(f, cost)
+
+                self._wakeup()
+
+        finally:
+            with self._cond:
+                self._closed = True
+
+            self._wakeup()
+            scheduler.join()
+
+            self.costs.save()
+
+        if failure:
+            raise failure[0]
+
+    def cancel(self):
+        # The waiting files are reported as cancelled by the scheduling thread
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
+
+        self._wakeup()
+
+    def close(self):
+        for w in self._workers:
+            w.stop()
+
+        for w in self._workers:
+            w.process.join(timeout=1)
+            if w.process.is_alive():
+                w.kill()
+
+        self._workers = []
+
+    def _max_pending(self) -> int:
+        return max(len(lane) for lane in self.lanes)
+
+    def _wakeup(self):
+        if self._sleeping:
+            with self._wakeup_lock:
+                self._wakeup_writer.send_bytes(b'')
+
+    def _schedule(self, on_completed: t.Callable[[FileScanResult], None]):
+        def collect(res: FileScanResult):
+            self._collect(res, on_completed)
+
+        while True:
+            for f in self._dispatch():
+                collect((f.relpath, [], [NOT_SCANNED_BUDGET]))
+
+            busy = [w for w in self._workers if not w.idle]
+
+            with self._cond:
+                cancelled = self._cancelled
+
+            # Abort the analysis of the files in progress, the workers are replaced for the next run.
+            # The files left of their batches and the waiting files are reported as cancelled.
+            if cancelled:
+                unfinished = [f for w in busy for f in w.batch[w.index:]]
+
+                for w in busy:
+                    self._replace(w, restart=False)
+                busy = []
+
+                with self._cond:
+                    for lane in self.lanes:
+                        while len(lane):
+                            unfinished.append(lane.pop()[0])
+
+                for f in unfinished:
+                    collect((f.relpath, [], [NOT_SCANNED_CANCELLED]))
+
+                self._partial.clear()
+
+            with self._cond:
+                pending = self._max_pending() > 0
+
+                if (self._closed or self._cancelled) and not pending and not busy:
+                    break
+
+                # Files submitted since the dispatch
+                if pending and len(busy) < len(self._workers):
+                    continue
+
+                self._sleeping = True
+
+            ready = mp.connection.wait([w.conn for w in busy] +
+                                       [w.process.sentinel for w in self._workers] +
+                                       [self._wakeup_reader], timeout=self.poll_interval)
+            self._sleeping = False
+
+            while self._wakeup_reader.poll():
+                self._wakeup_reader.recv_bytes()
+
+            for w in busy:
+                if w.conn in ready:
+                    self._receive(w, collect)
+
+            for w in list(self._workers):
+                if w.process.sentinel in ready and not w.process.is_alive():
+                    self._fail(w, f'worker exited with code {w.process.exitcode}', collect)
+
+            self._check_deadlines(collect)
+
+    def _collect(self, res: FileScanResult, on_completed: t.Callable[[FileScanResult], None]):
+        """
+        Merges the results of a file from all lanes and reports them once the last lane is done with the file.
+        """
+        if len(self.lanes) == 1:
+            on_completed(res)
+            return
+
+        relpath, results, errors = res
+
+        left, merged_results, merged_errors = self._partial.pop(relpath, (len(self.lanes), [], []))
+        merged_results.extend(results)
+        merged_errors.extend(errors)
+
+        if left > 1:
+            self._partial[relpath] = (left - 1, merged_results, merged_errors)
+        else:
+            merged_results.sort(key=lambda r: self._order.get(r.category, len(self._order)))
+            on_completed((relpath, merged_results, merged_errors))
+
+    def _dispatch(self) -> t.List[FileScanInput]:
+        """
+        Dispatches batches to the idle workers. Returns the files skipped, because they do not fit into the time left.
+        """
+        skipped = []
+
+        with self._cond:
+            if self._cancelled:
+                return skipped
+
+            left = self._deadline - time.monotonic() if self._deadline is not None else float('inf')
+
+            for w in self._workers:
+                if not w.idle:
+                    continue
+
+                # Lend the worker to the lane with the most work waiting while its own lane is empty
+                lane = w.lane if len(w.lane) else max(self.lanes, key=lambda other: (other.cost, len(other)))
+
+                if not len(lane):
+                    break
+
+                # Spread the waiting files across the workers of the lane, but do not exceed the batch limits.
+                # The most expensive files are taken first, a batch gets at most its share of the predicted costs.
+                size = -(-len(lane) // lane.num_workers)
+                size = min(size, self.batch_size)
+                share = lane.cost / lane.num_workers
+
+                batch = []
+                batch_bytes = 0
+                batch_cost = 0.0
+
+                while len(lane) and len(batch) < size and batch_bytes < self.batch_bytes and \
+                        (not batch or batch_cost < share):
+                    f, cost = lane.pop()
+
+                    # The most expensive files are the first ones to be skipped when the time runs short
+                    if cost > left:
+                        skipped.append(f)
+                        continue
+
+                    batch.append(f)
+                    batch_bytes += _file_size(f)
+                    batch_cost += cost
+
+                if batch:
+                    w.dispatch(lane, batch)
+
+            self._cond.notify_all()
+
+        return skipped
+
+    def _receive(self, w: _Worker, on_completed: t.Callable[[FileScanResult], None]):
+        while not w.idle and w.conn.poll():
+            try:
+                msg = w.conn.recv()
+            except (EOFError, OSError):
+                return
+
+            if msg is None:
+                w.batch = None
+            else:
+                res, durations = msg
+                f = w.current
+
+                w.index += 1
+                w.started = time.monotonic()
+
+                if f:
+                    self.costs.record(f.path, _file_size(f), durations)
+
+                on_completed(res)
+
+    def _check_deadlines(self, on_completed: t.Callable[[FileScanResult], None]):
+        if self.timeout <= 0:
+            return
+
+        now = time.monotonic()
+
+        for w in self._workers:
+            # The timeout is the time budget of a file shared by its analysers
+            limit = self.timeout * self.watchdog_grace
+
+            if not w.idle and now - w.started > limit:
+                self._fail(w, 'timeout exceeded, the worker has been killed', on_completed)
+
+    def _fail(self, w: _Worker, reason: str, on_completed: t.Callable[[FileScanResult], None]):
+        """
+        Reports the file being analysed as failed, requeues the rest of the batch and replaces the worker.
+        """
+        if f := w.current:
+            util.error(f'Scan of {f.relpath} failed: {reason}')
+            on_completed((f.relpath, [], [f'Scan of {f.relpath} failed: {reason}']))
+            w.index += 1
+
+        self._replace(w)
+
+    def _replace(self, w: _Worker, restart: bool = True):
+        rest = w.batch[w.index:] if w.batch else []
+
+        with self._cond:
+            if not self._cancelled:
+                for f in rest:
+                    w.batch_lane.push(f, self.costs.predict(f.path, _file_size(f), w.batch_lane.categories))
+
+        w.kill()
+
+        with preload.template(_ctx, self.analysers):
+            self._workers[self._workers.index(w)] = _Worker(self.analysers, w.lane)
+
+        if restart:
+            self.restarts += 1
@@ -0,0 +1,262 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import re
+import json
+import hashlib
+import typing as t
+
+from pathlib import Path
+from datetime import datetime
+
+import ts_deepscan.util as util
+
+from . import Scan, SummaryTree
+
+
+# Number of characters read from a scan at once while merging
+_chunk_size = 1 << 20
+
+# Statistics recomputed from the merged ones rather than summed up
+_derived_stats = ('dedup_ratio', 'shard')
+
+
+class Shard(t.NamedTuple):
+    """
+    Part i of N of a scan, i counts from 1. Files are assigned to the shards by a stable hash of their relative
+    paths, members of archives go with the archive, so that shards of the same paths do not need to coordinate.
+    """
+    index: int
+    count: int
+
+    @staticmethod
+    def parse(value: str) -> 'Shard':
+        index, sep, count = value.partition('/')
+
+        try:
+            shard = Shard(int(index), int(count))
+        except ValueError:
+            shard = None
+
+        if not sep or not shard or not 1 <= shard.index <= shard.count:
+            raise ValueError(f'Invalid shard: {value}, expected i/N with 1 <= i <= N')
+
+        return shard
+
+    def contains(self, relpath: str) -> bool:
+        return shard_of(relpath, self.count) == self.index - 1
+
+    def __str__(self) -> str:
+        return f'{self.index}/{self.count}'
+
+
+def shard_of(relpath: str, count: int) -> int:
+    """
+    Returns the index (counting from 0) of the shard of a file. The hash does not depend on the platform
+    nor on the Python process (unlike hash()).
+    """
+    key = relpath.replace(os.sep, '/').encode('utf-8', errors='surrogateescape')
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') % count
+
+
+class _JsonReader(object):
+    """
+    Reads a JSON document from a text stream value by value, so that the members of large objects can be
+    processed one at a time instead of loading the whole document.
+    """
+
+    _decoder = json.JSONDecoder()
+    _whitespace = re.compile(r'\s*')
+
+    def __init__(self, fp: t.TextIO):
+        self._fp = fp
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+
+        # Values spanning several chunks are read in growing chunks, so that they are not decoded too often
+        chunk = self._fp.read(max(_chunk_size, len(self._buf) - self._pos))
+
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        self._eof = not chunk
+
+        return bool(chunk)
+
+    def _peek(self) -> str:
+        while True:
+            self._pos = _JsonReader._whitespace.match(self._buf, self._pos).end()
+
+            if self._pos < len(self._buf) or not self._fill():
+                return self._buf[self._pos:self._pos + 1]
+
+    def _expect(self, chars: str) -> str:
+        c = self._peek()
+        if not c or c not in chars:
+            raise ValueError(f'Invalid scan: expected {" or ".join(map(repr, chars))} in {self._fp.name}')
+
+        self._pos += 1
+        return c
+
+    def value(self) -> t.Any:
+        return self.raw_value()[0]
+
+    def raw_value(self) -> t.Tuple[t.Any, str]:
+        """
+        Returns the next value along with its JSON text.
+        """
+        self._peek()
+
+        while True:
+            try:
+                start = self._pos
+                value, end = _JsonReader._decoder.raw_decode(self._buf, start)
+
+                # Numbers at the end of the buffer may continue in the next chunk
+                if end < len(self._buf) or not self._fill():
+                    self._pos = end
+                    return value, self._buf[start:end]
+
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+
+    def members(self) -> t.Iterator[str]:
+        """
+        Iterates over the keys of an object. The value of each key is read by the caller
+        before the next key, either as a whole (value) or member by member.
+        """
+        self._expect('{')
+
+        if self._peek() == '}':
+            self._pos += 1
+            return
+
+        while True:
+            key = self.value()
+            self._expect(':')
+
+            yield key
+
+            if self._expect(',}') == '}':
+                return
+
+
+def merge_scans(paths: t.List[Path], out: t.TextIO) -> Scan:
+    """
+    Merges the scans of the shards of the same paths (see Shard) into one scan written to out. The results
+    are streamed file by file from the shards into the output, while the summary is rebuilt along the way
+    (see compute_summary), the results are not kept in memory. Returns the merged scan without its results.
+    """
+    merged = Scan()
+    summary = SummaryTree()
+
+    seen: t.Set[str] = set()
+    no_result: t.Dict[str, None] = {}
+    shards: t.Set[str] = set()
+    options = None
+    time = None
+
+    # The results come after the uid and the url of the scan, the other fields are written once known
+    out.write('{')
+    _write_fields(merged, out, head=True)
+    out.write('"result": {')
+
+    for path in paths:
+        with path.open('r', encoding='utf-8') as fp:
+            reader = _JsonReader(fp)
+
+            for key in reader.members():
+                if key == 'result':
+                    for relpath in reader.members():
+                        res, text = reader.raw_value()
+
+                        if not isinstance(res, dict):
+                            raise ValueError(f'Invalid scan: unexpected results of {relpath} in {path}')
+
+                        if relpath in seen:
+                            util.warning(f'Duplicate results of {relpath} in {path} are skipped')
+                            continue
+
+                        summary.add_result(relpath, res)
+
+                        # The results are passed through as they are, rather than encoded again
+                        out.write((', ' if seen else '') + json.dumps(relpath) + ': ' + text)
+                        seen.add(relpath)
+
+                elif key == 'no_result':
+                    no_result.update(dict.fromkeys(reader.value()))
+
+                elif key == 'options':
+                    if options is None:
+                        options = reader.value()
+                    elif reader.value() != options:
+                        util.warning(f'The scan {path} has been made with different options')
+
+                elif key == 'time':
+                    if (value := reader.value()) is not None:
+                        time = max(time, value) if time is not None else value
+
+                elif key == 'stats':
+                    stats = reader.value()
+
+                    if shard := stats.get('shard'):
+                        shards.add(shard)
+
+                    _merge_stats(merged.stats, stats)
+
+                else:
+                    # The summaries of the shards are rebuilt from the results
+                    reader.value()
+
+    if shards and (counts := {Shard.parse(s).count for s in shards}) and \
+            (len(counts) > 1 or len(shards) != next(iter(counts))):
+        util.warning(f'The merged shards are incomplete: {", ".join(sorted(shards))}')
+
+    if total := merged.stats.get('total'):
+        merged.stats['dedup_ratio'] = round(merged.stats.get('duplicates', 0) / total, 4)
+    if shards:
+        merged.stats['shards'] = len(shards)
+
+    merged.no_result = list(no_result)
+    merged.options = options or {}
+    merged.time = datetime.fromtimestamp(time) if time is not None else datetime.now()
+    merged.summary = summary.flatten()
+
+    out.write('}')
+    _write_fields(merged, out, head=False)
+    out.write('}')
+
+    return merged
+
+
+def _write_fields(scan: Scan, out: t.TextIO, head: bool):
+    """
+    Writes the fields of a scan coming before (head) or after its results, separated from them by commas.
+    """
+    # noinspection PyUnresolvedReferences
+    fields = list(json.loads(scan.to_json()).items())  # type: ignore[attr-defined]
+    index = next(i for i, (key, _) in enumerate(fields) if key == 'result')
+
+    for key, value in (fields[:index] if head else fields[index + 1:]):
+        text = json.dumps(key) + ': ' + json.dumps(value)
+        out.write(text + ', ' if head else ', ' + text)
+
+
+def _merge_stats(stats: t.Dict[str, t.Any], other: t.Dict[str, t.Any]):
+    for key, value in other.items():
+        if key in _derived_stats:
+            continue
+
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            stats[key] = stats.get(key, 0) + value
+        elif isinstance(value, list):
+            stats[key] = sorted(stats.get(key, []) + value)
+        else:
+            stats.setdefault(key, value)
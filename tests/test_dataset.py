@@ -0,0 +1,170 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import copy
+import pickle
+import string
+import hashlib
+import typing as t
+
+import pytest
+
+from pathlib import Path
+
+from ts_deepscan.analyser import textutils
+from ts_deepscan.analyser.Dataset import Dataset, CompactDataset, _ignored_aliases
+
+
+_licenses = {
+    'A-1.0': {'name': 'Alpha License', 'aliases': ['Alpha'],
+              'text': 'alpha beta gamma delta epsilon zeta eta theta iota kappa'},
+    # Same words as A-1.0 in another order, it is as similar to any text as A-1.0
+    'B-1.0': {'name': 'Beta License', 'aliases': [],
+              'text': 'kappa iota theta eta zeta epsilon delta gamma beta alpha'},
+    'C-2.0': {'name': 'Gamma License', 'aliases': ['Gamma 2'],
+              'text': 'alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi omicron'},
+    'MIT': {'name': 'MIT License', 'aliases': [],
+            'text': 'permission is hereby granted free of charge to any person obtaining a copy'},
+    'Unnamed': {'name': '', 'aliases': ['Unnamed'],
+                'text': 'redistribution and use in source and binary forms with or without modification'},
+    'Empty': {'name': 'Empty License'},
+}
+
+_texts = [
+    _licenses['A-1.0']['text'],
+    _licenses['B-1.0']['text'],
+    _licenses['MIT']['text'],
+    'alpha beta gamma delta epsilon zeta eta theta iota kappa lambda',
+    'alpha beta gamma delta epsilon zeta eta theta iota',
+    'alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi',
+    'permission is hereby granted free of charge to any person obtaining a copy of this software',
+    'redistribution and use in source and binary forms',
+    'something else entirely',
+    '',
+    'Licensed under the Alpha License, see MIT License and (Gamma 2).',
+    'AlphaBeta, xMIT License, C-2.0 and B-1.0:',
+    'Unnamed MIT Alpha',
+]
+
+
+class _Token(t.NamedTuple):
+    orth: int
+    is_space: bool = False
+    is_punct: bool = False
+
+
+def _create_doc(text: str = '') -> t.List[_Token]:
+    """
+    Splits texts at whitespace instead of using spaCy, the orths are 64-bit hashes of the words like in spaCy.
+    """
+    return [_Token(int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), 'little'))
+            for word in text.split()]
+
+
+class _Dataset(Dataset):
+    @property
+    def _licenses(self) -> t.Iterable[t.Tuple[str, dict]]:
+        return _licenses.items()
+
+
+@pytest.fixture
+def dataset(tmp_path: Path, monkeypatch) -> Dataset:
+    monkeypatch.setattr(textutils, 'create_doc', _create_doc)
+
+    dataset = _Dataset(tmp_path / 'dataset')
+    dataset.load()
+
+    return dataset
+
+
+def _find_match(text: str, data: t.Dict[str, t.Any]):
+    """
+    Matching against the JSON data of the dataset as done before the compact dataset.
+    """
+    doc = textutils.create_doc(text)
+    hsh = textutils.compute_hash(doc)
+
+    for key, val in data.items():
+        if hsh == val['hash']:
+            return key, 1.0
+
+    lic = None
+    score = 0.0
+
+    w1 = {tok.orth for tok in textutils.similarity_tokens_from_doc(doc)}
+
+    for key, val in data.items():
+        w2 = set(val['orths'])
+
+        similarity = float(2 * len(w1.intersection(w2))) / (len(w1) + len(w2))
+
+        if similarity > score:
+            score = similarity
+            lic = key
+
+    return (lic, score) if score >= 0.8 else (None, None)
+
+
+def _find_aliases(text: str, data: t.Dict[str, t.Any]) -> t.Iterable[str]:
+    """
+    Search for aliases in the JSON data of the dataset as done before the compact dataset.
+    """
+    for k, v in data.items():
+        name = v['name']
+        aliases = v['aliases']
+
+        if k not in aliases and k not in _ignored_aliases:
+            aliases.append(k)
+
+        if name not in aliases:
+            aliases.append(name)
+
+        for alias in aliases:
+            if not alias:
+                continue
+
+            index = text.find(alias)
+            if index == -1:
+                continue
+
+            boundaries = string.whitespace + string.punctuation
+            if index > 0 and text[index - 1] not in boundaries:
+                continue
+
+            index = index + len(alias)
+            if index < len(text) and text[index] not in boundaries:
+                continue
+
+            yield k
+
+
+@pytest.mark.parametrize('text', _texts)
+def test_find_match_equals_original(dataset: Dataset, text: str):
+    assert textutils.find_match(text, dataset) == _find_match(text, dataset.data)
+
+
+def test_ties_are_resolved_in_dataset_order(dataset: Dataset):
+    text = 'alpha beta gamma delta epsilon zeta eta theta iota kappa lambda'
+    orths = {tok.orth for tok in _create_doc(text)}
+
+    assert textutils.find_match(text, dataset)[0] == 'A-1.0'
+    assert dataset.compact.best_match(orths) == ('A-1.0', 20 / 21)
+
+
+@pytest.mark.parametrize('text', _texts)
+def test_find_aliases_equals_original(dataset: Dataset, text: str):
+    # The original search extends the aliases of the data on every call
+    data = copy.deepcopy(dataset.data)
+
+    for _ in range(2):
+        assert list(textutils.find_aliases(text, dataset)) == list(_find_aliases(text, data))
+
+
+def test_compact_dataset_is_pickled_by_path(dataset: Dataset):
+    compact = pickle.loads(pickle.dumps(dataset.compact))
+
+    assert isinstance(compact, CompactDataset)
+    assert compact.keys == list(_licenses)[:-1]
+    assert [list(compact.orths(i)) for i in range(len(compact))] == \
+           [sorted(set(entry['orths'])) for entry in dataset.data.values()]
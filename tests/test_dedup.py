@@ -0,0 +1,141 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import typing as t
+
+import pytest
+
+from pathlib import Path
+
+from ts_deepscan.analyser import FileAnalyser, AnalysisResult
+from ts_deepscan.scanner import FileScanInput
+from ts_deepscan.scanner.Scanner import Scanner, _provisional_key
+
+
+class _TextAnalyser(FileAnalyser):
+    """
+    Reports the text of the files it analyses, it does not accept files larger than 100 bytes.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        # Relative paths of the analysed files
+        self.analysed: t.List[str] = []
+
+    @property
+    def category(self) -> str:
+        return 'text'
+
+    def may_accept(self, name: str, size: int) -> bool:
+        return size <= 100
+
+    def _match(self, path: Path) -> bool:
+        return path.stat().st_size <= 100
+
+    def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
+        self.analysed.append(str(path.relative_to(root)).replace('\\', '/'))
+        return AnalysisResult(self.category, path.read_text())
+
+
+@pytest.fixture
+def hashed(monkeypatch) -> t.List[Path]:
+    """
+    Paths of the files hashed by the deduplication.
+    """
+    paths = []
+    scanning = sys.modules[Scanner.__module__]
+    fast_file_hash = scanning._fast_file_hash
+
+    def hash_file(path: Path) -> str:
+        paths.append(path)
+        return fast_file_hash(path)
+
+    monkeypatch.setattr(scanning, '_fast_file_hash', hash_file)
+
+    return paths
+
+
+def _tree(root: Path, files: t.Dict[str, str]) -> Path:
+    for name, text in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+    return root
+
+
+def _scan(root: Path) -> t.Tuple[_TextAnalyser, Scanner, dict, dict]:
+    analyser = _TextAnalyser()
+    scanner = Scanner([analyser], ignore_hidden_files=False)
+
+    completed = {}
+    scanner.onFileScanCompleted = lambda relpath, result, errors: completed.setdefault(relpath, (result, errors))
+
+    results = scanner.run([root])
+
+    return analyser, scanner, {k.replace('\\', '/'): v for k, v in results.items()}, \
+        {k.replace('\\', '/'): v for k, v in completed.items()}
+
+
+def test_files_of_unique_name_and_size_are_not_hashed(tmp_path: Path, hashed: t.List[Path]):
+    _tree(tmp_path, {'a/x.txt': 'abc', 'a/y.txt': 'abc', 'b/x.txt': 'abcd',
+                     'c/x.bin': 'a' * 101, 'd/x.bin': 'a' * 101})
+
+    analyser, scanner, results, _ = _scan(tmp_path)
+
+    # The large files are passed through without a key, since the analyser does not accept them
+    assert hashed == []
+    assert sorted(analyser.analysed) == ['a/x.txt', 'a/y.txt', 'b/x.txt']
+    assert set(results) == {'a/x.txt', 'a/y.txt', 'b/x.txt'}
+    assert scanner.duplicateTasks == 0
+
+
+def test_files_of_same_name_and_size_are_confirmed_by_hash(tmp_path: Path, hashed: t.List[Path]):
+    _tree(tmp_path, {'a/x.txt': 'same', 'b/x.txt': 'same', 'c/x.txt': 'diff', 'd/y.txt': 'same'})
+
+    analyser, scanner, results, completed = _scan(tmp_path)
+
+    # The identical files are analysed once, the file of the same size but a different content is analysed too
+    assert sorted(hashed) == sorted(tmp_path / p for p in ('a/x.txt', 'b/x.txt', 'c/x.txt'))
+    assert len(analyser.analysed) == 3
+    assert {'c/x.txt', 'd/y.txt'} <= set(analyser.analysed)
+    assert scanner.duplicateTasks == 1
+
+    # The duplicate discovered after the analysed file was completed takes over its results
+    assert {relpath: [r.data for r in result] for relpath, result in results.items()} == \
+           {'a/x.txt': ['same'], 'b/x.txt': ['same'], 'c/x.txt': ['diff'], 'd/y.txt': ['same']}
+    assert set(completed) == set(results)
+
+
+def test_duplicates_discovered_while_analysing_get_the_results(tmp_path: Path, hashed: t.List[Path]):
+    _tree(tmp_path, {'a/x.txt': 'same', 'b/x.txt': 'same', 'c/x.txt': 'same'})
+
+    scanner = Scanner([_TextAnalyser()])
+    completed = {}
+    scanner.onFileScanCompleted = lambda relpath, result, errors: completed.setdefault(relpath, (result, errors))
+
+    files = [FileScanInput(tmp_path / 'a' / 'x.txt', tmp_path),
+             FileScanInput(tmp_path / 'b' / 'x.txt', tmp_path),
+             FileScanInput(tmp_path / 'c' / 'x.txt', tmp_path)]
+
+    unique_files = scanner._deduplicate(files)
+    first = next(unique_files)
+
+    # The first file of its name and size is passed through without being hashed
+    assert first.path == files[0].path
+    assert scanner._dedup_keys[first.relpath] == _provisional_key(first.relpath)
+    assert hashed == []
+
+    # The duplicates are held back until the first file is completed
+    assert list(unique_files) == []
+    assert scanner.duplicateTasks == 2
+    assert not completed
+
+    results = {}
+    scanner._complete(results, first.relpath, [AnalysisResult('text', 'same')], [])
+
+    assert set(results) == set(completed) == {f.relpath for f in files}
+    assert all([r.data for r in result] == ['same'] for result in results.values())
@@ -0,0 +1,233 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import sys
+import time
+import signal
+import threading
+import typing as t
+import multiprocessing as mp
+import multiprocessing.connection as connection
+
+import pytest
+
+from pathlib import Path
+
+from ts_deepscan.analyser import FileAnalyser, AnalysisResult
+from ts_deepscan.scanner.DistributedScanner import DistributedScanner
+from ts_deepscan.scanner.pool import scheduler
+
+
+class _SizeAnalyser(FileAnalyser):
+    """
+    Accepts files up to 100 bytes, it is not run by the nodes of the tests.
+    """
+
+    @property
+    def category(self) -> str:
+        return 'size'
+
+    def may_accept(self, name: str, size: int) -> bool:
+        return size <= 100
+
+    def _match(self, path: Path) -> bool:
+        return path.stat().st_size <= 100
+
+    def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
+        return AnalysisResult(self.category, {'size': path.stat().st_size})
+
+
+class _Node(object):
+    """
+    Worker node driven by the tests, it reports the size of the files shipped to it.
+    """
+
+    def __init__(self, scanner: DistributedScanner, name: str, jobs: int = 1):
+        while scanner.listening is None:
+            time.sleep(0.01)
+
+        self.conn = connection.Client(scanner.listening, authkey=scanner.secret)
+        self.conn.send(('hello', name, jobs))
+        self.conn.recv()
+
+        # Relative paths of the files received and completed by the node
+        self.received: t.List[str] = []
+        self.completed: t.List[str] = []
+
+        self._held = {}
+
+    def take(self) -> t.List[str]:
+        self.conn.send(('more',))
+        msg = self.conn.recv()
+        assert msg[0] == 'files'
+
+        for f in msg[1]:
+            self._held[f.relpath] = f
+            self.received.append(f.relpath)
+
+        return [f.relpath for f in msg[1]]
+
+    def complete(self, relpath: str):
+        f = self._held.pop(relpath)
+        self.conn.send(('result', relpath, [AnalysisResult('size', {'size': len(f.content.data)})], []))
+        self.completed.append(relpath)
+
+    def release(self, relpaths: t.List[str]):
+        for relpath in relpaths:
+            self._held.pop(relpath)
+
+        self.conn.send(('released', relpaths))
+
+    def serve(self):
+        """
+        Completes the files handed out until the node is stopped.
+        """
+        self.conn.send(('more',))
+
+        while (msg := self.conn.recv())[0] != 'stop':
+            if msg[0] == 'files':
+                for f in msg[1]:
+                    self._held[f.relpath] = f
+                    self.received.append(f.relpath)
+                    self.complete(f.relpath)
+
+                self.conn.send(('more',))
+
+            elif msg[0] == 'steal':
+                self.release([])
+
+    def close(self):
+        self.conn.close()
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    for i in range(40):
+        (tmp_path / f'f{i:02}.txt').write_text('x' * (i + 1))
+
+    (tmp_path / 'large.bin').write_bytes(b'x' * 1000)
+
+    return tmp_path
+
+
+def _scan(scanner: DistributedScanner, tree: Path) -> t.Tuple[threading.Thread, dict]:
+    results = {}
+    scanner.onFileScanCompleted = lambda relpath, result, errors: results.setdefault(relpath, (result, errors))
+
+    def run():
+        scanner.run([tree])
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    return thread, results
+
+
+def _check(results: dict):
+    assert set(results) == {f'f{i:02}.txt' for i in range(40)} | {'large.bin'}
+    assert results['large.bin'] == ([], [])
+
+    for i in range(40):
+        result, errors = results[f'f{i:02}.txt']
+        assert [r.data for r in result] == [{'size': i + 1}] and not errors
+
+
+def test_idle_node_steals_files(tree: Path):
+    scanner = DistributedScanner(analysers=[_SizeAnalyser()], deduplicate=False, batch_size=8, queue_bytes=1)
+    thread, results = _scan(scanner, tree)
+
+    a = _Node(scanner, 'a')
+    while len(a.received) < 40:
+        a.take()
+
+    b = _Node(scanner, 'b')
+    served = threading.Thread(target=b.serve, daemon=True)
+    served.start()
+
+    # The idle node b makes the coordinator ask a to give back files
+    assert a.conn.recv() == ('steal',)
+    kept, *released = a.received
+    a.release(released)
+    a.complete(kept)
+
+    while a.conn.recv()[0] != 'stop':
+        a.release([])
+
+    served.join(10)
+    thread.join(10)
+    a.close()
+    b.close()
+
+    _check(results)
+    # Files larger than accepted by the analysers are not shipped
+    assert 'large.bin' not in a.received + b.received
+    assert a.completed == [kept]
+    assert sorted(b.completed) == sorted(released)
+    assert scanner.workerRestarts == 0
+
+
+def test_files_of_lost_node_are_handed_out_again(tree: Path):
+    scanner = DistributedScanner(analysers=[_SizeAnalyser()], deduplicate=False, batch_size=8)
+    thread, results = _scan(scanner, tree)
+
+    a = _Node(scanner, 'a')
+    lost = []
+    while len(lost) < 2:
+        lost += a.take()
+
+    a.complete(lost[0])
+    a.close()
+
+    b = _Node(scanner, 'b')
+    b.serve()
+    thread.join(10)
+    b.close()
+
+    _check(results)
+    assert set(lost[1:]) <= set(b.completed)
+    assert lost[0] not in b.received
+    assert scanner.workerRestarts == 1
+
+
+def _start_worker_and_die(method: str, pids):
+    scheduler._ctx = mp.get_context(method)
+    worker = scheduler._Worker([_SizeAnalyser()], scheduler._Lane('default', ('size',), 1))
+    pids.put(worker.process.pid)
+
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        with open(f'/proc/{pid}/stat') as fp:
+            # Orphans which exited are not necessarily reaped in containers
+            return fp.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='requires /proc')
+@pytest.mark.parametrize('method', ['fork', 'forkserver'])
+def test_pool_workers_of_lost_node_exit(method: str):
+    """
+    Workers left behind by a killed node would keep its connection to the coordinator open.
+    """
+    ctx = mp.get_context(method)
+    pids = ctx.SimpleQueue()
+
+    node = ctx.Process(target=_start_worker_and_die, args=(method, pids))
+    node.start()
+    pid = pids.get()
+    node.join(10)
+
+    deadline = time.monotonic() + 10
+    while _alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    alive = _alive(pid)
+    if alive:
+        os.kill(pid, signal.SIGKILL)
+
+    assert not alive
@@ -0,0 +1,78 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import subprocess
+import typing as t
+
+import pytest
+
+from pathlib import Path
+
+from ts_deepscan.scanner.Scanner import Scanner
+
+
+_files = {
+    '.gitignore': '*.log\nbuild/\n!keep.log\n',
+    'a.txt': 'a',
+    'keep.log': 'kept',
+    'b.log': 'ignored',
+    'build/out.txt': 'ignored',
+    'src/.gitignore': 'gen/\n*.tmp\n!important.tmp\n',
+    'src/main.c': 'int main() {}',
+    'src/x.tmp': 'ignored',
+    'src/important.tmp': 'kept',
+    'src/gen/g.c': 'ignored',
+    'src/sub/y.tmp': 'ignored',
+    'src/sub/.gitignore': 'z.txt\n',
+    'src/sub/z.txt': 'ignored',
+    'other/x.tmp': 'kept',
+}
+
+
+@pytest.fixture
+def repo(tmp_path: Path) -> Path:
+    """
+    Repository with nested .gitignore files, the ignored files are committed nevertheless (git add -f).
+    """
+    for name, text in _files.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+    def git(*args: str):
+        subprocess.run(['git', *args], cwd=tmp_path, check=True, capture_output=True,
+                       env={**os.environ, 'GIT_AUTHOR_NAME': 'test', 'GIT_AUTHOR_EMAIL': 'test@example.com',
+                            'GIT_COMMITTER_NAME': 'test', 'GIT_COMMITTER_EMAIL': 'test@example.com'})
+
+    git('init', '-q')
+    git('add', '-f', '.')
+    git('commit', '-q', '-m', 'fixture')
+
+    return tmp_path
+
+
+def _discover(repo: Path, **kwargs) -> t.Set[str]:
+    files: t.Set[str] = set()
+
+    scanner = Scanner([], **kwargs)
+
+    for f in scanner._discover([repo]):
+        relpath = f.content.relpath if f.content else f.relpath
+        files.add(relpath.replace(os.sep, '/'))
+
+    return files
+
+
+def test_revision_applies_gitignores(repo: Path):
+    files = _discover(repo, git_revision='HEAD')
+
+    assert files == {'a.txt', 'keep.log', 'src/main.c', 'src/important.tmp', 'other/x.tmp'}
+
+
+def test_revision_matches_worktree(repo: Path):
+    worktree_files = _discover(repo)
+    revision_files = _discover(repo, git_revision='HEAD')
+
+    assert revision_files == worktree_files
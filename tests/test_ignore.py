@@ -0,0 +1,69 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import typing as t
+
+import pytest
+
+from pathlib import Path
+from gitignore_parser import parse_gitignore_str
+
+from ts_deepscan.scanner.ignore import GitignoreRules
+
+
+_paths = [
+    'a.log', 'keep.log', 'src/b.log', 'src/keep.log',
+    'build', 'build/', 'build/out.txt', 'src/build', 'src/build/', 'src/build/out.txt',
+    'docs', 'docs/', 'docs/index.md', 'src/docs/index.md',
+    'src/main.c', 'src/gen/g.c', 'lib/src/gen/g.c', 'vendor/x/y.c', 'x/vendor/y.c',
+    'a/b/c/d.tmp', 'important.tmp', 'a/important.tmp',
+]
+
+_gitignores = {
+    'negation': '*.log\n!keep.log\n*.tmp\n!**/important.tmp\n',
+    'directory only': 'build/\ndocs/\n',
+    'negated directory': 'build\n!build/\n',
+    'anchored': '/docs\nsrc/gen/\n/vendor/**\n',
+    'mixed': '# comment\n\n/build/\n!src/build/\nsrc/**/*.c\n!src/main.c\n**/tmp\n\\!x\n',
+}
+
+
+def _variants(relpath: str) -> t.Iterator[t.Union[str, Path]]:
+    yield relpath
+
+    # Paths are stripped of a trailing slash by Path
+    if not relpath.endswith('/'):
+        yield Path(relpath)
+
+
+@pytest.mark.skipif(os.sep != '/', reason='paths with trailing slashes are matched as on POSIX')
+@pytest.mark.parametrize('name', list(_gitignores))
+def test_rules_match_gitignore_parser(tmp_path: Path, name: str):
+    text = _gitignores[name]
+
+    expected = parse_gitignore_str(text, str(tmp_path))
+    rules = GitignoreRules(text.splitlines(keepends=True), str(tmp_path / '.gitignore'), str(tmp_path))
+
+    for relpath in _paths:
+        for path in _variants(relpath):
+            path = tmp_path / path if isinstance(path, Path) else f'{tmp_path}/{path}'
+            assert rules(path) == expected(path), path
+
+
+def test_paths_outside_base_dir_are_rejected(tmp_path: Path):
+    base_dir = tmp_path / 'base'
+    text = '*.log\n'
+
+    expected = parse_gitignore_str(text, str(base_dir))
+    rules = GitignoreRules([text], str(base_dir / '.gitignore'), str(base_dir))
+
+    for path in (tmp_path / 'a.log', tmp_path / 'base.log', str(tmp_path / 'base2' / 'a.log')):
+        with pytest.raises(ValueError):
+            expected(path)
+        with pytest.raises(ValueError):
+            rules(path)
+
+    assert rules(base_dir / 'a.log') == expected(base_dir / 'a.log') is True
+    assert rules(base_dir) == expected(base_dir) is False
@@ -0,0 +1,151 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import typing as t
+
+import pytest
+
+from pathlib import Path
+
+import ts_deepscan.util as util
+
+from ts_deepscan.analyser import FileAnalyser, AnalysisResult
+from ts_deepscan.scanner.Scanner import Scanner, NOT_SCANNED_BUDGET, NOT_SCANNED_CANCELLED
+from ts_deepscan.scanner.journal import Journal
+
+
+class _TextAnalyser(FileAnalyser):
+    """
+    Reports the text of the files, files with the text 'timeout' are reported as stopped at the deadline.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        # Relative paths of the analysed files
+        self.analysed: t.List[str] = []
+
+    @property
+    def category(self) -> str:
+        return 'text'
+
+    @property
+    def options(self) -> dict:
+        return {'text': True}
+
+    def _match(self, path: Path) -> bool:
+        return True
+
+    def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
+        self.analysed.append(path.relative_to(root).as_posix())
+        text = path.read_text()
+        return AnalysisResult(self.category, {'text': text}, timeout=text == 'timeout')
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    root = tmp_path / 'tree'
+
+    for i in range(10):
+        path = root / f'd{i % 3}' / f'f{i}.txt'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f'text {i}')
+
+    (root / 'timeout.txt').write_text('timeout')
+
+    return root
+
+
+@pytest.fixture
+def warnings(monkeypatch) -> t.List[str]:
+    messages = []
+    monkeypatch.setattr(util, 'warning', lambda msg, *args: messages.append(msg))
+    return messages
+
+
+def _scan(root: Path, journal: Journal) -> t.Tuple[_TextAnalyser, Scanner, dict]:
+    analyser = _TextAnalyser()
+    scanner = Scanner([analyser], deduplicate=False, journal=journal)
+
+    results = scanner.run([root])
+
+    return analyser, scanner, {relpath: [(r.category, r.data, r.timeout) for r in result]
+                               for relpath, result in results.items()}
+
+
+def test_resumed_scan_skips_completed_files(tree: Path, tmp_path: Path):
+    path = tmp_path / 'scan.journal'
+
+    _, _, expected = _scan(tree, Journal(path))
+
+    (tree / 'd0' / 'new.txt').write_text('new')
+    expected['d0/new.txt'] = [('text', {'text': 'new'}, False)]
+
+    analyser, scanner, results = _scan(tree, Journal(path, resume=True))
+
+    assert analyser.analysed == ['d0/new.txt']
+    assert len(scanner.resumedFiles) == 11
+    assert scanner.timedOutFiles == {'timeout.txt'}
+    assert results == expected
+
+    # The new file has been recorded by the resumed scan
+    assert set(Journal.load(path)[1]) == set(expected)
+
+
+def test_truncated_last_record_is_skipped(tree: Path, tmp_path: Path, warnings: t.List[str]):
+    path = tmp_path / 'scan.journal'
+
+    _, _, expected = _scan(tree, Journal(path))
+
+    # The scan has been killed while writing the last record
+    data = path.read_bytes()
+    last = data[data.rindex(b'\n', 0, -1) + 1:]
+    path.write_bytes(data[:-len(last) // 2])
+
+    options, completed = Journal.load(path)
+
+    assert options == {'text': True}
+    assert len(completed) == 10
+    assert len(warnings) == 1
+
+    # The cut off record is terminated when the journal is continued, the file is analysed again
+    analyser, _, results = _scan(tree, Journal(path, resume=True))
+
+    assert len(analyser.analysed) == 1
+    assert results == expected
+    assert set(Journal.load(path)[1]) == set(expected)
+
+
+def test_journal_of_other_options_is_reported(tree: Path, tmp_path: Path, warnings: t.List[str]):
+    path = tmp_path / 'scan.journal'
+
+    for options in ({'text': True}, {'text': False}):
+        journal = Journal(path)
+        journal.open(options)
+        journal.close()
+
+        _scan(tree, Journal(path, resume=True))
+
+    assert len(warnings) == 1
+
+
+def test_cancelled_and_skipped_files_are_not_journaled(tmp_path: Path):
+    path = tmp_path / 'scan.journal'
+    result = [AnalysisResult('text', {'text': 'a'})]
+
+    scanner = Scanner([_TextAnalyser()], journal=Journal(path))
+    scanner.journal.open(scanner.options)
+
+    scanner._report('a.txt', result, [])
+    scanner._report('b.txt', [], ['failed'])
+    scanner._report('c.txt', [], [NOT_SCANNED_CANCELLED])
+    scanner._report('d.txt', [], [NOT_SCANNED_BUDGET])
+
+    scanner.journal.close()
+
+    _, completed = Journal.load(path)
+
+    assert set(completed) == {'a.txt', 'b.txt'}
+    assert [r.data for r in completed['a.txt'][0]] == [{'text': 'a'}]
+    assert completed['b.txt'] == ([], ['failed'])
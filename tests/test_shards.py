@@ -0,0 +1,106 @@
+# SPDX-FileCopyrightText: 2025 EACG GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import json
+import zipfile
+import typing as t
+
+import pytest
+
+from pathlib import Path
+
+from ts_deepscan import execute_scan
+from ts_deepscan.analyser import FileAnalyser, AnalysisResult
+from ts_deepscan.scanner.Scanner import Scanner
+from ts_deepscan.scanner.shards import Shard, shard_of, merge_scans
+
+
+class _TextAnalyser(FileAnalyser):
+    """
+    Reports the text of the files, files named empty.txt have no results.
+    """
+
+    @property
+    def category(self) -> str:
+        return 'text'
+
+    def _match(self, path: Path) -> bool:
+        return path.name != 'empty.txt'
+
+    def apply(self, path: Path, root: t.Optional[Path] = None) -> t.Optional[AnalysisResult]:
+        return AnalysisResult(self.category, {'text': path.read_text()})
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    root = tmp_path / 'tree'
+
+    for i in range(30):
+        path = root / f'd{i % 4}' / f'f{i}.txt'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f'text {i}')
+
+    (root / 'd0' / 'empty.txt').write_text('')
+
+    with zipfile.ZipFile(root / 'pkg.zip', 'w') as zf:
+        for i in range(5):
+            zf.writestr(f'pkg/m{i}.txt', f'member {i}')
+
+    return root
+
+
+@pytest.mark.parametrize('value, expected', [('1/1', Shard(1, 1)),
+                                             ('2/10', Shard(2, 10)),
+                                             ('10/10', Shard(10, 10))])
+def test_parse(value: str, expected: Shard):
+    assert Shard.parse(value) == expected
+    assert str(expected) == value
+
+
+@pytest.mark.parametrize('value', ['', '1', '/2', '1/', '0/3', '4/3', '1/0', 'a/3', '1/b', '1/2/3'])
+def test_parse_invalid(value: str):
+    with pytest.raises(ValueError):
+        Shard.parse(value)
+
+
+def test_shards_partition_files():
+    relpaths = [f'd{i % 7}/sub{i % 3}/f{i}.c' for i in range(500)]
+
+    for count in (1, 3, 7):
+        shards = [Shard(i, count) for i in range(1, count + 1)]
+
+        for relpath in relpaths:
+            assert sum(shard.contains(relpath) for shard in shards) == 1
+
+        if count > 1:
+            assert all(any(shard.contains(relpath) for relpath in relpaths) for shard in shards)
+
+    # The assignment does not depend on the process
+    assert [shard_of(relpath, 10) for relpath in ('a.txt', 'src/main.c', 'pkg.zip')] == [5, 9, 6]
+
+
+def test_merged_shards_equal_unsharded_scan(tree: Path, tmp_path: Path):
+    expected = json.loads(execute_scan([tree], Scanner([_TextAnalyser()])).to_json())
+
+    paths = []
+    for i in range(1, 4):
+        scan = execute_scan([tree], Scanner([_TextAnalyser()], shard=Shard(i, 3)))
+
+        paths.append(tmp_path / f'scan-{i}.json')
+        paths[-1].write_text(scan.to_json())
+
+    out = io.StringIO()
+    merged = merge_scans(paths, out)
+    actual = json.loads(out.getvalue())
+
+    assert actual['result'] == expected['result']
+    assert len(actual['result']) == 35
+    assert sorted(actual['no_result']) == sorted(expected['no_result']) == ['d0/empty.txt']
+    assert actual['options'] == expected['options']
+    assert actual['summary'] == expected['summary']
+
+    assert actual['stats'] == merged.stats
+    assert actual['stats'].pop('shards') == 3
+    assert actual['stats'] == expected['stats']